@@ -5,75 +5,16 @@
 
 import numpy as np;
 import matplotlib.pyplot as pyplot;
-import random;
-import math;
-import shapely.geometry as shg;
+from space_geometry import computeSectorDistance
+from space_synthetic import PointsInCircum, PositivePoints, ZeroCorrPoints
 
-'''
-Begin section for defining necessary functions.
-'''
-
-#All probability distributions and sector boundaries are radial distributions, but
-#it is necessary to export them in x-y coordinates.
-    
-#Creates a Point Distrubtion along the circumference of a circle
-#to serve as a Sector, where r is the radius and n is the number of points to create.
-#Returns the radial coordinates in x-y form in a nx2 array.
-
-def PointsInCircum(r,n):
-    return np.asarray([(math.cos(2*math.pi/n*x)*r,math.sin(2*math.pi/n*x)*r) for x in range(0,n)])
-
-#Creates a radial point distrubtion that is positively correlated at closer ranges,
-#and linearly decreases in a triangular probability distribution.
-#Points are randomly generated from this probability distribution, rather than uniformly along the range.
-#R1 is the radius at which the probability distribution begins, R2 is the length of the distribution,
-#and n is the number of points to generate from this probability distribution.
-#The probability distribution is radial, but x and y coordinates are returned.
-#Returns the radial coordinates in x-y form in a nx2 array.
-    
-def PositivePoints(radius1,radius2,n):
-    sample_list = [];
-    for i in range(0,n):
-        theta = random.uniform(0,n);
-        radius = radius1 + np.random.triangular(0,0,radius2);
-        sample_list.append([math.cos(2*math.pi/n*theta)*radius,math.sin(2*math.pi/n*theta)*radius]);
-    return np.asarray(sample_list);
-    
-#Create a uniform random distribution that should have zero correlation.
-#R1 is the lower endpoint and R2 is the length of the distribution.
-#N is the number of random points to generate based off this probability distribution.
-#Returns the radial coordinates in x-y form in a nx2 array.
-    
-def ZeroCorrPoints(radius1,radius2,n):
-    sample_list = [];
-    for i in range(0,n):
-        theta = random.uniform(0,n);
-        radius = radius1 + np.random.uniform(0,radius2);
-        sample_list.append([math.cos(2*math.pi/n*theta)*radius,math.sin(2*math.pi/n*theta)*radius]);
-    return np.asarray(sample_list);    
-
-#Creates the polygon defined by the sector outline and computes the nearest distance
-#between each individual point of your sapmle distribution and the sector.
-#points_list is the point distribution, and outline is the sector. 
-#Returns a nx2 array where n is the length of points_list, which must also be an nx2 array.
-    
-def computeSectorDistance(points_list,outline):    
-    point_count = len(points_list);
-    poly = shg.Polygon(outline);
-    distance_list = np.zeros(point_count)
-    for i in range(0,point_count):
-        point = shg.Point(points_list[i]);
-        distance_list[i] = poly.distance(point);
-    distance_list = np.asarray(distance_list);
-    distances = distance_list[distance_list!=0];
-    return distances;
+#The sample distributions PointsInCircum, PositivePoints and ZeroCorrPoints are defined in
+#space_synthetic.py, so the benchmark suite (space_benchmark.py) can build on them too.
+#For clustered, inhibitory, uniform and inhomogeneous patterns around any sector shapes, and
+#for measuring the bias and confidence band coverage of the correlation estimator on
+#thousands of them, see space_calibration.py.
 
 
-'''
-End of function definition section.
-'''    
-    
-
 '''
 Begin of procedural section.
 '''
@@ -145,18 +86,12 @@ pyplot.savefig('Zero Plot.eps');
 pyplot.show(); 
 
 #Generate a set of random distributions, where Ntrials is the number of distributions
-#generated independently
+#generated independently. All Ntrials x 500 points are drawn in one call.
 
 Ntrials = 250;
 
-random_sets = []
-
-for i in range(0,Ntrials):
-    trial = ZeroCorrPoints(150,1050,500);
-    trial = trial+1250;
-    random_sets.append(trial);
-
-random_sets = np.asarray(random_sets);
+random_sets = ZeroCorrPoints(150,1050,500*Ntrials).reshape(Ntrials,500,2);
+random_sets = random_sets+1250;
     
 #Calculate the distances between individual points in each distribution and the sector.
 #Then calculate the correlation function estimator and plot the result.
@@ -172,14 +107,9 @@ negative_sample = np.reshape(negative_sample, (500,2))
 
 sector_distances = computeSectorDistance(negative_sample,sector);
 
-random_distances = [];
+#All random sets are measured in one call on the stacked (Ntrials, n, 2) array
 
-for i in range(0,Ntrials):
-    rand_dist = computeSectorDistance(random_sets[i],sector);
-    random_distances.append(rand_dist);
-    
-random_distances = np.asarray(random_distances);
-random_distances = np.reshape(random_distances, 500*Ntrials);
+random_distances = computeSectorDistance(random_sets,sector);
 
 sector_counts,bin_data,etc = pyplot.hist(sector_distances, bins = distance_bins, alpha = 0.5, color = 'b',histtype='step');    
 random_counts,bin_data,etc = pyplot.hist(random_distances, bins = distance_bins, alpha = 0.5, color = 'b',histtype='step');  
@@ -0,0 +1,31 @@
+#Plots the stomata and random point distance histograms saved by
+#Stomata and Random Point Histograms.py.
+
+#The histogram script only computes and saves the counts, so it never needs matplotlib.
+#Run this script afterwards if you want to look at the histograms.
+
+import numpy as np;
+import matplotlib.pyplot as pyplot;
+from space_results import loadResults
+
+#Load the sector results saved by the histogram script (memory-mapped). Each row is one
+#sector with its stomata and random point histograms and the distance bins they used.
+
+Sector_Results = loadResults('sector results filename.npy');
+distance_bins = Sector_Results['bins'][0] if len(Sector_Results) else np.insert(np.logspace(np.log10(15),np.log10(2500),15),0,0);
+
+#Draw every sector's histograms as outlines, stomata in blue and random points in red,
+#the same way the histogram script used to draw them while counting.
+
+fig, ax = pyplot.subplots();
+
+for i in range(0,len(Sector_Results)):
+    ax.hist(distance_bins[:-1], bins = distance_bins, weights = Sector_Results['stomata'][i], alpha = 0.5, color = 'b', histtype='step');
+    ax.hist(distance_bins[:-1], bins = distance_bins, weights = Sector_Results['random'][i], alpha = 0.5, color = 'r', histtype='step');
+
+pyplot.title('Stomata-Sector (blue) and Random-Sector (red) Distances');
+pyplot.xlabel('Distance (microns)');
+pyplot.ylabel('Count');
+pyplot.savefig('Sector Histograms.pdf');
+
+pyplot.show();
@@ -1,26 +1,36 @@
 #Aggregates the stomata and random point distance histogram data, calculates correlation function, and plots.
 
+#Sectors are grouped by phenotype (or by any other column, see group_by below), and the
+#correlation function of every group is calculated and plotted, however many groups there are.
+
+#To draw these plots without a display (for example on a cluster), one per group as well,
+#run space_render.py correlation on the results file instead.
+
 import numpy as np;
 import matplotlib.pyplot as pyplot;
+from space_correlation import groupedCorrelation, bootstrapInterval
+from space_results import loadResults, groupKeys
 
-#Load your sector and random point distance histograms. Array structure should be:
+#Load the sector results saved by the histogram script (memory-mapped).
 
-#Sector_Data is a 3xnxN array
+Sector_Results = loadResults('sector results filename.npy');
 
-#The first dimension is stomata distance histograms, random point histograms, and normalized ratio data.
+#Column to group the sectors by: 'phenotype', 'save' or 'cotyledon' from the results, or the
+#header of any other column you add to filelist.csv (for example a 'Line' or 'Batch' column).
 
-#The second dimension is the length of the number of distance bins n
+group_by = 'phenotype';
+filelist = 'filelist.csv';
 
-#The third dimension is the total number of distance histograms N
+#Groups to plot, in legend order, and the label to show for each. Leave groups = None to
+#plot every group found. Groups without a label are labeled with their name.
 
-EPFL9_Sector_Data = np.load('EPFL9_sector_data.npy', encoding = 'latin1');
-EPF1_Sector_Data = np.load('EPF1_sector_data.npy', encoding = 'latin1');
-Control_Sector_Data = np.load('Control_sector_data.npy', encoding = 'latin1');
+groups = ['EPF1', 'EPFL9', 'Control'];
+group_labels = {'EPF1': 'EPF1', 'EPFL9': 'STOMAGEN', 'Control': 'Empty Vector'};
 
-#Make sure to use the same bin intervals as in your histogramming
+#The distance bins are stored with the histograms
 
-distance_fun = np.logspace(np.log10(15),np.log10(2500),15);
-distance_bins = np.insert(distance_fun,0,0);
+distance_bins = Sector_Results['bins'][0];
+distance_fun = distance_bins[1:];
 
 #The Sector-Stomata Correlation Function is calculated using two numbers:
 
@@ -29,64 +39,62 @@ distance_bins = np.insert(distance_fun,0,0);
 
 #The correlation function is then the (numerator/denominator) - 1
 
-#Calculate the numerator and denominator, normalized for the number of points,
-#and then calculate the correlation function
-
+#Calculate the numerator and denominator, normalized for the number of points, and then
+#calculate the correlation function, for all groups at once
 
-EPF1_num = (np.sum(EPF1_Sector_Data[0],axis=0)/np.sum(np.sum(EPF1_Sector_Data[0],axis=0))); #denominators in this line and below line are normalization factors
-EPF1_den = (np.sum(EPF1_Sector_Data[1],axis=0)/np.sum(np.sum(EPF1_Sector_Data[1],axis=0)));
-EPF1_y = EPF1_num/EPF1_den - 1;
+keys = groupKeys(Sector_Results, group_by, filelist);
+Group_Data = groupedCorrelation(Sector_Results['stomata'], Sector_Results['random'], keys);
 
-EPFL9_num = (np.sum(EPFL9_Sector_Data[0],axis=0)/np.sum(np.sum(EPFL9_Sector_Data[0],axis=0)));
-EPFL9_den = (np.sum(EPFL9_Sector_Data[1],axis=0)/np.sum(np.sum(EPFL9_Sector_Data[1],axis=0)));
-EPFL9_y = EPFL9_num/EPFL9_den - 1;
+if groups is None:
+    groups = list(Group_Data['groups']);
 
-Control_num = (np.sum(Control_Sector_Data[0],axis=0)/np.sum(np.sum(Control_Sector_Data[0],axis=0)));
-Control_den = (np.sum(Control_Sector_Data[1],axis=0)/np.sum(np.sum(Control_Sector_Data[1],axis=0)));
-Control_y = Control_num/Control_den - 1;
+#Calculate confidence intervals either through bootstrap resampling of the sectors
+#('bootstrap') or through standard error propagation ('propagation').
 
-#Calculate confidence intervals either through standard error propagation
-#or load bootstrap resampling data
+confidence_interval = 'bootstrap';
 
-total_epf1_err = np.std(np.sum(EPF1_Sector_Data[0],axis=1));
-total_epfl9_err = np.std(np.sum(EPFL9_Sector_Data[0],axis=1));
-total_Control_err = np.std(np.sum(Control_Sector_Data[0],axis=1));
+#Number of bootstrap replicates per group, the seed that makes them reproducible, and
+#the number of worker processes to spread them over. Set bootstrap_cotyledons = True to
+#resample whole cotyledons instead of sectors.
 
+bootstrap_replicates = 10000;
+bootstrap_seed = 0;
+bootstrap_cotyledons = False;
+workers = 1;
 
-individual_epf1_err = np.std(EPF1_Sector_Data[0],axis =0);
-individual_epfl9_err = np.std(EPFL9_Sector_Data[0],axis =0);
-individual_Control_err = np.std(Control_Sector_Data[0],axis =0);
+group_y = {};
+group_low = {};
+group_high = {};
 
-epf1_std = 1.96*np.absolute(EPF1_y ) * np.sqrt( (individual_epf1_err/(np.mean(EPF1_Sector_Data[0],axis=0)+1))**2 + (total_epf1_err / np.mean(np.sum(EPF1_Sector_Data[0],axis=1)))**2 );
-epfl9_std = 1.96*np.absolute(EPFL9_y ) * np.sqrt( (individual_epfl9_err/np.mean(EPFL9_Sector_Data[0],axis=0))**2 + (total_epfl9_err / np.mean(np.sum(EPFL9_Sector_Data[0],axis=1)))**2 );
-Control_std = 1.96*np.absolute(Control_y ) * np.sqrt( (individual_Control_err/np.mean(Control_Sector_Data[0],axis=0))**2 + (total_Control_err / np.mean(np.sum(Control_Sector_Data[1],axis=0)))**2 );
+for group in groups:
+    k = list(Group_Data['groups']).index(group);
+    group_y[group] = Group_Data['y'][k];
 
-epf1_err = epf1_std / np.sqrt(len(EPF1_Sector_Data[0]))
-epfl9_err = epfl9_std / np.sqrt(len(EPFL9_Sector_Data[0]))
-Control_err = Control_std / np.sqrt(len(Control_Sector_Data[0]))
+    if confidence_interval == 'bootstrap':
+        rows = np.flatnonzero(keys == group);
+        cotyledons = np.asarray(Sector_Results['cotyledon'][rows]) if bootstrap_cotyledons else None;
+        group_low[group], group_high[group] = bootstrapInterval(Sector_Results['stomata'][rows], Sector_Results['random'][rows],
+                                                                bootstrap_replicates, bootstrap_seed, cotyledons, workers = workers);
+    else:
 
-#Upper and lower bounds of confidence interval
+        #Upper and lower bounds of confidence interval
 
-epf1_high = EPF1_y + epf1_err;
-epf1_low = EPF1_y - epf1_err;
-
-epfl9_high = EPFL9_y + epfl9_err;
-epfl9_low = EPFL9_y - epfl9_err;
-
-Control_high = Control_y + Control_err;
-Control_low = Control_y - Control_err;
+        group_low[group] = Group_Data['y'][k] - Group_Data['err'][k];
+        group_high[group] = Group_Data['y'][k] + Group_Data['err'][k];
 
 #Plot correlation functions with confidence intervals
 
+fill_colors = ['turquoise', 'crimson', 'darkslategrey', 'orange', 'mediumpurple', 'yellowgreen', 'hotpink', 'tan', 'lightskyblue', 'silver'];
+line_colors = ['darkblue', 'crimson', 'k', 'darkorange', 'indigo', 'darkgreen', 'deeppink', 'saddlebrown', 'steelblue', 'dimgray'];
+alphas = [0.75, 0.6, 0.5];
 
 fig, ax = pyplot.subplots();
 
-ax.fill_between(distance_fun, epf1_high,epf1_low, color='turquoise', alpha = 0.75);
-ax.plot(distance_fun, EPF1_y, color='darkblue',linestyle='--', marker='.', label='EPF1');
-ax.fill_between(distance_fun, epfl9_high,epfl9_low, color='crimson', alpha = 0.6);
-ax.plot(distance_fun, EPFL9_y, color='crimson',linestyle='--', marker='.', label='STOMAGEN');
-ax.fill_between(distance_fun, Control_high,Control_low, color='darkslategrey', alpha = 0.5);
-ax.plot(distance_fun, Control_y, color='k',linestyle='--',marker='.', label='Empty Vector');
+for i in range(0, len(groups)):
+    group = groups[i];
+    ax.fill_between(distance_fun, group_high[group], group_low[group], color=fill_colors[i % len(fill_colors)], alpha = alphas[i] if i < len(alphas) else 0.4);
+    ax.plot(distance_fun, group_y[group], color=line_colors[i % len(line_colors)], linestyle='--', marker='.', label=group_labels.get(group, group));
+
 ax.plot(np.arange(0,301), np.zeros(np.shape(np.arange(0,301))), 'k-',alpha=0.75);
 ax.legend(loc='lower right')
 pyplot.title('Stomata-Sector Correlation with 95% Confidence Interval');
@@ -0,0 +1,118 @@
+#Calculates how stomata cluster or space out among themselves: the stomata-stomata pair
+#correlation function g(r) and Ripley's K and L functions of every cotyledon, with edge
+#correction for the cotyledon outline and an envelope of complete spatial randomness.
+#Exports the data into an npz file and plots g(r) of each phenotype.
+
+#This script is capable of analyzing data from more than one file at a time if
+#you supply a list of file directories.
+
+#The analysis of each cotyledon is pairCorrelationCotyledon in space_analysis.py, and the
+#statistics are computed in space_pairs.py (needs scipy).
+
+import time #If you want to track the length of the script
+start_time = time.time()
+
+import numpy as np;
+import matplotlib.pyplot as pyplot;
+from space_ingest import readFileList
+from space_analysis import pairCorrelationCotyledon
+from space_parallel import runCotyledons, workerCount
+from space_pairs import savePairResults, EXACT_RADIUS, PAIR_RESOLUTION
+from space_instrument import runReport
+
+
+'''
+Begin of procedural section.
+'''
+
+#Distance bins, the same logarithmic bins as the histogram script, so g(r) can be read
+#next to the sector-stomata correlation function.
+
+distance_fun = np.logspace(np.log10(15),np.log10(2500),15);
+distance_bins = np.insert(distance_fun,0,0);
+
+#Number of random patterns of complete spatial randomness for the envelope. Each has as
+#many stomata as the cotyledon, drawn uniformly inside its outline, from a stream seeded by
+#random_seed and the row of the cotyledon in filelist.csv. Set to 0 to skip the envelope.
+
+envelope_trials = 99;
+random_seed = 0;
+
+#Pairs up to exact_radius microns apart are counted exactly; pairs further apart are
+#counted on a grid of pair_resolution microns, which is what keeps cotyledons with 10^5
+#stomata fast. Set exact_radius = np.inf to count every pair exactly. The defaults are
+#those of space_pairs.py, which the staged pipeline uses too, so both give the same g(r).
+
+exact_radius = EXACT_RADIUS;
+pair_resolution = PAIR_RESOLUTION;
+
+#Parsed workbooks are cached in this folder, keyed by the workbook contents, so reruns
+#skip the .xlsx parsing. Set to None to always parse the workbooks.
+
+cache_dir = '.space_cache';
+
+#Run report (see the histogram script). Set run_report to a file name to record the time
+#and memory of every stage, and profile_cotyledon to one dataset to profile it.
+
+run_report = None;
+profile_cotyledon = None;
+
+#Number of worker processes. Can also be set from the command line with --workers N.
+
+workers = workerCount(1);
+
+#filelist.csv: the pathway to each dataset file, a savename and the phenotype (see the
+#histogram script).
+
+directory, save, phenotype = readFileList("filelist.csv");
+
+settings = {'distance_bins': distance_bins, 'envelope_trials': envelope_trials, 'random_seed': random_seed,
+            'exact_radius': exact_radius, 'pair_resolution': pair_resolution, 'cache_dir': cache_dir,
+            'run_report': runReport(run_report, 'pairs', profile_cotyledon)};
+
+task_list = [(i, directory[i], settings) for i in range(0, len(directory))];
+results, failures = runCotyledons(pairCorrelationCotyledon, task_list, workers, labels = save);
+
+#Save the statistics as one npz file with a (cotyledons x bins) array for each of g, K, L,
+#the pair counts and their envelopes (g_low, g_high, g_mean, ...), the row of each cotyledon
+#in filelist.csv ('cotyledon'), its number of stomata and area. Cotyledons that failed are
+#reported above and left out.
+
+rows = [i for i in range(0, len(results)) if results[i] is not None];
+savePairResults('pair correlation filename.npz', rows, [results[i] for i in rows], distance_bins);
+
+#Plot the mean g(r) of each phenotype over the middle of each bin, with the mean envelope.
+#g(r) above 1 means stomata are found closer together than at random (clustering), below 1
+#further apart (spacing).
+
+colors = ['darkblue', 'crimson', 'k', 'darkorange', 'indigo', 'darkgreen', 'deeppink', 'saddlebrown', 'steelblue', 'dimgray'];
+distance_mid = np.sqrt(distance_bins[:-1]*distance_bins[1:]);
+distance_mid[0] = 0.5*distance_bins[1];
+
+fig, ax = pyplot.subplots();
+phenotypes = sorted(set(phenotype[i] for i in rows));
+for k in range(0, len(phenotypes)):
+    members = [results[i] for i in rows if phenotype[i] == phenotypes[k]];
+    color = colors[k % len(colors)];
+    if envelope_trials > 0:
+        ax.fill_between(distance_mid, np.mean([m['g_low'] for m in members], axis = 0), np.mean([m['g_high'] for m in members], axis = 0), color = color, alpha = 0.2);
+    ax.plot(distance_mid, np.mean([m['g'] for m in members], axis = 0), color = color, linestyle = '--', marker = '.', label = phenotypes[k]);
+
+ax.axhline(1, color = 'k', alpha = 0.75);
+ax.set_xscale('log');
+ax.legend(loc = 'upper right');
+pyplot.title('Stomata Pair Correlation with CSR Envelope');
+pyplot.xlabel('Distance (microns)');
+pyplot.ylabel('g(r)');
+pyplot.savefig('Stomata Pair Correlation Plot.pdf');
+
+if failures:
+    print("%d of %d cotyledons failed: %s" % (len(failures), len(directory), ', '.join(label for k, label, error in failures)));
+
+print("--- %s seconds ---" % (time.time() - start_time));
+
+pyplot.show();
+
+'''
+End of procedural section.
+'''
@@ -1,85 +1,24 @@
-
-#Plots cotyledon and sector outlines as polygons, and plots stomata as point distributions.
 #Calculates stomatal distances from sectors and histograms the results.
 #Generates N random point distributions within each cotyledon and repeats this process.
+#Saves the histograms of every sector to a results file. Nothing is plotted, so the script
+#runs without matplotlib or a display; plot the saved histograms with Sector Histogram
+#Plots.py, and the cotyledon, sector and stomata overlays with space_render.py.
 
 #This script is capable of analyzing data from more than one file at a time if
 #you supply a list of file directories.
 
+#The analysis of each cotyledon is histogramCotyledon in space_analysis.py.
+
 import time #If you want to track the length of the script
 start_time = time.time()
 
 import numpy as np;
-import csv 
-import openpyxl;
-import matplotlib.mlab as mlab;
-import matplotlib.pyplot as pyplot;
-import random;
-import math;
-import scipy.spatial as sps;
-import shapely.geometry as shg;
-
-'''
-Begin section for defining necessary functions.
-'''
-
-# Takes a workbook sheet and a point count and returns an Nx2 numpy array of point values
-def recordSheetCoordinates(point_sheet, point_count):
-    points = np.zeros((point_count, 3), dtype = np.float);
-    for i in range(0, point_count):
-        points[i, 0] = point_sheet.cell(row = i + 3, column = 1).value;
-        points[i, 1] = point_sheet.cell(row = i + 3, column = 2).value;
-    
-    # Calculate angle of each point from center (x_mean, y_mean) and sort points by angle 
-    x_mean = np.mean(points[:, 0]);
-    y_mean = np.mean(points[:, 1]);
-    for j in range(0, point_count):
-        points[j, 2] = math.atan2(points[j, 1] - y_mean, points[j, 0] - x_mean);
-    points = points[points[:,2].argsort()];
-    
-    # New array with only the x-value and y-value columns
-    points2 = np.delete(points,np.s_[-1:],1);
-    return points2;
-
-# Check if the given list of points are inside the polygon specified by the list of
-# polygon_points. Returns the indices of the points_list whose points are inside the
-# given polygon
-def checkPointsInPolygon(polygon_list, points_list):
-    inside = mlab.inside_poly(points_list, polygon_list);
-    return inside;
-
-# Takes the number of random points to be generated, the maximum x-coordinate value
-# of the cotyledon outline, and the maximum y-coordinate value of the cotyledon
-# outline and returns an Nx2 numpy array of random points.
-def generateRandomPoints(number_of_points, x_max, y_max):
-    random_points = np.zeros((number_of_points, 2), dtype = np.float);
-    for i in range(0, number_of_points):
-        random_points[i, 0] = random.uniform(0, x_max);
-        random_points[i, 1] = random.uniform(0, y_max); 
-    return random_points;
-    
-#Creates the polygon defined by the sector outline and computes the nearest distance
-#between each individual point of your sapmle distribution and the sector.
-#points_list is the point distribution, and outline is the sector. 
-#Returns a nx2 array where n is the length of points_list, which must also be an nx2 array.
+from space_ingest import readFileList
+from space_analysis import histogramCotyledon
+from space_parallel import runCotyledons, workerCount
+from space_results import sectorResults, saveResults, saveDistanceStore
+from space_instrument import runReport
 
-    
-def computeSectorDistance(points_list,outline):
-    point_count = len(points_list);
-    poly = shg.Polygon(outline);
-    distance_list = []
-    for i in range(0,point_count):
-        point = shg.Point(points_list[i]);
-        distance_list.append(poly.distance(point));
-    distance_list = np.asarray(distance_list);
-    distances = distance_list[distance_list!=0];
-    return distances;
-
-
-'''
-End of function definition section.
-'''    
-    
 
 '''
 Begin of procedural section.
@@ -92,187 +31,157 @@ Begin of procedural section.
 min_area = 0; #If you want to place an upper and lower limit on size of sectors to analyze
 max_area = 10000000;
 
-directory = [];
-save = [];
-phenotype = [];
+#Null model for the random point histograms. 'random' histograms Ntrials random point
+#distributions per cotyledon. 'analytic' skips the random points and writes the exact
+#expected counts of Ntrials uniformly random distributions (complete spatial randomness),
+#computed from the area of the cotyledon inside each distance ring around the sector.
 
-Tota_Sector_Data = [];
+null_model = 'random';
 
-Sector_Stomata = [];
-Sector_Random = [];
-Sector_Ratio = [];
+#Seed for the random point distributions. Each cotyledon draws from its own stream derived
+#from this seed and its row in filelist.csv, so reruns give the same random points.
+#Set to None for different random points on every run.
 
-Area_Data = [];
+random_seed = 0;
 
-#Open the file list that contains the pathway for each dataset meant to be analyzed.
+#Parsed workbooks are cached in this folder, keyed by the workbook contents, so reruns
+#skip the .xlsx parsing. Set to None to always parse the workbooks.
+#Run space_cache.py --purge to empty the cache.
 
-#filelist.csv should be the name of a list of pathways to each dataset file you want analyzed.
-#The first column should be the pathway to each dataset file, the second column is a savename, and the third column is phenotype.
+cache_dir = '.space_cache';
 
-#Each dataset should correspond to one cotyledon,
-#which may have multiple sectors in separate worksheets within the xlsx file.
+#Distance backend. 'exact' measures every distance to the sector outlines. 'raster' builds
+#a distance map of each sector at raster_resolution microns per pixel and looks distances
+#up in it, which is faster for large Ntrials; run space_raster.py --resolution 1 2 5 to see
+#the distance error of each resolution on your cotyledons before choosing one.
 
-with open("filelist.csv", 'rU') as f:  #see above for what you should put in for filelist.csv 
-    text = csv.reader(f);
-    next(text, None);  # skip the headers
-    
-    for row in text: 
-        directory.append(row[0]);
-        save.append(row[1]);
-        phenotype.append(row[2]);
-        
-#For loops that iterates over each individual dataset that the file list specifies.
+distance_backend = 'exact';
+raster_resolution = 2;
 
-#Your xlsx file should have a worksheet should have a worksheet named Stomatal Postions,
-#a worksheet named Cotyledon Outline, and worksheets named Sector 1 Outline, Sector 2 Outline, etc.
-    
-#Each dataset should correspond to one cotyledon, which may have multiple sectors.
-        
-for i in range(0,len(directory)):
+#Number of random point distributions generated per cotyledon
 
+Ntrials = 1000;
 
-    #Loads the ith dataset in the filelist.
+#How the random point distributions are drawn. 'uniform' draws every point independently.
+#'sobol' and 'halton' draw each distribution from a scrambled low-discrepancy sequence
+#(needs scipy), and 'stratified' puts one random point in every cell of a grid over the
+#cotyledon. Points are still uniform over the cotyledon, but spread more evenly, so the
+#random histograms vary less between distributions and fewer Ntrials give the same
+#precision. space_benchmark.py reports the variance reduction of each sampler.
 
-    crelox_data_file_name = directory[i];
-    title = save[i];
-    leaf_type = phenotype[i];
+null_sampler = 'uniform';
 
-    crelox_wb = openpyxl.load_workbook(crelox_data_file_name);
-    crelox_wb_sheet_names = crelox_wb.get_sheet_names();
-    
-    # Reads in the data from the worksheets
-    stomata_sheet = crelox_wb.get_sheet_by_name('Stomatal Positions');
-    cotyledon_sheet = crelox_wb.get_sheet_by_name('Cotyledon Outline');
-    
-    stomata_count = stomata_sheet.max_row - 2;
-    cotyledon_point_count = cotyledon_sheet.max_row - 2;
-    
-    stomata_points = recordSheetCoordinates(stomata_sheet, stomata_count);
-    cotyledon_points = recordSheetCoordinates(cotyledon_sheet, cotyledon_point_count);
-    cot_x_max = cotyledon_points[:,0].max();
-    cot_y_max = cotyledon_points[:,1].max();
-    
-    #Counts the number of stomata inside the cotyledon and removes any coordinates
-    #that are somehow outside of the cotyledon boundary
-    
-    stomata_points_indices_inside = checkPointsInPolygon(cotyledon_points, stomata_points);
-    number_inside = len(stomata_points_indices_inside);
-    stomata_points_inside = np.zeros((number_inside, 2), dtype=np.int);
-    for i in range(0, number_inside):
-        stomata_points_inside[i] = stomata_points[stomata_points_indices_inside[i]];
-        
-    stomata_points = stomata_points_inside
-    
+#Adaptive trial count. Set adaptive_precision to a relative standard error (for example
+#0.01 for 1%) to draw random point distributions in batches of adaptive_batch and stop for
+#each sector once every bin of its random histogram is that precise. Ntrials is then the
+#most distributions drawn. Small sectors with few stomata get more distributions and large
+#cotyledons fewer; the number used for each sector is saved in the trials column of the
+#results. The random histograms are scaled to Ntrials distributions. Leave it None to
+#always draw Ntrials distributions.
 
-    
-    # Gets the number of sector outline worksheets. Relies on the fact that the sector
-    # worksheets come sequentially immediately following the cotyledon outline worksheet
-    
-    #Sector Outlines shouldn't go up to 15, but list has been written to a high number just in case.    
+adaptive_precision = None;
+adaptive_batch = 100;
 
-    sector_names = ['Sector 1 Outline', 'Sector 2 Outline', 'Sector 3 Outline', 'Sector 4 Outline', 'Sector 5 Outline', 'Sector 6 Outline', 'Sector 7 Outline', 'Sector 8 Outline', 'Sector 9 Outline', 'Sector 10 Outline', 'Sector 11 Outline', 'Sector 12 Outline', 'Sector 13 Outline', 'Sector 14 Outline', 'Sector 15 Outline'];
-    cot_sheet_index = crelox_wb_sheet_names.index('Cotyledon Outline');
-    number_of_sectors = len(crelox_wb_sheet_names) - (cot_sheet_index + 1);
-    
-    sector_list = ['Sector 1', 'Sector 2', 'Sector 3', 'Sector 4', 'Sector 5', 'Sector 6', 'Sector 7', 'Sector 8', 'Sector 9', 'Sector 10', 'Sector 11', 'Sector 12', 'Sector 13', 'Sector 14', 'Sector 15'];
+#Sector mode for cotyledons with several sectors. 'each' histograms every stoma and random
+#point against every sector. 'nearest' counts each point only for the sector nearest to it,
+#found for all sectors at once with a spatial index, so 30 or more sectors cost about as
+#much as one. 'pooled' adds the nearest-sector histograms of a cotyledon into one row
+#(sector 0, with the total sector area). The nearest and pooled modes need
+#null_model = 'random', distance_backend = 'exact' and adaptive_precision = None.
 
-    #Generate N random distributions for correlation function calculations
+sector_mode = 'each';
 
-    Ntrials = 1000;
-        
-    random_sets = [];
-    
-    #First generate an excess of random points within a rectangular boundary,
-    #then keep the first N inside of the cotyledon, where N is the number of
-    #real stomata inside the cotyledon. Repeat this process for the specified number of trials.
-    
-        
-    for i in range(0,Ntrials):
-        
-        all_rand_points2 = generateRandomPoints(stomata_count*3, cot_x_max, cot_y_max);
-        rand_points_indices_inside2 = checkPointsInPolygon(cotyledon_points, all_rand_points2);
-        number_inside2 = len(rand_points_indices_inside2);
-        rand_points_inside2 = np.zeros((number_inside2, 2), dtype=np.int);
-        for i in range(0, number_inside2):
-            rand_points_inside2[i] = all_rand_points2[rand_points_indices_inside2[i]];
-        random_dist = rand_points_inside2[:stomata_count];    
-        N_number_inside2 = len(random_dist);    
-        
-        random_sets.append(random_dist);
-    
-    sector_distances = [];
-    random_distances = [];
-    
-    #Load each sector on the cotyledon and calculate distances from the stomata to the sector
-    #and the distances from each random point distribution to the sector        
-    
-    for i in range(0, number_of_sectors):
-        sector_sheet = crelox_wb.get_sheet_by_name(sector_names[i]);
-        sector_point_count = sector_sheet.max_row - 2;
-        sector_points = recordSheetCoordinates(sector_sheet, sector_point_count);
-        
-        poly = shg.Polygon(sector_points);
-
-        if min_area <= poly.area <= max_area: #area filter on sectors if desired
-        
-            Area_Data.append(poly.area);
-        
-            distances = computeSectorDistance(stomata_points,sector_points);
-            sector_distances.append(distances);
-            random_list = [];
-            for i in range(0,Ntrials):    
-                rand_dist = computeSectorDistance(random_sets[i],sector_points);
-                b = rand_dist.tolist();
-                random_list = random_list + b;  
-            random_distances.append(random_list);
-            
-    #Define logarithmic distance bins for histogramming
-    
-    distance_fun = np.logspace(np.log10(15),np.log10(2500),15);
-    distance_bins = np.insert(distance_fun,0,0);
-    
-    #Histogram the stomata and random point distances
-    
-    #Random distances are histogrammed in aggregate, rather than individually, as we only
-    #care about approximating the expected value.
+#Raw distances. Set raw_distances to a file name (for example 'sector distances filename.npz')
+#to also save the exact stomata distances of every sector and a base histogram of its random
+#distances in bins of base_bin_width microns. Run space_results.py on that file to rebin the
+#whole cohort into any other distance bins in a moment, without measuring distances again.
+#Needs null_model = 'random', a fixed Ntrials and sector_mode = 'each'.
 
-    
-    sector_data = np.empty((number_of_sectors,len(distance_bins)-1));
-    random_data = np.empty((number_of_sectors,len(distance_bins)-1));
-    ratio_data = np.empty((number_of_sectors,len(distance_bins)-1));
-    
-    for i in range(0,len(sector_distances)):
-        
-        sector_data,bin_data,etc = pyplot.hist(sector_distances[i], bins = distance_bins, alpha = 0.5, label = 'Stomata-Sector distances', color = 'b',histtype='step');    
-        random_data,bin_data,etc = pyplot.hist(random_distances[i], bins = distance_bins, alpha = 0.5, label = 'Random-Sector distances', color = 'r',histtype='step');
+raw_distances = None;
+base_bin_width = 0.5;
 
-        Sector_Stomata.append(sector_data);
-        Sector_Random.append(random_data);
-    
-        ratio_data = (sector_data/float(len(sector_distances)))/(random_data/float(len(random_distances)))-1;
-        Sector_Ratio.append(ratio_data);
-    
-#Save the histogram counts and sector area data
+#Memory limit. All Ntrials random distributions of a cotyledon are held in memory at once,
+#16 bytes per random point (Ntrials x number of stomata points). Set memory_limit to a
+#number of bytes (for example 8*2**30 for 8 GB) to draw and histogram them a chunk of
+#distributions at a time instead, so the memory stays bounded whatever the number of
+#stomata. random_dtype = 'float32' halves the memory of the random points; their
+#coordinates are then rounded to about 2^-24 of their size (well under a nanometer for a
+#cotyledon a few millimeters across). The memory limit needs null_model = 'random'.
+
+memory_limit = None;
+random_dtype = 'float64';
+
+#Run report. Set run_report to a file name (for example 'run report.jsonl') to append one
+#JSON line per stage of every cotyledon and sector, with its wall time, CPU time, peak memory
+#and point, vertex and trial counts. Set profile_cotyledon to the file name of one dataset
+#to also run it under cProfile (the .prof file is saved next to the report).
+#Run space_instrument.py on the report for the totals of each stage.
+
+run_report = None;
+profile_cotyledon = None;
+
+#Number of worker processes. Cotyledons are independent, so with more than one worker
+#they are analyzed in parallel; outputs are identical to a serial run. Can also be set
+#from the command line with --workers N (0 uses every CPU core).
+
+workers = workerCount(1);
+
+#Define logarithmic distance bins for histogramming
+
+distance_fun = np.logspace(np.log10(15),np.log10(2500),15);
+distance_bins = np.insert(distance_fun,0,0);
 
-#Sector_Data is a 3xnxN array
+#Open the file list that contains the pathway for each dataset meant to be analyzed.
 
-#The first dimension is stomata distance histograms, random point histograms, and normalized ratio data.
+#filelist.csv should be the name of a list of pathways to each dataset file you want analyzed.
+#The first column should be the pathway to each dataset file, the second column is a savename, and the third column is phenotype.
 
-#The second dimension is the length of the number of distance bins n
+#Each dataset should correspond to one cotyledon,
+#which may have multiple sectors in separate worksheets within the xlsx file.
 
-#The third dimension is the total number of distance histograms N
+directory, save, phenotype = readFileList("filelist.csv"); #see above for what you should put in for filelist.csv
+
+#Analyze each individual dataset that the file list specifies.
+
+#Your xlsx file should have a worksheet should have a worksheet named Stomatal Postions,
+#a worksheet named Cotyledon Outline, and worksheets named Sector 1 Outline, Sector 2 Outline, etc.
     
-areas = np.asarray(Area_Data);
+#Each dataset should correspond to one cotyledon, which may have multiple sectors.
+
+settings = {'min_area': min_area, 'max_area': max_area, 'null_model': null_model,
+            'random_seed': random_seed, 'Ntrials': Ntrials, 'null_sampler': null_sampler, 'distance_bins': distance_bins,
+            'cache_dir': cache_dir, 'distance_backend': distance_backend, 'raster_resolution': raster_resolution,
+            'adaptive_precision': adaptive_precision, 'adaptive_batch': adaptive_batch, 'sector_mode': sector_mode,
+            'base_bin_width': None if raw_distances is None else base_bin_width,
+            'memory_limit': memory_limit, 'random_dtype': random_dtype,
+            'run_report': runReport(run_report, 'histograms', profile_cotyledon)};
+
+task_list = [(i, directory[i], settings) for i in range(0, len(directory))];
+results, failures = runCotyledons(histogramCotyledon, task_list, workers, labels = save);
+
+#Collect the histograms in filelist order. Cotyledons that failed are reported above and skipped.
 
-Total_Sector_Data = [Sector_Stomata,Sector_Random,Sector_Ratio];
-Sector_Data = np.asarray(Total_Sector_Data);
+cotyledon_results = [(i, save[i], phenotype[i], results[i]) for i in range(0, len(results)) if results[i] is not None];
 
+#Save the histograms as one results file with a row per sector. Each row holds the cotyledon
+#(its row in filelist.csv), its savename and phenotype, the sector number, the sector area,
+#the number of random distributions used, the distance bins, and the stomata, random point and normalized ratio histograms.
 
-np.save('filename here 1.npy',areas); #Filename for area data
-np.save('filename here 2.npy',Sector_Data); #File name for histogram data
+#Load it with space_results.loadResults, which memory-maps the file, and pick sectors with
+#selectSectors (by phenotype, area or cotyledon). sectorData turns rows into the 3xNxn
+#Sector_Data array of stomata, random and ratio histograms.
 
+Sector_Results = sectorResults(cotyledon_results, distance_bins);
+
+saveResults('sector results filename.npy', Sector_Results); #File name for the sector results
+
+if raw_distances is not None:
+    saveDistanceStore(raw_distances, cotyledon_results, distance_bins);
+
+if failures:
+    print("%d of %d cotyledons failed: %s" % (len(failures), len(directory), ', '.join(label for k, label, error in failures)));
 
 print("--- %s seconds ---" % (time.time() - start_time)); #If you want to know how long it took
 '''
 End of procedural section.
-'''
\ No newline at end of file
+'''
@@ -0,0 +1,439 @@
+#Per-cotyledon analysis steps of the SPACE pipeline scripts.
+#Each function analyzes one cotyledon of the file list and returns its results, so the
+#scripts can process cotyledons one after another or hand them to worker processes
+#(see space_parallel.py) and merge the results back in filelist order.
+
+import numpy as np;
+import shapely.geometry as shg;
+from shapely.ops import unary_union
+from space_geometry import computeSectorDistance, outlineEdges, signedSectorDistance, expectedSectorHistogram, pointsInPolygon, classifyPoints, nearestSectorDistance, sectorIndex, SectorRange, BUFFER_RESOLUTION, REGION_NAMES, SECTOR, IN_RANGE, OUTSIDE_RANGE, OUTSIDE_COTYLEDON
+from space_sampling import generateRandomSets, randomSetChunks, randomChunkTrials, cotyledonSeedSequence, COORDINATE_TYPES
+from space_cache import cachedCotyledon
+from space_ingest import sectorNumber
+from space_histogram import histogramCounts, randomSectorHistogram, nearestSectorHistograms, accumulateRandomChunk, adaptiveRandomHistograms, ADAPTIVE_BATCH
+from space_instrument import stageRecord
+from space_pairs import pairWindow, pairStatistics, pairEnvelope, EXACT_RADIUS, PAIR_RESOLUTION, ENVELOPE_TRIALS
+from space_raster import rasterGrid, signedDistanceMap, sampleDistanceMap, rasterSectorDistance, rasterSectorHistogram, RASTER_RESOLUTION
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Returns the stomata of a cotyledon that lie inside its outline. Any coordinates that are
+#somehow outside of the cotyledon boundary are removed. Coordinates keep their full
+#precision (they used to be truncated to whole microns, which moved every stoma by up to
+#1.4 microns, a lot next to the first distance bins).
+
+def insideStomata(cotyledon):
+    stomata_points = np.asarray(cotyledon['stomata'], dtype = np.float64);
+    return stomata_points[pointsInPolygon(cotyledon['outline'], stomata_points)];
+
+#Returns the indices of the sectors of a cotyledon whose area is within
+#[min_area, max_area] (area filter on sectors if desired).
+
+def keptSectors(cotyledon, min_area, max_area):
+    return [k for k in range(0, len(cotyledon['sectors'])) if min_area <= cotyledon['sector_areas'][k] <= max_area];
+
+#How the distances of a cotyledon with several sectors are histogrammed: 'each' histograms
+#every point against every sector, 'nearest' only against the sector nearest to it (one
+#histogram per sector), and 'pooled' sums the nearest-sector histograms into one.
+
+SECTOR_MODES = ('each', 'nearest', 'pooled');
+
+#Returns the normalized ratio histograms of the sectors of one cotyledon from their
+#stomata and random point histograms.
+
+def ratioHistograms(stomata_histograms, random_histograms):
+    ratio_histograms = [];
+    for k in range(0, len(stomata_histograms)):
+        ratio_histograms.append((stomata_histograms[k]/float(len(stomata_histograms)))/(random_histograms[k]/float(len(random_histograms)))-1);
+    return ratio_histograms;
+
+#Calculates stomatal distances from the sectors of one cotyledon and histograms them,
+#together with the distances of Ntrials random point distributions (or the analytic
+#expectation). index is the row of the cotyledon in the file list and file_name its
+#dataset. settings holds the script parameters: min_area, max_area, null_model,
+#random_seed, Ntrials, distance_bins and cache_dir, and optionally distance_backend:
+#'exact' (the default) or 'raster', which looks distances up in a distance map of each
+#sector at raster_resolution microns per pixel (see space_raster.py), and run_report
+#(see space_instrument.runReport) to record the time and memory of every stage.
+#With adaptive_precision set (a relative standard error, e.g. 0.01), Ntrials is the most
+#random distributions drawn, in batches of adaptive_batch, and each sector stops once its
+#random histogram is that precise.
+#null_sampler (one of space_sampling.SAMPLERS, 'uniform' by default) chooses how the random
+#point distributions are drawn.
+#With base_bin_width set, the result also holds the raw distances of every sector for
+#rebinning: its exact stomata distances ('stomata_distances') and a base histogram of its
+#random distances in bins of base_bin_width microns ('random_base'), see space_results.py.
+#memory_limit (bytes) draws and bins the random distributions a chunk of trials at a time
+#to stay within that much memory, and random_dtype ('float64' or 'float32') is the type of
+#their coordinates (see space_sampling.COORDINATE_TYPES).
+#sector_mode (one of SECTOR_MODES, 'each' by default) chooses whether points count for every
+#sector or only for their nearest one; 'pooled' returns a single row, sector 0, whose area
+#is the total area of the sectors.
+#Returns a dictionary with, for every sector that passes the area filter, its worksheet
+#number ('sectors'), its area ('areas'), its stomata, random and ratio histograms
+#('stomata', 'random', 'ratio') and the number of random distributions used ('trials').
+
+def histogramCotyledon(index, file_name, settings):
+    report = settings.get('run_report');
+    with stageRecord(report, 'cotyledon', True, index = index, cotyledon = file_name) as record:
+        result = histogramStages(index, file_name, settings, report);
+        record['sectors'] = len(result['areas']);
+    return result;
+
+#The stages of histogramCotyledon, each recorded in the run report (see space_instrument.py).
+
+def histogramStages(index, file_name, settings, report):
+    distance_bins = settings['distance_bins'];
+    null_model = settings['null_model'];
+    Ntrials = settings['Ntrials'];
+
+    # Reads in the data from the worksheets, or from the cache if this workbook was read before
+    with stageRecord(report, 'ingest') as record:
+        cotyledon = cachedCotyledon(file_name, settings['cache_dir']);
+        record['points'] = len(cotyledon['stomata']);
+        record['vertices'] = len(cotyledon['outline']) + sum([len(sector_points) for sector_points in cotyledon['sectors']]);
+
+    cotyledon_points = cotyledon['outline'];
+    stomata_count = len(cotyledon['stomata']);
+    with stageRecord(report, 'point_in_polygon', points = stomata_count, vertices = len(cotyledon_points)):
+        stomata_points = insideStomata(cotyledon);
+
+    #Draw all Ntrials random point distributions at once as an (Ntrials, N, 2) array.
+    #Points are drawn from the bounding box of the cotyledon and rejected draws are topped up,
+    #so every distribution has exactly N points inside the cotyledon, where N is the number of
+    #real stomata. The analytic null model needs no random points, and in adaptive mode or
+    #under a memory limit the distributions are drawn in chunks after the stomata histograms
+    #(see below).
+
+    sampler = settings.get('null_sampler', 'uniform');
+    precision = settings.get('adaptive_precision');
+    adaptive = null_model == 'random' and precision is not None;
+    raster = settings.get('distance_backend', 'exact') == 'raster';
+    sector_mode = settings.get('sector_mode', 'each');
+    if sector_mode not in SECTOR_MODES:
+        raise ValueError('Unknown sector mode %r, use one of %s' % (sector_mode, ', '.join(SECTOR_MODES)));
+    if sector_mode != 'each' and (null_model != 'random' or raster or adaptive):
+        raise ValueError('sector_mode %r needs the random null model, the exact distance backend and a fixed Ntrials' % sector_mode);
+    base_width = settings.get('base_bin_width');
+    if base_width is not None and (null_model != 'random' or adaptive or sector_mode != 'each'):
+        raise ValueError('Raw distances (base_bin_width) need the random null model, a fixed Ntrials and sector_mode \'each\'');
+    dtype = COORDINATE_TYPES[settings.get('random_dtype', 'float64')];
+    memory_limit = settings.get('memory_limit');
+    chunked = null_model == 'random' and not adaptive and memory_limit is not None;
+    random_sets = [];
+    if null_model == 'random':
+        rng = np.random.default_rng(cotyledonSeedSequence(settings['random_seed'], index));
+    if null_model == 'random' and not adaptive and not chunked:
+        with stageRecord(report, 'random_sampling', points = stomata_count, trials = Ntrials, vertices = len(cotyledon_points)):
+            random_sets = generateRandomSets(cotyledon_points, stomata_count, Ntrials, rng, sampler = sampler, dtype = dtype);
+
+    sectors = [];
+    areas = [];
+    stomata_histograms = [];
+    random_histograms = [];
+    trials = [];
+    measures = [];
+    stomata_distances = [];
+    random_bases = [];
+
+    if raster:
+        grid = rasterGrid([cotyledon_points] + list(cotyledon['sectors']), settings.get('raster_resolution', RASTER_RESOLUTION));
+
+    #Calculate distances from the stomata to each sector and histogram them, and histogram
+    #the distances from the random point distributions to the sector as they are measured.
+
+    #Random distances are histogrammed in aggregate, rather than individually, as we only
+    #care about approximating the expected value.
+
+    kept = keptSectors(cotyledon, settings['min_area'], settings['max_area']);
+    for k in kept:
+        sector_points = cotyledon['sectors'][k];
+
+        sectors.append(sectorNumber(cotyledon['sector_names'][k]));
+        areas.append(cotyledon['sector_areas'][k]);
+        trials.append(Ntrials);
+        if sector_mode != 'each':
+            continue;
+        with stageRecord(report, 'sector', sector = sectors[-1], vertices = len(sector_points)):
+            with stageRecord(report, 'stomata_distances', points = len(stomata_points)):
+                if raster:
+                    distance_map = signedDistanceMap(sector_points, grid);
+                    stomata_distances.append(rasterSectorDistance(stomata_points, distance_map, grid));
+                    measures.append(lambda points, distance_map = distance_map: sampleDistanceMap(distance_map, grid, points));
+                else:
+                    stomata_distances.append(computeSectorDistance(stomata_points, sector_points));
+                    measures.append(lambda points, edges = outlineEdges(sector_points): signedSectorDistance(points, *edges));
+                stomata_histograms.append(histogramCounts(stomata_distances[-1], distance_bins));
+
+            if adaptive or chunked:
+                continue;
+
+            #For the analytic null model the expected histogram counts are stored directly
+
+            with stageRecord(report, 'random_distances', points = stomata_count, trials = Ntrials, null_model = null_model):
+                if null_model == 'analytic':
+                    random_histograms.append(Ntrials*expectedSectorHistogram(cotyledon_points, sector_points, distance_bins, stomata_count));
+                elif raster:
+                    random_histograms.append(rasterSectorHistogram(random_sets, distance_map, grid, distance_bins, base_width = base_width));
+                else:
+                    random_histograms.append(randomSectorHistogram(random_sets, sector_points, distance_bins, base_width = base_width));
+                if base_width is not None:
+                    random_histograms[-1], base = random_histograms[-1];
+                    random_bases.append(base);
+
+    #Adaptive mode: random distributions are drawn in batches and measured against all sectors
+    #until the relative standard error of every random histogram bin of a sector is at most
+    #adaptive_precision, or Ntrials distributions have been drawn. The random histograms are
+    #scaled to Ntrials distributions, so sectors weigh the same as in a fixed run, and the
+    #number of distributions actually used is returned for each sector ('trials').
+
+    if adaptive:
+        batch = settings.get('adaptive_batch', ADAPTIVE_BATCH);
+        if memory_limit is not None:
+            batch = min(batch, randomChunkTrials(stomata_count, batch, memory_limit, dtype));
+        with stageRecord(report, 'adaptive_random', points = stomata_count, sectors = len(measures), target = precision, max_trials = Ntrials) as record:
+            counts, used = adaptiveRandomHistograms(cotyledon_points, stomata_count, measures, distance_bins, rng, precision, Ntrials,
+                                                    batch, sampler, dtype);
+            record['trials'] = used.tolist();
+        random_histograms = [counts[k]*(Ntrials/float(max(1, used[k]))) for k in range(0, len(measures))];
+        trials = used.tolist();
+
+    #Under a memory limit (bytes) the random distributions are drawn a chunk of trials at a
+    #time (see space_sampling.randomChunkTrials), and every chunk is measured against every
+    #sector and binned before the next one is drawn, so memory stays within the limit
+    #however large Ntrials x N is. The random points differ from a run without the limit.
+
+    if chunked and sector_mode == 'each' and kept:
+        trials_per_chunk = randomChunkTrials(stomata_count, Ntrials, memory_limit, dtype);
+        counts = np.zeros((len(measures), len(distance_bins) - 1), dtype = np.float64);
+        random_bases = [np.zeros(0, dtype = np.float64) for k in range(0, len(measures))];
+        with stageRecord(report, 'random_chunks', points = stomata_count, trials = Ntrials, sectors = len(measures), chunk_trials = trials_per_chunk):
+            for random_chunk in randomSetChunks(cotyledon_points, stomata_count, Ntrials, rng, trials_per_chunk, sampler, dtype):
+                for k in range(0, len(measures)):
+                    random_bases[k] = accumulateRandomChunk(counts[k], random_chunk, measures[k], distance_bins, random_bases[k], base_width);
+        random_histograms = list(counts);
+        if base_width is None:
+            random_bases = [];
+
+    #Nearest-sector modes: every point is measured once, against the sector nearest to it,
+    #with one bulk query of a spatial index over the outlines of all kept sectors, so a
+    #cotyledon with many sectors costs about as much as one with a single sector.
+
+    if sector_mode != 'each' and kept:
+        with stageRecord(report, 'nearest_sector', points = stomata_count, trials = Ntrials, sectors = len(kept)):
+            sector_index = sectorIndex([cotyledon['sectors'][k] for k in kept]);
+            stomata_histograms = list(nearestSectorHistograms(stomata_points, sector_index, distance_bins));
+            if chunked:
+                random_chunks = randomSetChunks(cotyledon_points, stomata_count, Ntrials, rng, randomChunkTrials(stomata_count, Ntrials, memory_limit, dtype), sampler, dtype);
+                random_histograms = list(np.sum([nearestSectorHistograms(random_chunk, sector_index, distance_bins) for random_chunk in random_chunks], axis = 0));
+            else:
+                random_histograms = list(nearestSectorHistograms(random_sets, sector_index, distance_bins));
+        if sector_mode == 'pooled':
+            sectors = [0];
+            areas = [float(np.sum(areas))];
+            trials = [Ntrials];
+            stomata_histograms = [np.sum(stomata_histograms, axis = 0)];
+            random_histograms = [np.sum(random_histograms, axis = 0)];
+
+    result = {'sectors': sectors, 'areas': areas, 'stomata': stomata_histograms, 'random': random_histograms,
+              'ratio': ratioHistograms(stomata_histograms, random_histograms), 'trials': trials};
+
+    #Raw distances: the exact stomata distances of every sector and the base histogram of its
+    #random distances, so the histograms can be rebinned without measuring anything again.
+
+    if base_width is not None:
+        result['stomata_distances'] = stomata_distances;
+        result['random_base'] = random_bases;
+        result['base_width'] = base_width;
+    return result;
+
+#Calculates the stomatal density of one cotyledon in three regions: its sectors, the
+#virtual range extended settings['sector_range'] beyond the sectors (excluding the sectors
+#themselves), and the remainder of the cotyledon. index and file_name are as for
+#histogramCotyledon; settings holds sector_range and cache_dir, and optionally run_report.
+#Returns the dictionary of densityRegions.
+
+def densityCotyledon(index, file_name, settings):
+    report = settings.get('run_report');
+    with stageRecord(report, 'cotyledon', True, index = index, cotyledon = file_name):
+
+        # Reads in the stomata, cotyledon and sector data from the worksheets
+        # in one read-only pass per worksheet, or from the cache if this workbook was read before
+        with stageRecord(report, 'ingest') as record:
+            cotyledon = cachedCotyledon(file_name, settings['cache_dir']);
+            record['points'] = len(cotyledon['stomata']);
+            record['vertices'] = len(cotyledon['outline']) + sum([len(sector_points) for sector_points in cotyledon['sectors']]);
+        with stageRecord(report, 'density', points = len(cotyledon['stomata']), sectors = len(cotyledon['sectors'])):
+            return densityRegions(cotyledon, settings['sector_range']);
+
+#Calculates the three densities of densityCotyledon for a loaded cotyledon, with virtual
+#sectors extended sector_range beyond the sectors.
+#Returns a dictionary with the three densities, the stomata counts and areas behind them,
+#the number of stomata outside the cotyledon, the stomata count of each sector on its own
+#('sector_counts'), and the sector and virtual sector outlines with their labels for plotting.
+
+def densityRegions(cotyledon, sector_range):
+    stomata_points = cotyledon['stomata'];
+    cotyledon_points = cotyledon['outline'];
+
+    #Creates virtual sectors based off desired range.
+
+    range_outlines = [SectorRange(sector_points, sector_range) for sector_points in cotyledon['sectors']];
+
+    #Label every stomata as sector, in_range, out_of_range or outside the cotyledon in one
+    #vectorized pass. A stomata in two overlapping sectors (or virtual sectors) is counted
+    #once, and stomata outside the cotyledon outline are left out of every region.
+
+    labels, in_sector = classifyPoints(stomata_points, cotyledon_points, cotyledon['sectors'], range_outlines);
+    region_counts = np.bincount(labels, minlength = len(REGION_NAMES));
+
+    #Calculate the areas of the same regions: the union of the sectors, the union of the
+    #virtual sectors excluding the sectors themselves, and the rest of the cotyledon,
+    #eliminating any extension beyond the cotyledon by intersecting with the cotyledon.
+
+    cotyledon_poly = shg.Polygon(cotyledon_points);
+    sector_union = unary_union([cotyledon_poly.intersection(shg.Polygon(points)) for points in cotyledon['sectors']]);
+    inter = unary_union([cotyledon_poly.intersection(shg.Polygon(points)) for points in range_outlines]);
+
+    sector_area = sector_union.area;
+    sector_range_area = inter.difference(sector_union).area; #in_range has to exclude the sector itself
+    outside_range_area = cotyledon_poly.area - inter.union(sector_union).area;
+
+    stomata_inside_sectors = int(region_counts[SECTOR]);
+    in_range = int(region_counts[IN_RANGE]);
+    out_of_range = int(region_counts[OUTSIDE_RANGE]);
+
+    return {
+        'in_range_density': in_range/sector_range_area,
+        'outside_range_density': out_of_range/outside_range_area,
+        'sector_density': stomata_inside_sectors/sector_area,
+        'stomata_inside_sectors': stomata_inside_sectors,
+        'in_range': in_range,
+        'out_of_range': out_of_range,
+        'outside_cotyledon': int(region_counts[OUTSIDE_COTYLEDON]),
+        'sector_counts': np.count_nonzero(in_sector & (labels != OUTSIDE_COTYLEDON), axis = 1),
+        'region_areas': np.asarray([sector_area, sector_range_area, outside_range_area], dtype = np.float64),
+        'sector_outlines': cotyledon['sectors'],
+        'range_outlines': range_outlines,
+        'sector_labels': [name.replace(' Outline', '') for name in cotyledon['sector_names']],
+    };
+
+#Range constructions of rangeSweepRegions: 'centroid' moves every outline point of a sector
+#radius further from the sector center (SectorRange, as in densityRegions), 'buffer' takes
+#every point of the cotyledon within radius of a sector (a true offset of the outline).
+
+RANGE_CONSTRUCTIONS = ('centroid', 'buffer');
+
+#Calculates the densities of densityRegions for every radius in radii at once.
+#The sectors and the cotyledon are tested once for all radii. For the 'buffer'
+#construction each stomata's distance to the nearest sector is computed once, and the
+#in_range counts of all radii are read off the sorted distances; the 'centroid' ranges
+#are not nested in general, so each radius has its own vectorized containment test.
+#area_cache is an optional dictionary from radius to the in_range area, filled in as areas
+#are computed, so areas are computed once per radius and can be kept between calls.
+#Returns a dictionary with the radii, and the len(radii) x 3 arrays of stomata counts,
+#areas and densities of the sector, in_range and out_of_range regions.
+
+def rangeSweepRegions(cotyledon, radii, construction = 'centroid', area_cache = None):
+    if construction not in RANGE_CONSTRUCTIONS:
+        raise ValueError('Unknown range construction %r, use one of %s' % (construction, ', '.join(RANGE_CONSTRUCTIONS)));
+    if area_cache is None:
+        area_cache = {};
+    radii = np.asarray(radii, dtype = np.float64);
+    stomata_points = cotyledon['stomata'];
+    sectors = cotyledon['sectors'];
+
+    #Stomata outside every sector but inside the cotyledon are the ones a range can take in.
+
+    labels, _ = classifyPoints(stomata_points, cotyledon['outline'], sectors);
+    candidates = stomata_points[labels == OUTSIDE_RANGE];
+
+    cotyledon_poly = shg.Polygon(cotyledon['outline']);
+    sector_union = unary_union([cotyledon_poly.intersection(shg.Polygon(points)) for points in sectors]);
+
+    if construction == 'buffer':
+        nearest = np.sort(nearestSectorDistance(candidates, sectors));
+        in_range = np.searchsorted(nearest, radii, side = 'right');
+        sector_shape = unary_union([shg.Polygon(points).buffer(0) for points in sectors]);
+    else:
+        in_range = np.zeros(len(radii), dtype = np.int64);
+        for k in range(0, len(radii)):
+            inside = np.zeros(len(candidates), dtype = bool);
+            for points in sectors:
+                inside |= pointsInPolygon(SectorRange(points, radii[k]), candidates);
+            in_range[k] = np.count_nonzero(inside);
+
+    for radius in radii:
+        if float(radius) not in area_cache:
+            if construction == 'buffer':
+                inter = cotyledon_poly.intersection(sector_shape.buffer(radius, BUFFER_RESOLUTION));
+            else:
+                inter = unary_union([cotyledon_poly.intersection(shg.Polygon(SectorRange(points, radius))) for points in sectors]);
+            area_cache[float(radius)] = inter.difference(sector_union).area;
+
+    range_area = np.asarray([area_cache[float(radius)] for radius in radii], dtype = np.float64);
+    counts = np.zeros((len(radii), 3), dtype = np.int64);
+    counts[:, 0] = np.count_nonzero(labels == SECTOR);
+    counts[:, 1] = in_range;
+    counts[:, 2] = len(candidates) - in_range;
+    areas = np.stack([np.full(len(radii), sector_union.area), range_area, cotyledon_poly.area - sector_union.area - range_area], axis = 1);
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        densities = counts/areas;
+    return {'radii': radii, 'counts': counts, 'areas': areas, 'densities': densities};
+
+#Range sweep of one cotyledon for the density script. index and file_name are as for
+#densityCotyledon; settings holds sector_ranges, range_construction and cache_dir, and
+#optionally run_report.
+
+def rangeSweepCotyledon(index, file_name, settings):
+    report = settings.get('run_report');
+    with stageRecord(report, 'cotyledon', True, index = index, cotyledon = file_name):
+        with stageRecord(report, 'ingest') as record:
+            cotyledon = cachedCotyledon(file_name, settings['cache_dir']);
+            record['points'] = len(cotyledon['stomata']);
+        with stageRecord(report, 'sweep', points = len(cotyledon['stomata']), sectors = len(cotyledon['sectors']), ranges = len(settings['sector_ranges'])):
+            return rangeSweepRegions(cotyledon, settings['sector_ranges'], settings['range_construction']);
+
+#Stomata-stomata pair statistics of one cotyledon: the pair correlation g(r) and Ripley's
+#K and L of the stomata inside the cotyledon over settings['distance_bins'], with their
+#envelope under complete spatial randomness (see space_pairs.py). index and file_name are
+#as for histogramCotyledon; settings holds distance_bins, random_seed, envelope_trials and
+#cache_dir, and optionally exact_radius, pair_resolution and run_report.
+#Returns the dictionary of stomataPairStatistics.
+
+def pairCorrelationCotyledon(index, file_name, settings):
+    report = settings.get('run_report');
+    with stageRecord(report, 'cotyledon', True, index = index, cotyledon = file_name):
+        with stageRecord(report, 'ingest') as record:
+            cotyledon = cachedCotyledon(file_name, settings['cache_dir']);
+            record['points'] = len(cotyledon['stomata']);
+        return stomataPairStatistics(cotyledon, index, settings, report);
+
+#Calculates the pair statistics of pairCorrelationCotyledon for a loaded cotyledon in row
+#index of the file list. The envelope patterns are drawn from a child of the cotyledon's
+#seeded stream, so they do not depend on whether the random point histograms were drawn.
+#Returns the dictionary of pairStatistics with the envelope of pairEnvelope (unless
+#envelope_trials is 0), the number of stomata ('stomata') and the cotyledon area ('area').
+
+def stomataPairStatistics(cotyledon, index, settings, report = None):
+    stomata_points = insideStomata(cotyledon);
+    with stageRecord(report, 'pair_window', vertices = len(cotyledon['outline'])):
+        window = pairWindow(cotyledon['outline'], settings['distance_bins'], settings.get('exact_radius', EXACT_RADIUS),
+                            settings.get('pair_resolution', PAIR_RESOLUTION));
+    with stageRecord(report, 'pair_statistics', points = len(stomata_points)):
+        result = pairStatistics(stomata_points, window);
+
+    envelope_trials = settings.get('envelope_trials', ENVELOPE_TRIALS);
+    if envelope_trials > 0:
+        with stageRecord(report, 'pair_envelope', points = len(stomata_points), trials = envelope_trials):
+            rng = np.random.default_rng(cotyledonSeedSequence(settings['random_seed'], index).spawn(1)[0]);
+            result.update(pairEnvelope(cotyledon['outline'], len(stomata_points), window, rng, envelope_trials));
+    result['stomata'] = len(stomata_points);
+    result['area'] = window['area'];
+    return result;
+
+'''
+End of function definition section.
+'''
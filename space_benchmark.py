@@ -0,0 +1,329 @@
+#Benchmark suite for the SPACE pipeline scripts.
+#Generates synthetic cotyledons at controlled scales (number of stomata, sectors, outline
+#vertices and random trials), writes them as workbooks in the dataset format, and times each
+#stage of the analysis on its own: ingest, point-in-polygon, random sampling, distance
+#computation, histogramming, density and correlation. Timings are saved as JSON so runs
+#on different commits or machines can be compared with --compare. Each case also compares
+#the null samplers: the variance of the random histograms of each sampler against plain
+#uniform sampling at the same number of trials.
+#
+#    python space_benchmark.py --preset quick --out benchmark.json
+#    python space_benchmark.py --case 100000 10 1000 1000 --repeat 3 --compare benchmark.json
+
+import os;
+import sys;
+import json;
+import time;
+import platform;
+import argparse;
+import tempfile;
+import subprocess;
+import numpy as np;
+from space_ingest import loadCotyledon
+from space_geometry import outlineEdges, signedSectorDistance
+from space_sampling import generateRandomSets, cotyledonSeedSequence, SAMPLERS
+from space_histogram import accumulateCounts, trialCounts, relativeStandardError
+from space_analysis import insideStomata, densityRegions
+from space_correlation import groupedCorrelation, bootstrapInterval
+from space_synthetic import syntheticCotyledon, writeCotyledonWorkbook
+from space_pipeline import PARAMETERS
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Stages in the order they run, as named in the JSON output.
+
+BENCHMARK_STAGES = ['ingest', 'point_in_polygon', 'random_sampling', 'distances', 'histogramming', 'density', 'correlation'];
+
+#Cases of each preset as (stomata, sectors, vertices, Ntrials). The full preset spans
+#10^3-10^6 stomata, 1-50 sectors, 50-5000 vertices and 100-10000 trials.
+
+PRESETS = {
+    'quick': [(1000, 1, 50, 100), (10000, 5, 50, 100)],
+    'standard': [(1000, 1, 50, 100), (10000, 10, 500, 1000), (100000, 25, 1000, 1000), (100000, 50, 5000, 100)],
+    'full': [(1000, 1, 50, 100), (1000, 50, 5000, 10000), (10000, 10, 500, 1000), (100000, 25, 1000, 1000),
+             (100000, 50, 5000, 100), (1000000, 1, 50, 100), (1000000, 50, 5000, 10000)],
+};
+
+#Largest number of random points measured per case. Cases with more (stomata x Ntrials)
+#are measured on as many whole trials as fit, and their random sampling, distance and
+#histogramming times are scaled up linearly to all Ntrials (marked 'extrapolated').
+
+MAX_RANDOM_POINTS = 2*10**7;
+
+#Random points sampled and measured at once.
+
+CHUNK_POINTS = 2**20;
+
+#Random trials measured per sampler in the sampler comparison (fewer when the stomata of a
+#case would exceed a share of MAX_RANDOM_POINTS).
+
+VARIANCE_TRIALS = 100;
+
+#Distance bins and density range used for every case: the pipeline defaults, so the
+#histogramming times and the sampler comparison match production runs.
+
+DISTANCE_BINS = np.asarray(PARAMETERS['distance_bins'], dtype = np.float64);
+SECTOR_RANGE = PARAMETERS['sector_range'];
+
+#Returns the current git commit of the repository, or None outside a git checkout.
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)),
+                              capture_output = True, text = True, check = True).stdout.strip();
+    except (OSError, subprocess.CalledProcessError):
+        return None;
+
+#Returns the workbook of a case in data_dir, writing it first if it is not there yet.
+#Workbook names carry the case and seed, so workbooks are reused between runs.
+
+def caseWorkbook(data_dir, stomata, sectors, vertices, seed):
+    file_name = os.path.join(data_dir, 'synthetic_%d_%d_%d_seed%d.xlsx' % (stomata, sectors, vertices, seed));
+    if not os.path.exists(file_name):
+        writeCotyledonWorkbook(file_name, syntheticCotyledon(stomata, sectors, vertices, seed = seed));
+    return file_name;
+
+#Times every stage of the analysis once for one cotyledon workbook. Returns a dictionary
+#of seconds per stage and the number of random trials that were measured.
+
+def timeStages(file_name, Ntrials, bootstrap_replicates, seed = 0):
+    seconds = {};
+
+    start = time.perf_counter();
+    cotyledon = loadCotyledon(file_name);
+    seconds['ingest'] = time.perf_counter() - start;
+
+    start = time.perf_counter();
+    stomata_points = insideStomata(cotyledon);
+    seconds['point_in_polygon'] = time.perf_counter() - start;
+
+    stomata_count = len(cotyledon['stomata']);
+    edges = [outlineEdges(sector_points) for sector_points in cotyledon['sectors']];
+    stomata_histograms = np.zeros((len(edges), len(DISTANCE_BINS) - 1));
+    random_histograms = np.zeros((len(edges), len(DISTANCE_BINS) - 1));
+    measured_trials = max(1, min(Ntrials, MAX_RANDOM_POINTS // max(1, stomata_count)));
+    trials_per_chunk = max(1, CHUNK_POINTS // max(1, stomata_count));
+    rng = np.random.default_rng(cotyledonSeedSequence(seed, 0));
+    for stage in ['random_sampling', 'distances', 'histogramming']:
+        seconds[stage] = 0.0;
+
+    #Stomata distances and histograms
+
+    for k in range(0, len(edges)):
+        start = time.perf_counter();
+        distances = signedSectorDistance(stomata_points, *edges[k]);
+        seconds['distances'] += time.perf_counter() - start;
+        start = time.perf_counter();
+        accumulateCounts(stomata_histograms[k], distances[distances > 0], DISTANCE_BINS);
+        seconds['histogramming'] += time.perf_counter() - start;
+
+    #Random point distributions, a chunk of trials at a time
+
+    for trial in range(0, measured_trials, trials_per_chunk):
+        start = time.perf_counter();
+        random_sets = generateRandomSets(cotyledon['outline'], stomata_count, min(trials_per_chunk, measured_trials - trial), rng);
+        seconds['random_sampling'] += time.perf_counter() - start;
+        for k in range(0, len(edges)):
+            start = time.perf_counter();
+            distances = signedSectorDistance(random_sets, *edges[k]).ravel();
+            seconds['distances'] += time.perf_counter() - start;
+            start = time.perf_counter();
+            accumulateCounts(random_histograms[k], distances[distances > 0], DISTANCE_BINS);
+            seconds['histogramming'] += time.perf_counter() - start;
+
+    #Scale the random part up to all Ntrials. The stomata part is measured once per case,
+    #so only the random share of the distance and histogram times is scaled.
+
+    if measured_trials < Ntrials:
+        scale = Ntrials/float(measured_trials);
+        seconds['random_sampling'] *= scale;
+        random_share = measured_trials/float(measured_trials + 1);
+        for stage in ['distances', 'histogramming']:
+            seconds[stage] *= (1 - random_share) + random_share*scale;
+
+    start = time.perf_counter();
+    densityRegions(cotyledon, SECTOR_RANGE);
+    seconds['density'] = time.perf_counter() - start;
+
+    #All sectors of the cotyledon form one group
+
+    start = time.perf_counter();
+    groupedCorrelation(stomata_histograms, random_histograms, np.zeros(len(edges), dtype = int));
+    bootstrapInterval(stomata_histograms, random_histograms, bootstrap_replicates, seed);
+    seconds['correlation'] = time.perf_counter() - start;
+
+    return seconds, measured_trials;
+
+#Compares the null samplers on one cotyledon: draws the same number of random distributions
+#with each sampler, histograms each distribution against every sector with DISTANCE_BINS,
+#and returns a dictionary per sampler with the sampling time, the largest relative standard
+#error of the mean histograms over all bins of all sectors, the variance of each bin
+#relative to uniform sampling ('variance_ratio', uniform variance / sampler variance, sector
+#by sector), and 'trial_factor', how many times more uniform trials give the same largest
+#relative standard error.
+
+def samplerVariance(cotyledon, samplers = SAMPLERS, seed = 0):
+    stomata_count = len(cotyledon['stomata']);
+    trials = int(max(2, min(VARIANCE_TRIALS, MAX_RANDOM_POINTS // (len(SAMPLERS)*max(1, stomata_count)))));
+    trials_per_chunk = max(1, CHUNK_POINTS // max(1, stomata_count));
+    edges = [outlineEdges(sector_points) for sector_points in cotyledon['sectors']];
+    samplers = ['uniform'] + [sampler for sampler in samplers if sampler != 'uniform'];
+
+    comparison = {};
+    for sampler in samplers:
+        rng = np.random.default_rng(cotyledonSeedSequence(seed, 1));
+        counts = [];
+        seconds = 0.0;
+        for trial in range(0, trials, trials_per_chunk):
+            start = time.perf_counter();
+            random_sets = generateRandomSets(cotyledon['outline'], stomata_count, min(trials_per_chunk, trials - trial), rng, sampler = sampler);
+            seconds += time.perf_counter() - start;
+            counts.append(np.hstack([trialCounts(signedSectorDistance(random_sets, *sector_edges), DISTANCE_BINS) for sector_edges in edges]));
+        counts = np.concatenate(counts);
+        comparison[sampler] = {'trials': trials, 'sampling_seconds': seconds,
+                               'relative_error': relativeStandardError(counts.sum(axis = 0), (counts*counts).sum(axis = 0), trials),
+                               'variance': np.var(counts, axis = 0, ddof = 1).tolist()};
+
+    uniform = comparison['uniform'];
+    for sampler in samplers:
+        variance = np.asarray(comparison[sampler]['variance']);
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            ratio = np.where(variance > 0, np.asarray(uniform['variance'])/variance, np.nan);
+        comparison[sampler]['variance_ratio'] = [None if np.isnan(value) else float(value) for value in ratio];
+        error = comparison[sampler]['relative_error'];
+        comparison[sampler]['trial_factor'] = (uniform['relative_error']/error)**2 if error > 0 else None;
+    return comparison;
+
+#Returns a one-line summary of the sampler comparison of a case.
+
+def formatSamplers(comparison):
+    parts = [];
+    for sampler in comparison:
+        ratios = [value for value in comparison[sampler]['variance_ratio'] if value is not None];
+        factor = comparison[sampler]['trial_factor'];
+        parts.append('%s %.3fs error %.4f variance /%.1f (median bin) trials /%s' % (sampler, comparison[sampler]['sampling_seconds'], comparison[sampler]['relative_error'],
+                     np.median(ratios) if ratios else np.nan, '%.1f' % factor if factor else '-'));
+    return '    null samplers at %d trials: %s' % (comparison['uniform']['trials'], ' | '.join(parts));
+
+#Runs the benchmark cases, each repeat times on the same workbook, and returns the report
+#as a dictionary: the run environment and, per case, the best and all times of each stage.
+
+def runBenchmark(cases, repeat = 1, data_dir = None, bootstrap_replicates = 10000, seed = 0, samplers = SAMPLERS):
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': gitCommit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'bootstrap_replicates': bootstrap_replicates,
+        'distance_bins': DISTANCE_BINS.tolist(),
+        'sector_range': SECTOR_RANGE,
+        'cases': [],
+    };
+
+    with tempfile.TemporaryDirectory() as temporary:
+        for stomata, sectors, vertices, Ntrials in cases:
+            start = time.perf_counter();
+            file_name = caseWorkbook(data_dir or temporary, stomata, sectors, vertices, seed);
+            write_seconds = time.perf_counter() - start;
+
+            runs = [];
+            for r in range(0, repeat):
+                seconds, measured_trials = timeStages(file_name, Ntrials, bootstrap_replicates, seed);
+                runs.append(seconds);
+
+            stages = {};
+            for stage in BENCHMARK_STAGES:
+                times = [run[stage] for run in runs];
+                stages[stage] = {'seconds': min(times), 'all': times};
+            comparison = samplerVariance(loadCotyledon(file_name), samplers, seed) if samplers else None;
+            case = {
+                'stomata': stomata, 'sectors': sectors, 'vertices': vertices, 'Ntrials': Ntrials,
+                'measured_trials': measured_trials, 'extrapolated': measured_trials < Ntrials,
+                'workbook_seconds': write_seconds,
+                'stages': stages,
+                'total_seconds': sum([stages[stage]['seconds'] for stage in BENCHMARK_STAGES]),
+                'null_samplers': comparison,
+            };
+            report['cases'].append(case);
+            print(formatCase(case));
+            if comparison:
+                print(formatSamplers(comparison));
+            sys.stdout.flush();
+
+    return report;
+
+#Returns a one-line summary of a benchmark case.
+
+def formatCase(case):
+    label = '%8d stomata %3d sectors %5d vertices %6d trials' % (case['stomata'], case['sectors'], case['vertices'], case['Ntrials']);
+    times = ' '.join(['%s %.3fs' % (stage, case['stages'][stage]['seconds']) for stage in BENCHMARK_STAGES]);
+    return '%s | %s | total %.3fs%s' % (label, times, case['total_seconds'], ' (extrapolated)' if case['extrapolated'] else '');
+
+#Saves a report as JSON under a temporary name and renames it.
+
+def saveReport(file_name, report):
+    temporary = '%s.%d.tmp' % (file_name, os.getpid());
+    with open(temporary, 'w') as f:
+        json.dump(report, f, indent = 1);
+    os.replace(temporary, file_name);
+
+#Prints the time of every stage of report relative to a baseline report, for the cases
+#both contain (new/old: below 1 is faster).
+
+def compareReports(report, baseline):
+    key = lambda case: (case['stomata'], case['sectors'], case['vertices'], case['Ntrials']);
+    old_cases = dict([(key(case), case) for case in baseline['cases']]);
+    print('Compared with %s (commit %s):' % (baseline.get('created'), baseline.get('commit')));
+    for case in report['cases']:
+        old = old_cases.get(key(case));
+        if old is None:
+            continue;
+        ratios = [];
+        for stage in BENCHMARK_STAGES + ['total']:
+            new_seconds = case['total_seconds'] if stage == 'total' else case['stages'][stage]['seconds'];
+            old_seconds = old['total_seconds'] if stage == 'total' else old['stages'].get(stage, {}).get('seconds');
+            ratios.append('%s %s' % (stage, '%.2fx' % (new_seconds/old_seconds) if old_seconds else '-'));
+        print('%s: %s' % (key(case), ' '.join(ratios)));
+
+
+'''
+End of function definition section.
+'''
+
+
+'''
+Begin of procedural section.
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Time each stage of the SPACE analysis on synthetic cotyledons.');
+    parser.add_argument('--preset', choices = sorted(PRESETS.keys()), default = None, help = 'set of cases to run (default quick when no --case is given)');
+    parser.add_argument('--case', nargs = 4, type = int, action = 'append', default = [], metavar = ('STOMATA', 'SECTORS', 'VERTICES', 'NTRIALS'), help = 'add a case (may be repeated)');
+    parser.add_argument('--repeat', type = int, default = 1, help = 'runs of each case; the fastest is reported');
+    parser.add_argument('--bootstrap', type = int, default = 10000, help = 'bootstrap replicates of the correlation stage');
+    parser.add_argument('--seed', type = int, default = 0);
+    parser.add_argument('--samplers', nargs = '*', choices = SAMPLERS, default = list(SAMPLERS), help = 'null samplers to compare with uniform sampling; none skips the comparison (default all)');
+    parser.add_argument('--data-dir', default = None, help = 'keep the synthetic workbooks here and reuse them (default: a temporary directory)');
+    parser.add_argument('--out', default = 'benchmark.json');
+    parser.add_argument('--compare', default = None, help = 'earlier benchmark JSON to compare against');
+    args = parser.parse_args();
+
+    cases = [tuple(case) for case in args.case];
+    if args.preset is not None or not cases:
+        cases = PRESETS[args.preset or 'quick'] + cases;
+    if args.data_dir is not None:
+        os.makedirs(args.data_dir, exist_ok = True);
+
+    report = runBenchmark(cases, args.repeat, args.data_dir, args.bootstrap, args.seed, args.samplers);
+    saveReport(args.out, report);
+    print('Saved %s' % args.out);
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compareReports(report, json.load(f));
@@ -0,0 +1,161 @@
+#Cache of parsed cotyledon datasets for the SPACE pipeline scripts.
+#Each parsed workbook is stored as an .npz sidecar named after the hash of the workbook
+#contents and the parser version, so later runs of any script skip the .xlsx parsing.
+#Run this file with --purge to empty the cache, or --list to see what it holds.
+
+import os;
+import hashlib;
+import argparse;
+import numpy as np;
+from space_ingest import loadCotyledon, PARSER_VERSION
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Default cache folder (relative to where the scripts are run) and size limit.
+#When the cache grows past the limit, the least recently used datasets are removed.
+
+CACHE_DIR = '.space_cache';
+CACHE_MAX_BYTES = 512*2**20;
+
+#Returns the hex digest of the contents of a file, read in blocks.
+
+def workbookHash(file_name, block_size = 2**20):
+    digest = hashlib.blake2b(digest_size = 20);
+    with open(file_name, 'rb') as f:
+        block = f.read(block_size);
+        while block:
+            digest.update(block);
+            block = f.read(block_size);
+    return digest.hexdigest();
+
+#Returns the sidecar path for a workbook. The name combines the content hash and the
+#parser version, so an edited workbook or a newer parser never hits an old entry.
+
+def cachePath(file_name, cache_dir = CACHE_DIR):
+    return os.path.join(cache_dir, '%s-v%d.npz' % (workbookHash(file_name), PARSER_VERSION));
+
+#Writes a parsed cotyledon to an .npz file. Sector outlines are stored concatenated
+#with their start offsets so the file holds plain arrays only. The file is written under
+#a temporary name and renamed, so parallel runs never read a half-written entry.
+
+def saveCotyledon(path, cotyledon):
+    sectors = cotyledon['sectors'];
+    offsets = np.cumsum([0] + [len(points) for points in sectors]);
+    temporary = '%s.%d.tmp' % (path, os.getpid());
+    with open(temporary, 'wb') as f:
+        np.savez(f,
+                 stomata = cotyledon['stomata'],
+                 outline = cotyledon['outline'],
+                 sector_names = np.asarray(cotyledon['sector_names'], dtype = np.str_),
+                 sector_points = np.concatenate(sectors) if sectors else np.zeros((0, 2)),
+                 sector_offsets = offsets,
+                 sector_areas = cotyledon['sector_areas']);
+    os.replace(temporary, path);
+
+#Reads a cotyledon written by saveCotyledon back into the dictionary layout of loadCotyledon.
+
+def readCotyledon(path):
+    with np.load(path, allow_pickle = False) as data:
+        offsets = data['sector_offsets'];
+        sector_points = data['sector_points'];
+        return {
+            'stomata': data['stomata'],
+            'outline': data['outline'],
+            'sector_names': [str(name) for name in data['sector_names']],
+            'sectors': [sector_points[offsets[k]:offsets[k + 1]] for k in range(0, len(offsets) - 1)],
+            'sector_areas': data['sector_areas'],
+        };
+
+#Removes the least recently used entries until the cache holds at most max_bytes.
+#Cache hits refresh the modification time of their entry, which orders the entries.
+
+def evictCache(cache_dir = CACHE_DIR, max_bytes = CACHE_MAX_BYTES):
+    if not os.path.isdir(cache_dir):
+        return;
+    entries = [];
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npz'):
+            path = os.path.join(cache_dir, name);
+            try:
+                info = os.stat(path); #another process may have evicted it meanwhile
+            except OSError:
+                continue;
+            entries.append((info.st_mtime, info.st_size, path));
+    entries.sort();
+    total = sum(size for mtime, size, path in entries);
+    for mtime, size, path in entries:
+        if total <= max_bytes:
+            break;
+        try:
+            os.remove(path);
+        except OSError:
+            pass;
+        total -= size;
+
+#Removes every entry from the cache and returns the number of files removed.
+
+def purgeCache(cache_dir = CACHE_DIR):
+    removed = 0;
+    if not os.path.isdir(cache_dir):
+        return removed;
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npz') or name.endswith('.tmp'):
+            os.remove(os.path.join(cache_dir, name));
+            removed += 1;
+    return removed;
+
+#Loads one cotyledon dataset, from the cache if this workbook has been parsed before and
+#from the .xlsx file otherwise, in which case the parsed dataset is added to the cache.
+#A cache_dir of None turns the cache off and always parses the workbook.
+
+def cachedCotyledon(file_name, cache_dir = CACHE_DIR, max_bytes = CACHE_MAX_BYTES):
+    if cache_dir is None:
+        return loadCotyledon(file_name);
+
+    path = cachePath(file_name, cache_dir);
+    if os.path.exists(path):
+        try:
+            cotyledon = readCotyledon(path);
+            os.utime(path, None);
+            return cotyledon;
+        except (OSError, ValueError, KeyError):
+            pass; #Unreadable entry, parse the workbook again and overwrite it
+
+    cotyledon = loadCotyledon(file_name);
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok = True);
+    saveCotyledon(path, cotyledon);
+    evictCache(cache_dir, max_bytes);
+    return cotyledon;
+
+
+'''
+End of function definition section.
+'''
+
+
+'''
+Begin of procedural section.
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Manage the cache of parsed cotyledon workbooks.');
+    parser.add_argument('--cache-dir', default = CACHE_DIR, help = 'cache folder (default %(default)s)');
+    parser.add_argument('--purge', action = 'store_true', help = 'remove every cached dataset');
+    parser.add_argument('--max-mb', type = float, help = 'evict least recently used datasets down to this size');
+    parser.add_argument('--list', action = 'store_true', help = 'list the cached datasets');
+    args = parser.parse_args();
+
+    if args.purge:
+        print('Removed %d cached files from %s' % (purgeCache(args.cache_dir), args.cache_dir));
+    if args.max_mb is not None:
+        evictCache(args.cache_dir, int(args.max_mb*2**20));
+    if args.list and os.path.isdir(args.cache_dir):
+        for name in sorted(os.listdir(args.cache_dir)):
+            print('%10d  %s' % (os.path.getsize(os.path.join(args.cache_dir, name)), name));
+
+'''
+End of procedural section.
+'''
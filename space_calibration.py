@@ -0,0 +1,186 @@
+#Calibration harness for the sector-stomata correlation estimator of the SPACE scripts.
+#Draws thousands of synthetic cohorts with a known stomata pattern around the sectors of one
+#cotyledon (clustered, inhibitory, complete spatial randomness or a gradient, see
+#space_synthetic.patternSampler), runs each cohort through the same steps as the histogram
+#and correlation scripts, and compares the estimates with the correlation function the
+#pattern gives in expectation: the bias and spread of the estimate in each bin, and how
+#often the bootstrap and propagated 95% confidence bands cover the true value.
+#
+#    python space_calibration.py --pattern clustered --replicates 2000 --workers 0
+#    python space_calibration.py --template cotyledon.xlsx --pattern csr --out calibration.json
+
+import os;
+import json;
+import time;
+import argparse;
+import numpy as np;
+from space_ingest import loadCotyledon
+from space_geometry import computeSectorDistance
+from space_sampling import generateRandomSets, cotyledonSeedSequence
+from space_histogram import histogramCounts, randomSectorHistogram
+from space_analysis import insideStomata
+from space_correlation import groupedCorrelation, bootstrapInterval
+from space_parallel import runCotyledons
+from space_synthetic import syntheticCotyledon, patternSampler, drawPattern, expectedCorrelation, PATTERNS, PATTERN_RESOLUTION
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Most replicates (synthetic cohorts) analyzed per worker task. The pattern sampler is sent
+#to the workers with every task, so replicates go out in blocks, smaller for short runs so
+#every worker gets some.
+
+CALIBRATION_BLOCK = 50;
+
+#Distance bins of the histogram script.
+
+DISTANCE_BINS = np.insert(np.logspace(np.log10(15), np.log10(2500), 15), 0, 0);
+
+#Analyzes a block of replicates. Each replicate is a cohort of settings['cotyledons']
+#cotyledons of settings['stomata'] stomata drawn from the pattern sampler, from the random
+#stream of the replicate (seeded from the run seed and the replicate number). The stomata
+#histograms of every sector are computed as in the histogram script, and the random
+#histograms (the same for every cotyledon of the template) are settings['random'].
+#Returns the (replicates, bins) arrays of the correlation function ('y'), its propagated
+#error ('err') and bootstrap band ('low', 'high').
+
+def calibrationBlock(first, count, sampler, settings):
+    distance_bins = settings['distance_bins'];
+    sectors = settings['sectors'];
+    keys = {'y': [], 'err': [], 'low': [], 'high': []};
+    for replicate in range(first, first + count):
+        rng = np.random.default_rng(cotyledonSeedSequence(settings['seed'], replicate));
+        cohort = drawPattern(sampler, settings['stomata'], settings['cotyledons'], rng);
+        stomata_histograms = [];
+        cotyledons = [];
+        for k in range(0, len(cohort)):
+            stomata_points = insideStomata({'stomata': cohort[k], 'outline': sampler['outline']});
+            for sector_points in sectors:
+                stomata_histograms.append(histogramCounts(computeSectorDistance(stomata_points, sector_points), distance_bins));
+                cotyledons.append(k);
+        random_histograms = np.tile(settings['random'], (len(cohort), 1));
+
+        result = groupedCorrelation(stomata_histograms, random_histograms, np.zeros(len(stomata_histograms), dtype = int));
+        keys['y'].append(result['y'][0]);
+        keys['err'].append(result['err'][0]);
+        if settings['bootstrap_replicates'] > 0:
+            low, high = bootstrapInterval(stomata_histograms, random_histograms, settings['bootstrap_replicates'], replicate,
+                                          cotyledons if settings['bootstrap_resample'] == 'cotyledons' else None);
+        else:
+            low = high = np.full(len(distance_bins) - 1, np.nan);
+        keys['low'].append(low);
+        keys['high'].append(high);
+    return dict([(key, np.asarray(keys[key])) for key in keys]);
+
+#Runs the calibration of one pattern on a template cotyledon (a dictionary with 'outline'
+#and 'sectors', as from loadCotyledon). The random histograms of every sector are computed
+#once from Ntrials random distributions of the template, as in the histogram script.
+#Returns a dictionary with the settings, the expected correlation function ('truth') and
+#the per-bin summary of summarizeCalibration.
+
+def runCalibration(template, pattern, strength, scale, replicates, cotyledons, stomata, Ntrials = 1000,
+                   bootstrap_replicates = 1000, bootstrap_resample = 'sectors', seed = 0, workers = 1,
+                   distance_bins = DISTANCE_BINS, resolution = PATTERN_RESOLUTION):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    start = time.perf_counter();
+    sampler = patternSampler(template['outline'], template['sectors'], pattern, strength, scale, resolution);
+    truth = expectedCorrelation(sampler, distance_bins);
+
+    rng = np.random.default_rng(cotyledonSeedSequence(seed, replicates));
+    random_sets = generateRandomSets(template['outline'], stomata, Ntrials, rng);
+    random = np.asarray([randomSectorHistogram(random_sets, sector_points, distance_bins) for sector_points in template['sectors']]);
+    del random_sets;
+
+    settings = {'distance_bins': distance_bins, 'sectors': list(template['sectors']), 'random': random, 'seed': seed,
+                'stomata': stomata, 'cotyledons': cotyledons, 'bootstrap_replicates': bootstrap_replicates,
+                'bootstrap_resample': bootstrap_resample};
+    block = max(1, min(CALIBRATION_BLOCK, -(-replicates // (4*workers))));
+    task_list = [(first, min(block, replicates - first), sampler, settings) for first in range(0, replicates, block)];
+    results, failures = runCotyledons(calibrationBlock, task_list, workers, labels = ['replicates %d+' % task[0] for task in task_list]);
+    if failures:
+        raise RuntimeError('Calibration failed:\n' + failures[0][2]);
+    estimates = dict([(key, np.concatenate([result[key] for result in results])) for key in results[0]]);
+
+    return {'pattern': pattern, 'strength': strength, 'scale': scale, 'replicates': replicates, 'cotyledons': cotyledons,
+            'stomata': stomata, 'sectors': len(template['sectors']), 'Ntrials': Ntrials, 'bootstrap_replicates': bootstrap_replicates,
+            'bootstrap_resample': bootstrap_resample, 'seed': seed, 'resolution': resolution,
+            'distance_bins': distance_bins.tolist(), 'truth': truth.tolist(), 'seconds': time.perf_counter() - start,
+            'summary': summarizeCalibration(estimates, truth)};
+
+#Summarizes the estimates of all replicates against the true correlation function, per bin:
+#the mean estimate, its bias and standard deviation over the replicates, the root mean
+#square error, and the share of replicates whose bootstrap band and propagated band
+#(y +- err) contain the true value. Replicates with no estimate in a bin are left out.
+
+def summarizeCalibration(estimates, truth):
+    y = estimates['y'];
+    with np.errstate(invalid = 'ignore'):
+        mean = np.nanmean(y, axis = 0);
+        bootstrap = (estimates['low'] <= truth) & (truth <= estimates['high']);
+        propagated = np.abs(y - truth) <= estimates['err'];
+    valid = np.isfinite(y);
+    counted = np.maximum(np.sum(valid, axis = 0), 1);
+    with np.errstate(invalid = 'ignore'):
+        return {'mean': mean.tolist(), 'bias': (mean - truth).tolist(), 'std': np.nanstd(y, axis = 0).tolist(),
+                'rmse': np.sqrt(np.nanmean((y - truth)**2, axis = 0)).tolist(),
+                'bootstrap_coverage': (np.sum(bootstrap & valid, axis = 0)/counted).tolist(),
+                'propagated_coverage': (np.sum(propagated & valid, axis = 0)/counted).tolist(),
+                'estimates': np.sum(valid, axis = 0).tolist()};
+
+#Prints the summary of a calibration as a table, one line per distance bin.
+
+def printCalibration(calibration):
+    summary = calibration['summary'];
+    bins = calibration['distance_bins'];
+    print('%s pattern (strength %g, scale %g): %d replicates of %d cotyledons x %d stomata, %d sectors, %.1f s' % (
+        calibration['pattern'], calibration['strength'], calibration['scale'], calibration['replicates'], calibration['cotyledons'],
+        calibration['stomata'], calibration['sectors'], calibration['seconds']));
+    print('%17s %8s %8s %8s %8s %8s %10s %10s' % ('bin (microns)', 'truth', 'mean', 'bias', 'std', 'rmse', 'bootstrap', 'propagated'));
+    for k in range(0, len(bins) - 1):
+        print('%7.1f-%-9.1f %8.3f %8.3f %8.3f %8.3f %8.3f %10.3f %10.3f' % (bins[k], bins[k + 1], calibration['truth'][k], summary['mean'][k],
+              summary['bias'][k], summary['std'][k], summary['rmse'][k], summary['bootstrap_coverage'][k], summary['propagated_coverage'][k]));
+
+
+'''
+End of function definition section.
+'''
+
+
+'''
+Begin of procedural section.
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Measure the bias and confidence band coverage of the correlation estimator on synthetic cohorts.');
+    parser.add_argument('--pattern', choices = PATTERNS, default = 'clustered');
+    parser.add_argument('--strength', type = float, default = 1.0, help = 'intensity change at the sector edge (default %(default)s)');
+    parser.add_argument('--scale', type = float, default = 100.0, help = 'decay length of the intensity change in microns (default %(default)s)');
+    parser.add_argument('--replicates', type = int, default = 1000, help = 'synthetic cohorts (default %(default)s)');
+    parser.add_argument('--cotyledons', type = int, default = 8, help = 'cotyledons per cohort (default %(default)s)');
+    parser.add_argument('--stomata', type = int, default = 1000, help = 'stomata per cotyledon (default %(default)s)');
+    parser.add_argument('--template', default = None, help = 'cotyledon workbook whose outline and sectors are used (default: a synthetic cotyledon)');
+    parser.add_argument('--sectors', type = int, default = 5, help = 'sectors of the synthetic template (default %(default)s)');
+    parser.add_argument('--vertices', type = int, default = 50, help = 'outline vertices of the synthetic template (default %(default)s)');
+    parser.add_argument('--ntrials', type = int, default = 1000, help = 'random distributions of the random histograms (default %(default)s)');
+    parser.add_argument('--bootstrap', type = int, default = 1000, help = 'bootstrap replicates per cohort, 0 to skip (default %(default)s)');
+    parser.add_argument('--resample', choices = ['sectors', 'cotyledons'], default = 'sectors', help = 'what the bootstrap resamples (default %(default)s)');
+    parser.add_argument('--resolution', type = float, default = PATTERN_RESOLUTION, help = 'pixel size of the pattern intensity in microns (default %(default)s)');
+    parser.add_argument('--seed', type = int, default = 0);
+    parser.add_argument('--workers', type = int, default = 1, help = 'worker processes, 0 for one per core (default %(default)s)');
+    parser.add_argument('--out', default = None, help = 'save the calibration as JSON');
+    args = parser.parse_args();
+
+    if args.template is not None:
+        template = loadCotyledon(args.template);
+    else:
+        template = syntheticCotyledon(0, args.sectors, args.vertices, seed = args.seed);
+    workers = (os.cpu_count() or 1) if args.workers <= 0 else args.workers;
+
+    calibration = runCalibration(template, args.pattern, args.strength, args.scale, args.replicates, args.cotyledons, args.stomata,
+                                 args.ntrials, args.bootstrap, args.resample, args.seed, workers, resolution = args.resolution);
+    printCalibration(calibration);
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(calibration, f, indent = 1);
+        print('Saved %s' % args.out);
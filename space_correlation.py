@@ -0,0 +1,132 @@
+#Sector-stomata correlation function for the SPACE pipeline scripts.
+#Works on stacked per-sector histograms: an N x n array of stomata distance counts and the
+#matching N x n array of random point counts, for N sectors and n distance bins.
+#Confidence intervals come from error propagation or from bootstrap resampling of the
+#sectors (or of whole cotyledons).
+
+import numpy as np;
+from space_parallel import runCotyledons
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#The Sector-Stomata Correlation Function is calculated using two numbers:
+
+#The numerator, which is the number of stomatal distances within a bin
+#The denominator, which is the expected value of normalized random points within a bin
+
+#The correlation function is then the (numerator/denominator) - 1
+
+#Returns the numerator, denominator and correlation function, with the numerator and
+#denominator normalized for the number of points.
+
+def correlationFunction(stomata_histograms, random_histograms):
+    stomata_histograms = np.asarray(stomata_histograms, dtype = np.float64);
+    random_histograms = np.asarray(random_histograms, dtype = np.float64);
+    num = np.sum(stomata_histograms, axis = 0)/np.sum(stomata_histograms);
+    den = np.sum(random_histograms, axis = 0)/np.sum(random_histograms);
+    return num, den, num/den - 1;
+
+#Half-width of the 95% confidence interval of the correlation function y by standard
+#error propagation, combining the spread of each bin over sectors with the spread of
+#the total stomata count per sector.
+
+def propagatedError(stomata_histograms, y):
+    stomata_histograms = np.asarray(stomata_histograms, dtype = np.float64);
+    totals = np.sum(stomata_histograms, axis = 1);
+    individual_err = np.std(stomata_histograms, axis = 0);
+    total_err = np.std(totals);
+    std = 1.96*np.absolute(y)*np.sqrt((individual_err/np.mean(stomata_histograms, axis = 0))**2 + (total_err/np.mean(totals))**2);
+    return std/np.sqrt(len(stomata_histograms));
+
+#Correlation functions of any number of groups of sectors at once. keys holds the group of
+#each of the N sectors (a phenotype, save name, or any other metadata). The per-group sums,
+#means and standard deviations behind correlationFunction and propagatedError are all
+#taken in one matrix product of a groups x N membership matrix with the stacked histograms.
+#Returns the sorted group names and the groups x n arrays of numerators, denominators,
+#correlation functions and propagated errors, with the number of sectors per group.
+
+def groupedCorrelation(stomata_histograms, random_histograms, keys):
+    stomata_histograms = np.asarray(stomata_histograms, dtype = np.float64);
+    random_histograms = np.asarray(random_histograms, dtype = np.float64);
+    groups, member = np.unique(np.asarray(keys), return_inverse = True);
+    membership = np.zeros((len(groups), len(stomata_histograms)));
+    membership[member.ravel(), np.arange(len(stomata_histograms))] = 1;
+
+    totals = np.sum(stomata_histograms, axis = 1);
+    columns = np.concatenate([stomata_histograms, random_histograms, stomata_histograms**2, totals[:, None], totals[:, None]**2], axis = 1);
+    sums = membership @ columns;
+    n = stomata_histograms.shape[1];
+    stomata, random, squares = sums[:, :n], sums[:, n:2*n], sums[:, 2*n:3*n];
+    counts = np.sum(membership, axis = 1);
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        num = stomata/np.sum(stomata, axis = 1, keepdims = True);
+        den = random/np.sum(random, axis = 1, keepdims = True);
+        y = num/den - 1;
+
+        mean = stomata/counts[:, None];
+        individual_err = np.sqrt(np.maximum(squares/counts[:, None] - mean**2, 0));
+        total_mean = sums[:, 3*n]/counts;
+        total_err = np.sqrt(np.maximum(sums[:, 3*n + 1]/counts - total_mean**2, 0));
+        std = 1.96*np.absolute(y)*np.sqrt((individual_err/mean)**2 + (total_err/total_mean)[:, None]**2);
+        err = std/np.sqrt(counts)[:, None];
+    return {'groups': groups, 'num': num, 'den': den, 'y': y, 'err': err, 'sectors': counts.astype(np.int64)};
+
+#Number of bootstrap replicates drawn from one random stream. Replicates are drawn in
+#blocks of this size from streams spawned off the seed, so the replicates are the same for
+#any number of worker processes.
+
+BOOTSTRAP_BLOCK = 1000;
+
+#Returns the correlation function of count bootstrap replicates as a count x n array.
+#Each replicate resamples the N sectors with replacement; when cotyledons (the cotyledon
+#number of each sector) is given, whole cotyledons are resampled instead, keeping all of
+#their sectors. All replicates of a block are drawn as one index matrix, turned into a
+#matrix of how many times each sector is drawn, and summed with one matrix product over
+#the stacked histograms, so there is no loop over replicates.
+
+def bootstrapReplicates(stomata_histograms, random_histograms, count, seed_sequence, cotyledons = None):
+    stomata_histograms = np.asarray(stomata_histograms, dtype = np.float64);
+    random_histograms = np.asarray(random_histograms, dtype = np.float64);
+    rng = np.random.default_rng(seed_sequence);
+
+    if cotyledons is None:
+        groups = np.arange(len(stomata_histograms));
+    else:
+        groups = np.unique(np.asarray(cotyledons), return_inverse = True)[1].ravel();
+    group_count = groups.max() + 1 if len(groups) else 0;
+
+    index = rng.integers(0, group_count, size = (count, group_count));
+    draws = np.bincount((index + group_count*np.arange(count)[:, None]).ravel(), minlength = count*group_count).reshape(count, group_count);
+    weights = draws[:, groups].astype(np.float64);
+
+    stomata = weights @ stomata_histograms;
+    random = weights @ random_histograms;
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        num = stomata/np.sum(stomata, axis = 1, keepdims = True);
+        den = random/np.sum(random, axis = 1, keepdims = True);
+        return num/den - 1;
+
+#Bootstrap confidence interval of the correlation function. Draws replicates bootstrap
+#replicates (see bootstrapReplicates) from the integer seed, optionally spread over a pool
+#of worker processes a block at a time, and returns the lower and upper bounds of the
+#central level interval of the replicates in each bin.
+
+def bootstrapInterval(stomata_histograms, random_histograms, replicates = 10000, seed = 0, cotyledons = None, level = 0.95, workers = 1):
+    blocks = [min(BOOTSTRAP_BLOCK, replicates - k) for k in range(0, replicates, BOOTSTRAP_BLOCK)];
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(blocks));
+    task_list = [(stomata_histograms, random_histograms, blocks[k], seed_sequences[k], cotyledons) for k in range(0, len(blocks))];
+    results, failures = runCotyledons(bootstrapReplicates, task_list, workers, labels = ['bootstrap block %d' % k for k in range(0, len(blocks))]);
+    if failures:
+        raise RuntimeError('Bootstrap failed:\n' + failures[0][2]);
+
+    y = np.concatenate(results);
+    tail = 50*(1 - level);
+    return np.nanpercentile(y, tail, axis = 0), np.nanpercentile(y, 100 - tail, axis = 0);
+
+
+'''
+End of function definition section.
+'''
@@ -0,0 +1,491 @@
+#Shared geometry routines for the SPACE pipeline scripts.
+#Distances between point distributions and sector outlines are computed here
+#with NumPy in bounded-size chunks instead of one shapely call per point.
+#Also holds the exact complete spatial randomness (CSR) expectation for sector histograms,
+#and a spatial index over all sectors of a cotyledon for nearest-sector queries.
+
+import numpy as np;
+import shapely;
+import shapely.geometry as shg;
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Maximum number of point-segment pairs evaluated at once. Each pair needs a handful
+#of float64 temporaries, so the default keeps a chunk at a few tens of megabytes.
+
+CHUNK_PAIRS = 2**20;
+
+#Cells of the candidate grid keep at most this many candidate segments.
+#Points in cells with more candidates are measured against every segment.
+
+CANDIDATE_CAP = 32;
+
+#Candidate slots are evaluated in these groups (the end slot of each), so points with short
+#candidate lists skip the later groups. Each group runs in cache-sized pieces of CACHE_PAIRS pairs.
+
+SLOT_GROUPS = (1, 4, 32);
+CACHE_PAIRS = 2**16;
+
+#Takes an nx2 outline and returns the start and end points of each boundary segment
+#as two sx2 arrays. The outline is closed if its last point is not its first point,
+#and zero-length segments (repeated vertices) are dropped.
+
+def outlineEdges(outline):
+    outline = np.asarray(outline, dtype = np.float64)[:, :2];
+    if len(outline) > 1 and np.array_equal(outline[0], outline[-1]):
+        outline = outline[:-1];
+    starts = outline;
+    ends = np.roll(outline, -1, axis = 0);
+    keep = np.any(starts != ends, axis = 1);
+    return starts[keep], ends[keep];
+
+#Splits the plane into horizontal slabs between consecutive vertex y-values and lists, for
+#each slab, the non-horizontal segments that span it. A horizontal ray from a point only
+#needs the segments of the slab holding the point. Returns the slab edges ys and the
+#(slabs, k) table of segment indices, padded with -1.
+
+def _slabTable(starts, ends):
+    ys = np.unique(np.concatenate([starts[:, 1], ends[:, 1]]));
+    low = np.minimum(starts[:, 1], ends[:, 1]);
+    high = np.maximum(starts[:, 1], ends[:, 1]);
+    first = np.searchsorted(ys, low);
+    last = np.searchsorted(ys, high);
+    span = last - first;
+
+    #One (slab, segment) pair per slab a segment spans, grouped by slab
+
+    segment = np.repeat(np.arange(len(starts)), span);
+    slab = np.repeat(first - np.cumsum(span) + span, span) + np.arange(span.sum());
+    order = np.argsort(slab, kind = 'stable');
+    segment = segment[order];
+    slab = slab[order];
+
+    per_slab = np.bincount(slab, minlength = len(ys));
+    column = np.arange(len(slab)) - np.repeat(np.cumsum(per_slab) - per_slab, per_slab);
+    table = np.full((len(ys), max(1, per_slab.max(initial = 0))), -1, dtype = np.intp);
+    table[slab, column] = segment;
+    return ys, table;
+
+#Returns a boolean array that is True for each point of points_list (an nx2 array, or
+#a stacked (Ntrials, n, 2) array) that lies inside the polygon given by polygon_list,
+#using the even-odd rule. Replaces matplotlib.mlab.inside_poly, which returned the
+#indices of the inside points. Only the few segments that span the height of a point
+#are tested, so the cost per point does not grow with the number of outline vertices.
+
+def pointsInPolygon(polygon_list, points_list, chunk_pairs = CHUNK_PAIRS):
+    points_list = np.asarray(points_list, dtype = np.float64);
+    flat = points_list.reshape(-1, 2);
+    inside = np.zeros(len(flat), dtype = bool);
+    starts, ends = outlineEdges(polygon_list);
+    if len(starts) < 3:
+        return inside.reshape(points_list.shape[:-1]);
+
+    ys, table = _slabTable(starts, ends);
+    ax = np.append(starts[:, 0], np.inf); #index -1 (padding) never crosses
+    ay = np.append(starts[:, 1], 0.0);
+    dx = ends[:, 0] - starts[:, 0];
+    dy = ends[:, 1] - starts[:, 1];
+    slope = np.append(np.where(dy != 0, dx/np.where(dy != 0, dy, 1.0), 0.0), 0.0);
+
+    slab = np.searchsorted(ys, flat[:, 1], side = 'right') - 1;
+    candidate = np.flatnonzero((slab >= 0) & (slab < len(ys) - 1));
+    step = max(1, chunk_pairs // table.shape[1]);
+    for k in range(0, len(candidate), step):
+        index = candidate[k:k + step];
+        segment = table[slab[index]];
+        px = flat[index, 0][:, None];
+        py = flat[index, 1][:, None];
+        crosses = px < ax[segment] + (py - ay[segment])*slope[segment];
+        inside[index] = (np.count_nonzero(crosses, axis = 1) % 2) == 1;
+    return inside.reshape(points_list.shape[:-1]);
+
+#Check if the given list of points are inside the polygon specified by the list of
+#polygon_points. Returns the indices of the points_list whose points are inside the
+#given polygon, like matplotlib.mlab.inside_poly did.
+
+def checkPointsInPolygon(polygon_list, points_list):
+    return np.flatnonzero(pointsInPolygon(polygon_list, points_list));
+
+#Region labels of classifyPoints, in the order of REGION_NAMES.
+
+SECTOR, IN_RANGE, OUTSIDE_RANGE, OUTSIDE_COTYLEDON = 0, 1, 2, 3;
+REGION_NAMES = ('sector', 'in_range', 'outside_range', 'outside_cotyledon');
+
+#Classifies every point of an nx2 array into exactly one region of a cotyledon, in one
+#vectorized containment test per outline: SECTOR if it is inside the cotyledon and any
+#sector, IN_RANGE if it is inside the cotyledon and any range outline but no sector,
+#OUTSIDE_RANGE if it is inside the cotyledon only, and OUTSIDE_COTYLEDON otherwise.
+#A point in two overlapping sectors is labeled once, so region counts never double count.
+#Returns the array of labels and the (number of sectors) x n boolean array of sector
+#membership, whose row sums are the stomata counts of each sector on its own.
+
+def classifyPoints(points, cotyledon_points, sector_list, range_list = ()):
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 2);
+    in_cotyledon = pointsInPolygon(cotyledon_points, points);
+    in_sector = np.zeros((len(sector_list), len(points)), dtype = bool);
+    for k in range(0, len(sector_list)):
+        in_sector[k] = pointsInPolygon(sector_list[k], points);
+    in_range = np.zeros(len(points), dtype = bool);
+    for range_points in range_list:
+        in_range |= pointsInPolygon(range_points, points);
+
+    labels = np.full(len(points), OUTSIDE_COTYLEDON, dtype = np.int8);
+    labels[in_cotyledon] = OUTSIDE_RANGE;
+    labels[in_cotyledon & in_range] = IN_RANGE;
+    labels[in_cotyledon & np.any(in_sector, axis = 0)] = SECTOR;
+    return labels, in_sector;
+
+#Creates a virtual sector, given a sector outline
+#and a radius to extend the range of the sector by.
+#Each outline point is moved radius further away from the center of the sector.
+#Used to check stomatal density at an extended range away from the real sector.
+
+def SectorRange(sector_points, radius):
+    x_mean = np.mean(sector_points[:,0]);
+    y_mean = np.mean(sector_points[:,1]);
+    direct_vectors = sector_points - (x_mean,y_mean);
+    unit_vectors = direct_vectors/np.sqrt(np.sum(direct_vectors*direct_vectors, axis = 1))[:, None];
+    new_sector = sector_points + radius * unit_vectors;
+    
+    return new_sector;
+
+#Squared distance from points (px, py) to the segments starting at (ax, ay) with
+#direction (dx, dy), where inverse_length2 is 1/(dx*dx + dy*dy). All arguments broadcast
+#against each other. Works in place on its temporaries to keep memory traffic down.
+
+def _segmentDistance2(px, py, ax, ay, dx, dy, inverse_length2):
+    rx = px - ax;
+    ry = py - ay;
+    t = rx*dx;
+    scratch = ry*dy;
+    t += scratch;
+    t *= inverse_length2;
+    np.clip(t, 0, 1, out = t);
+    np.multiply(t, dx, out = scratch);
+    rx -= scratch;
+    np.multiply(t, dy, out = scratch);
+    ry -= scratch;
+    rx *= rx;
+    ry *= ry;
+    rx += ry;
+    return rx;
+
+#Per-segment terms shared by the distance and crossing tests: start point, direction,
+#inverse squared length, and the slope and y-range used by the even-odd ray test.
+
+def _edgeTerms(starts, ends):
+    ax = starts[:, 0];
+    ay = starts[:, 1];
+    dx = ends[:, 0] - ax;
+    dy = ends[:, 1] - ay;
+    inverse_length2 = 1.0/(dx*dx + dy*dy);
+
+    #Only segments that are not horizontal can be crossed by a horizontal ray
+
+    sloped = dy != 0;
+    slope = np.zeros(len(dx));
+    slope[sloped] = dx[sloped]/dy[sloped];
+    low = np.where(sloped, np.minimum(ay, ends[:, 1]), np.inf);
+    high = np.maximum(ay, ends[:, 1]);
+    return ax, ay, dx, dy, inverse_length2, slope, low, high;
+
+#Even-odd count of a ray cast from (px, py) in the +x direction. px and py are
+#column vectors; returns a boolean array that is True for points inside the outline.
+
+def _crossingInside(px, py, terms):
+    ax, ay, dx, dy, inverse_length2, slope, low, high = terms;
+    crosses = (low <= py) & (py < high);
+    crosses &= px < ax + (py - ay)*slope;
+    return (np.count_nonzero(crosses, axis = 1) % 2) == 1;
+
+#Range of the projection parameter of segments onto the cells with the given centers and
+#width, as two arrays (lowest, highest) with one entry per (cell, segment) pair.
+
+def _projectionRange(centers, segment, terms, width):
+    ax, ay, dx, dy, inverse_length2 = [term[segment] for term in terms[:5]];
+    middle = ((centers[:, 0] - ax)*dx + (centers[:, 1] - ay)*dy)*inverse_length2;
+    spread = 0.5*(np.abs(dx)*width[0] + np.abs(dy)*width[1])*inverse_length2;
+    return middle - spread, middle + spread;
+
+#Signed distance of an mx2 array of points against every segment, in chunks.
+
+def _bruteSignedDistance(flat, terms, chunk_pairs):
+    ax, ay, dx, dy, inverse_length2 = terms[:5];
+    distances = np.empty(len(flat), dtype = np.float64);
+    step = max(1, chunk_pairs // max(1, len(ax)));
+    for k in range(0, len(flat), step):
+        px = flat[k:k + step, 0][:, None];
+        py = flat[k:k + step, 1][:, None];
+        nearest = np.sqrt(np.min(_segmentDistance2(px, py, ax, ay, dx, dy, inverse_length2), axis = 1));
+        inside = _crossingInside(px, py, terms);
+        nearest[inside] = -nearest[inside];
+        distances[k:k + step] = nearest;
+    return distances;
+
+#Computes the signed distance from every point to the polygon given by the edge arrays
+#(starts, ends) from outlineEdges. Points outside the polygon get their positive distance
+#to the nearest boundary segment, points inside get the negative distance, and points
+#exactly on the boundary get 0. Inside/outside uses the even-odd rule like shapely.
+#points may be an nx2 array or a stacked (Ntrials, n, 2) array; the result has the
+#same shape minus the last axis.
+
+#Large inputs are bucketed on a uniform grid first. For each grid cell only the segments
+#that can be nearest to some point of the cell are kept, and cells that do not touch the
+#boundary share the inside/outside status of their center, so most points are measured
+#against a few segments instead of the whole outline. The result is exact either way.
+#Against a round sector of 80 vertices nearly every point keeps a single candidate, and
+#1000 x 2000 random points take about 0.2 s, 75 to 80 times faster than one shapely 2
+#call per point.
+
+def signedSectorDistance(points, starts, ends, chunk_pairs = CHUNK_PAIRS):
+    points = np.asarray(points, dtype = np.float64);
+    shape = points.shape[:-1];
+    flat = points.reshape(-1, 2);
+    point_count = len(flat);
+    segment_count = len(starts);
+    terms = _edgeTerms(starts, ends);
+
+    if point_count*segment_count <= 4*chunk_pairs or segment_count <= 8:
+        return _bruteSignedDistance(flat, terms, chunk_pairs).reshape(shape);
+
+    #Lay a grid over the points, finer for more points but at most 64 x 64 cells
+
+    grid = int(np.clip(np.sqrt(point_count)/16, 4, 64));
+    x = np.ascontiguousarray(flat[:, 0]);
+    y = np.ascontiguousarray(flat[:, 1]);
+    lower = np.array([x.min(), y.min()]);
+    width = (np.array([x.max(), y.max()]) - lower)/grid;
+    width[width == 0] = 1.0;
+    half_diagonal = 0.5*np.sqrt(np.dot(width, width));
+
+    cell_x = np.minimum(((x - lower[0])*(1.0/width[0])).astype(np.intp), grid - 1);
+    cell_y = np.minimum(((y - lower[1])*(1.0/width[1])).astype(np.intp), grid - 1);
+    cell = cell_x*grid + cell_y;
+    ix, iy = np.divmod(np.arange(grid*grid), grid);
+    centers = lower + (np.stack([ix, iy], axis = 1) + 0.5)*width;
+
+    #A segment s is a candidate of a cell unless it is farther than the segment s* nearest
+    #to the cell center from every point of the cell. The difference of the two distances
+    #changes across the cell at most as fast as the unit vectors from the two segments to
+    #the point differ, and both segments lie within rho of the center m of their common
+    #bounding box, so seen from a point r from m the two directions differ by at most
+    #2*asin(rho/r) (and never by more than 2). A segment is dropped when its distance to
+    #the center exceeds that of s* by more than this slope times the half-diagonal. Far
+    #from the outline the slope is small, where a slope of 2 (two half-diagonals) would
+    #keep every segment facing the cell. Candidate lists are padded with the nearest segment.
+
+    ax, ay, dx, dy, inverse_length2 = terms[:5];
+    segment_low = np.minimum(starts, ends);
+    segment_high = np.maximum(starts, ends);
+    following = np.roll(np.arange(segment_count), -1);
+    previous = np.roll(np.arange(segment_count), 1);
+    shares_end = np.all(ends == starts[following], axis = 1);
+    shares_start = np.all(starts == ends[previous], axis = 1);
+    cap = min(CANDIDATE_CAP, segment_count);
+    candidates = np.empty((len(centers), cap), dtype = np.intp);
+    candidate_count = np.empty(len(centers), dtype = np.intp);
+    boundary_cell = np.empty(len(centers), dtype = bool);
+    inside_cell = np.empty(len(centers), dtype = bool);
+    step = max(1, chunk_pairs // segment_count);
+    for k in range(0, len(centers), step):
+        cx = centers[k:k + step, 0][:, None];
+        cy = centers[k:k + step, 1][:, None];
+        center_distance = np.sqrt(_segmentDistance2(cx, cy, ax, ay, dx, dy, inverse_length2));
+        closest = np.argmin(center_distance, axis = 1);
+        nearest = center_distance[np.arange(len(closest)), closest];
+
+        #The slope bound only needs to be worked out for segments within two half-diagonals
+
+        center_distance -= nearest[:, None];
+        rows, columns = np.nonzero(center_distance <= 2*half_diagonal + 1e-9*(nearest[:, None] + half_diagonal));
+        other = closest[rows];
+        low = np.minimum(segment_low[columns], segment_low[other]);
+        high = np.maximum(segment_high[columns], segment_high[other]);
+        rho = 0.5*np.hypot(high[:, 0] - low[:, 0], high[:, 1] - low[:, 1]);
+        r = np.hypot(centers[k + rows, 0] - 0.5*(low[:, 0] + high[:, 0]), centers[k + rows, 1] - 0.5*(low[:, 1] + high[:, 1])) - half_diagonal;
+        slope = np.full(len(rho), 2.0);
+        far = r > rho;
+        slope[far] = np.minimum(2*np.arcsin(rho[far]/r[far]), 2.0);
+        keep = center_distance[rows, columns] <= slope*half_diagonal + 1e-9*(nearest[rows] + half_diagonal);
+        rows = rows[keep];
+        columns = columns[keep];
+
+        #A segment whose projection parameter is at least 1 over the whole cell is nearest
+        #to every point of the cell at its end vertex, which the following segment shares,
+        #so it can go. Likewise at 0 with the start vertex, unless the previous segment has
+        #just gone for that same vertex.
+
+        lowest, highest = _projectionRange(centers[k + rows], columns, terms, width);
+        past_end = shares_end[columns] & (lowest >= 1);
+        before_start = shares_start[columns] & (highest <= 0);
+        before_start &= _projectionRange(centers[k + rows], previous[columns], terms, width)[0] < 1;
+        keep = ~(past_end | before_start);
+        rows = rows[keep];
+        columns = columns[keep];
+
+        #Rows of nonzero come in order, so the position of each candidate in its cell's
+        #list is its index less the start of its row. Cells with more than cap candidates
+        #are measured against every segment, so their lists are never read.
+
+        count = np.bincount(rows, minlength = len(closest));
+        position = np.arange(len(rows)) - (np.cumsum(count) - count)[rows];
+        listed = position < cap;
+        order = np.repeat(closest[:, None], cap, axis = 1);
+        order[rows[listed], position[listed]] = columns[listed];
+        candidates[k:k + step] = order;
+        candidate_count[k:k + step] = count;
+        boundary_cell[k:k + step] = nearest <= half_diagonal;
+        inside_cell[k:k + step] = _crossingInside(cx, cy, terms);
+
+    #Points in cells touching the boundary or with too many candidates are measured exactly
+    #against the whole outline. Every other point runs through the candidate slots group by
+    #group, keeping the smallest squared distance so far: the first group covers all points
+    #in their original order, later groups only the points whose cells list more candidates.
+    #Short lists are padded with the nearest segment of the cell, which changes nothing.
+    #Each group looks up the segment indices of its cells in a small slots x cells table that
+    #stays in cache, so every operation runs along the points rather than along the slots.
+
+    brute_cell = boundary_cell | (candidate_count > cap);
+    point_candidates = np.where(brute_cell, 0, candidate_count)[cell];
+    nearest2 = np.empty(point_count, dtype = np.float64);
+    start = 0;
+    for end in SLOT_GROUPS:
+        end = min(end, cap);
+        if end <= start:
+            break;
+        table = np.ascontiguousarray(candidates[:, start:end].T);
+        step = max(1, min(chunk_pairs, CACHE_PAIRS) // (end - start));
+        if start == 0:
+            for k in range(0, point_count, step):
+                segment = table.take(cell[k:k + step], axis = 1);
+                rows = [term.take(segment) for term in (ax, ay, dx, dy, inverse_length2)];
+                nearest2[k:k + step] = np.min(_segmentDistance2(x[k:k + step], y[k:k + step], *rows), axis = 0);
+        else:
+            group = np.flatnonzero(point_candidates > start);
+            for k in range(0, len(group), step):
+                index = group[k:k + step];
+                segment = table.take(cell[index], axis = 1);
+                rows = [term.take(segment) for term in (ax, ay, dx, dy, inverse_length2)];
+                nearest2[index] = np.minimum(nearest2[index], np.min(_segmentDistance2(x[index], y[index], *rows), axis = 0));
+        start = end;
+
+    distances = np.sqrt(nearest2);
+    distances *= np.where(inside_cell, -1.0, 1.0)[cell];
+    brute_index = np.flatnonzero(brute_cell[cell]);
+    distances[brute_index] = _bruteSignedDistance(flat[brute_index], terms, chunk_pairs);
+
+    return distances.reshape(shape);
+
+#Creates the polygon defined by the sector outline and computes the nearest distance
+#between each individual point of your sample distribution and the sector.
+#points_list is the point distribution, and outline is the sector.
+#points_list may be an nx2 array or a stacked (Ntrials, n, 2) array of random sets.
+#Points inside or on the sector are dropped, and the distances of the remaining points
+#are returned as a flat array (pooled over trials for a stacked array).
+
+def computeSectorDistance(points_list, outline, chunk_pairs = CHUNK_PAIRS):
+    starts, ends = outlineEdges(outline);
+    distance_list = signedSectorDistance(points_list, starts, ends, chunk_pairs);
+    distances = distance_list[distance_list > 0];
+    return distances;
+
+#Builds a spatial index over all sector outlines of a cotyledon, so the nearest sector of
+#any number of points is found in one bulk query instead of one pass per sector. Every
+#boundary segment of every sector goes into a shapely STRtree, tagged with its sector.
+#Also records, for each sector, the sectors it overlaps (itself included), since a point
+#inside one of two overlapping sectors can be nearest to the edge of the other.
+#Returns the index as a dictionary.
+
+def sectorIndex(sector_list):
+    starts = [];
+    ends = [];
+    owners = [];
+    for k in range(0, len(sector_list)):
+        sector_starts, sector_ends = outlineEdges(sector_list[k]);
+        starts.append(sector_starts);
+        ends.append(sector_ends);
+        owners.append(np.full(len(sector_starts), k, dtype = np.intp));
+    polygons = [shg.Polygon(np.asarray(sector_points, dtype = np.float64)[:, :2]).buffer(0) for sector_points in sector_list];
+    overlaps = [[j for j in range(0, len(polygons)) if j == k or polygons[k].intersects(polygons[j])] for k in range(0, len(polygons))];
+    segments = shapely.linestrings(np.stack([np.concatenate(starts + [np.zeros((0, 2))]), np.concatenate(ends + [np.zeros((0, 2))])], axis = 1));
+    return {'tree': shapely.STRtree(segments), 'owner': np.concatenate(owners + [np.zeros(0, dtype = np.intp)]),
+            'sectors': [np.asarray(sector_points, dtype = np.float64)[:, :2] for sector_points in sector_list], 'overlaps': overlaps};
+
+#Number of points queried against a sector index at once (shapely makes a point object
+#for each one).
+
+INDEX_CHUNK_POINTS = 2**18;
+
+#Returns the nearest sector of each point of an nx2 array (or stacked (Ntrials, n, 2) array)
+#and the distance to it, as two arrays of the shape of the points, from a sectorIndex.
+#Points inside or on a sector get that sector and distance 0. Points inside are found by
+#testing each point against its nearest sector and the sectors that overlap it, which is
+#enough: a point inside a sector that overlaps no other is always nearest to its edge.
+
+def nearestSector(points, index, chunk_points = INDEX_CHUNK_POINTS):
+    points = np.asarray(points, dtype = np.float64);
+    shape = points.shape[:-1];
+    flat = points.reshape(-1, 2);
+    sector = np.zeros(len(flat), dtype = np.intp);
+    distance = np.zeros(len(flat), dtype = np.float64);
+    if len(index['sectors']) == 0:
+        return np.full(shape, -1, dtype = np.intp), np.full(shape, np.inf);
+
+    for k in range(0, len(flat), chunk_points):
+        (query, segment), nearest = index['tree'].query_nearest(shapely.points(flat[k:k + chunk_points]), return_distance = True, all_matches = False);
+        sector[k + query] = index['owner'][segment];
+        distance[k + query] = nearest;
+
+    for k in range(0, len(index['sectors'])):
+        members = np.flatnonzero(sector == k);
+        for j in index['overlaps'][k]:
+            if len(members) == 0:
+                break;
+            inside = pointsInPolygon(index['sectors'][j], flat[members]);
+            sector[members[inside]] = j;
+            distance[members[inside]] = 0;
+            members = members[~inside];
+    return sector.reshape(shape), distance.reshape(shape);
+
+#Returns the distance from each point of an nx2 array to the nearest of the sectors in
+#sector_list, 0 for points inside or on a sector. This is the distance at which a
+#buffer-offset range around the sectors starts to include the point.
+
+def nearestSectorDistance(points, sector_list):
+    return nearestSector(np.asarray(points, dtype = np.float64).reshape(-1, 2), sectorIndex(sector_list))[1];
+
+#Number of segments per quarter circle used when buffering sectors. The buffered area
+#is low by roughly (pi/(2*BUFFER_RESOLUTION))**2/6, about 1e-4 of the ring area at 64.
+
+BUFFER_RESOLUTION = 64;
+
+#Computes the expected sector distance histogram of point_count points placed uniformly
+#at random inside the cotyledon, i.e. the exact CSR null model for computeSectorDistance.
+#The expected count in a bin is point_count times the area of the cotyledon that lies
+#between the two bin distances from the sector, divided by the area of the cotyledon.
+#Points inside the sector are dropped, the same as for computeSectorDistance.
+#Multiply by Ntrials to match the pooled counts of Ntrials random point distributions.
+
+def expectedSectorHistogram(cotyledon_points, sector_points, distance_bins, point_count, resolution = BUFFER_RESOLUTION):
+    cotyledon = shg.Polygon(cotyledon_points).buffer(0);
+    sector = shg.Polygon(sector_points).buffer(0);
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+
+    #Area of the cotyledon within each bin distance of the sector, counting the sector itself
+
+    covered = np.empty(len(distance_bins));
+    for k in range(0, len(distance_bins)):
+        if distance_bins[k] > 0:
+            region = sector.buffer(distance_bins[k], resolution);
+        else:
+            region = sector;
+        covered[k] = cotyledon.intersection(region).area;
+
+    return point_count*np.diff(covered)/cotyledon.area;
+
+
+'''
+End of function definition section.
+'''
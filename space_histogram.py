@@ -0,0 +1,191 @@
+#Histogramming of sector distances for the SPACE pipeline scripts.
+#Counts are computed with NumPy alone; nothing here imports matplotlib, so the analysis
+#runs on headless batch nodes. Plots are drawn afterwards from the saved arrays.
+#Random point distances are binned as each chunk of random distributions is measured,
+#so only the bin counts of a sector are kept instead of every random distance.
+
+import numpy as np;
+from space_geometry import outlineEdges, signedSectorDistance, nearestSector
+from space_sampling import generateRandomSets
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Number of random points measured and binned at once (whole random distributions only).
+
+TRIAL_CHUNK_POINTS = 2**20;
+
+#Random point distributions drawn per batch in adaptive mode (adaptiveRandomHistograms).
+
+ADAPTIVE_BATCH = 100;
+
+#Adds the counts of distances in each bin to the float array counts (length len(distance_bins)-1).
+#Bins are half-open [a, b) except the last one, which includes its right edge, the same as
+#numpy.histogram; distances outside the bins are not counted.
+
+def accumulateCounts(counts, distances, distance_bins):
+    index = binIndex(distances, distance_bins);
+    counts += np.bincount(index[index >= 0], minlength = len(distance_bins) - 1);
+    return counts;
+
+#Returns the bin of each distance as in accumulateCounts, or -1 for distances outside the bins.
+
+def binIndex(distances, distance_bins):
+    bin_count = len(distance_bins) - 1;
+    index = np.searchsorted(distance_bins, distances, side = 'right') - 1;
+    index[distances == distance_bins[-1]] = bin_count - 1;
+    index[index >= bin_count] = -1;
+    return index;
+
+#Returns the counts of each random point distribution separately: a (trials, bins) array
+#for a (trials, N) array of signed distances. Points inside or on the sector (distance
+#0 or less) are not counted, as in randomSectorHistogram.
+
+def trialCounts(distances, distance_bins):
+    distances = np.asarray(distances, dtype = np.float64).reshape(len(distances), -1);
+    bin_count = len(distance_bins) - 1;
+    index = binIndex(distances, distance_bins);
+    index[distances <= 0] = -1;
+    flat = index + bin_count*np.arange(len(distances))[:, None];
+    return np.bincount(flat[index >= 0], minlength = len(distances)*bin_count).reshape(len(distances), bin_count).astype(np.float64);
+
+#Largest relative standard error, over the bins with any counts, of the mean counts per
+#distribution from the sums and sums of squares of the per-distribution counts of trials
+#distributions. Returns inf with fewer than 2 distributions.
+
+def relativeStandardError(sums, squares, trials):
+    if trials < 2:
+        return np.inf;
+    mean = sums/trials;
+    variance = np.maximum(squares - sums*mean, 0)/(trials - 1);
+    counted = mean > 0;
+    if not np.any(counted):
+        return 0.0;
+    return float(np.max(np.sqrt(variance[counted]/trials)/mean[counted]));
+
+#Width (microns) of the bins of the base histograms, the fine histograms of the random
+#distances kept so the random histograms can be rebinned later (see rebinBase).
+
+BASE_BIN_WIDTH = 0.5;
+
+#Adds the distances to the base histogram base, whose bin i counts the distances in
+#[i*width, (i+1)*width), and returns it, grown as far as the largest distance needs.
+
+def accumulateBase(base, distances, width):
+    counts = np.bincount((np.asarray(distances, dtype = np.float64)/width).astype(np.intp), minlength = len(base));
+    if len(counts) > len(base):
+        base = np.concatenate([base, np.zeros(len(counts) - len(base), dtype = np.float64)]);
+    base += counts;
+    return base;
+
+#Rebins base histograms of the given width (one per row of a 2D array, zero padded on the
+#right) into the bins distance_bins. Edges on multiples of width are exact; the counts of a
+#base bin cut by an edge are split in proportion to the part on each side, an error of at
+#most one base bin of counts per edge. Returns the (rows, bins) array of counts.
+
+def rebinBase(base, width, distance_bins):
+    base = np.atleast_2d(np.asarray(base, dtype = np.float64));
+    cumulative = np.concatenate([np.zeros((len(base), 1)), np.cumsum(base, axis = 1)], axis = 1);
+    position = np.clip(np.asarray(distance_bins, dtype = np.float64)/width, 0, base.shape[1]);
+    lower = np.minimum(np.floor(position).astype(np.intp), base.shape[1] - 1) if base.shape[1] > 0 else np.zeros(len(position), dtype = np.intp);
+    fraction = position - lower;
+    upper = np.minimum(lower + 1, base.shape[1]);
+    at_edges = cumulative[:, lower] + fraction*(cumulative[:, upper] - cumulative[:, lower]);
+    return np.diff(at_edges, axis = 1);
+
+#Returns the float array of counts of distances in each bin, like the counts from
+#numpy.histogram (or pyplot.hist) but without drawing anything.
+
+def histogramCounts(distances, distance_bins):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    counts = np.zeros(len(distance_bins) - 1, dtype = np.float64);
+    return accumulateCounts(counts, np.asarray(distances, dtype = np.float64).ravel(), distance_bins);
+
+#Histograms the distances from a stacked (Ntrials, N, 2) array of random point distributions
+#to a sector, pooled over all distributions. Distributions are measured a chunk at a time
+#and their distances go straight into the bin counts, so memory stays at one chunk of points
+#no matter how many distributions there are. Points inside or on the sector are dropped,
+#as in computeSectorDistance. Returns the float array of counts per bin, and with
+#base_width also the base histogram of the same distances (see accumulateBase).
+
+def randomSectorHistogram(random_sets, sector_points, distance_bins, chunk_points = TRIAL_CHUNK_POINTS, base_width = None):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    starts, ends = outlineEdges(sector_points);
+    counts = np.zeros(len(distance_bins) - 1, dtype = np.float64);
+    base = np.zeros(0, dtype = np.float64);
+    trials_per_chunk = max(1, chunk_points // max(1, random_sets.shape[1]));
+    for k in range(0, len(random_sets), trials_per_chunk):
+        distances = signedSectorDistance(random_sets[k:k + trials_per_chunk], starts, ends).ravel();
+        accumulateCounts(counts, distances[distances > 0], distance_bins);
+        if base_width is not None:
+            base = accumulateBase(base, distances[distances > 0], base_width);
+    return counts if base_width is None else (counts, base);
+
+#Histograms the distances from a stacked (Ntrials, N, 2) array of random point distributions
+#(or an nx2 array) to their nearest sector, one histogram per sector: each point counts only
+#for the sector nearest to it. index is a sectorIndex of the sectors. Points inside or on a
+#sector are dropped, as in randomSectorHistogram. Returns the (sectors, bins) array of counts.
+
+def nearestSectorHistograms(points, index, distance_bins, chunk_points = TRIAL_CHUNK_POINTS):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    bin_count = len(distance_bins) - 1;
+    sector_count = len(index['sectors']);
+    points = np.asarray(points, dtype = np.float64).reshape(-1, 2);
+    counts = np.zeros(sector_count*bin_count, dtype = np.float64);
+    for k in range(0, len(points), chunk_points):
+        sector, distances = nearestSector(points[k:k + chunk_points], index);
+        bins = binIndex(distances, distance_bins);
+        counted = (distances > 0) & (bins >= 0);
+        counts += np.bincount(sector[counted]*bin_count + bins[counted], minlength = sector_count*bin_count);
+    return counts.reshape(sector_count, bin_count);
+
+#Bins one chunk of random point distributions (a stacked (trials, N, 2) array) against a
+#sector in place: measure returns the signed distances of points to the sector (as in
+#adaptiveRandomHistograms), and is called on at most chunk_points points at a time, so the
+#memory for measuring does not grow with the chunk. Distances go into counts and, with
+#base_width, into the base histogram base. Returns the base histogram.
+
+def accumulateRandomChunk(counts, random_sets, measure, distance_bins, base = None, base_width = None, chunk_points = TRIAL_CHUNK_POINTS):
+    trials_per_chunk = max(1, chunk_points // max(1, random_sets.shape[1]));
+    for k in range(0, len(random_sets), trials_per_chunk):
+        distances = np.asarray(measure(random_sets[k:k + trials_per_chunk])).ravel();
+        distances = distances[distances > 0];
+        accumulateCounts(counts, distances, distance_bins);
+        if base_width is not None:
+            base = accumulateBase(base, distances, base_width);
+    return base;
+
+#Adaptive counterpart of randomSectorHistogram for all sectors of a cotyledon at once.
+#Random point distributions of point_count points are drawn in batches of batch trials and
+#measured against every sector whose random histogram is not yet precise enough: a sector
+#stops once the relative standard error of every bin with counts is at most target, or
+#after max_trials distributions. measures holds one function per sector that returns the
+#signed distances of a (trials, N, 2) array of points to that sector. sampler and dtype are
+#the null sampler and coordinate type of generateRandomSets.
+#Returns the (sectors, bins) array of counts and the number of trials used for each sector.
+
+def adaptiveRandomHistograms(cotyledon_points, point_count, measures, distance_bins, rng, target, max_trials, batch = ADAPTIVE_BATCH, sampler = 'uniform', dtype = np.float64):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    sums = np.zeros((len(measures), len(distance_bins) - 1), dtype = np.float64);
+    squares = np.zeros_like(sums);
+    trials = np.zeros(len(measures), dtype = np.int64);
+    trials_per_chunk = max(1, TRIAL_CHUNK_POINTS // max(1, point_count));
+
+    active = list(range(0, len(measures)));
+    while active and trials[active[0]] < max_trials:
+        size = int(min(batch, max_trials - trials[active[0]]));
+        random_sets = generateRandomSets(cotyledon_points, point_count, size, rng, sampler = sampler, dtype = dtype);
+        for k in active:
+            for j in range(0, size, trials_per_chunk):
+                counts = trialCounts(measures[k](random_sets[j:j + trials_per_chunk]), distance_bins);
+                sums[k] += counts.sum(axis = 0);
+                squares[k] += (counts*counts).sum(axis = 0);
+            trials[k] += size;
+        active = [k for k in active if relativeStandardError(sums[k], squares[k], trials[k]) > target];
+    return sums, trials;
+
+
+'''
+End of function definition section.
+'''
@@ -0,0 +1,135 @@
+#Reads cotyledon datasets from .xlsx workbooks for the SPACE pipeline scripts.
+#Workbooks are opened read-only and each worksheet is read in a single streaming pass
+#of its rows straight into NumPy arrays.
+
+import re;
+import csv;
+import numpy as np;
+import openpyxl;
+import shapely.geometry as shg;
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Worksheet names. Sector worksheets are found by name, so they can come in any order
+#and there can be any number of them.
+
+STOMATA_SHEET = 'Stomatal Positions';
+COTYLEDON_SHEET = 'Cotyledon Outline';
+SECTOR_SHEET_PATTERN = re.compile(r'^Sector (\d+) Outline$');
+
+#Coordinates start on the third row (the first two rows are a blank row and the headers)
+#in the first two columns.
+
+FIRST_ROW = 3;
+
+#Version of the parsed cotyledon layout. Increase it whenever the parsing changes so that
+#cached datasets from older versions are not reused.
+
+PARSER_VERSION = 1;
+
+#Takes a workbook sheet and returns an nx2 numpy array of the X and Y values, read in
+#one pass over the rows. Rows without two numeric values (blank or 'etc.' rows) are
+#skipped. If point_count is given, only that many rows are read.
+
+def readSheetColumns(point_sheet, point_count = None):
+    max_row = None if point_count is None else FIRST_ROW + point_count - 1;
+    rows = point_sheet.iter_rows(min_row = FIRST_ROW, max_row = max_row, max_col = 2, values_only = True);
+    number = (int, float);
+    values = [row[:2] for row in rows if len(row) >= 2 and isinstance(row[0], number) and isinstance(row[1], number)];
+    return np.asarray(values, dtype = np.float64).reshape(-1, 2);
+
+#Sorts an nx2 array of points by their angle from the center (x_mean, y_mean),
+#so that outline points are in order around the outline.
+
+def sortPointsByAngle(points):
+    x_mean = np.mean(points[:, 0]);
+    y_mean = np.mean(points[:, 1]);
+    angles = np.arctan2(points[:, 1] - y_mean, points[:, 0] - x_mean);
+    return points[np.argsort(angles, kind = 'stable')];
+
+#Takes a workbook sheet and returns an nx2 numpy array of point values sorted by angle.
+#point_count is optional and limits the number of rows read.
+
+def recordSheetCoordinates(point_sheet, point_count = None):
+    return sortPointsByAngle(readSheetColumns(point_sheet, point_count));
+
+#Returns the sector worksheet names ('Sector 1 Outline', 'Sector 2 Outline', etc.)
+#among sheet_names, ordered by sector number.
+
+def sectorSheetNames(sheet_names):
+    matches = [(int(SECTOR_SHEET_PATTERN.match(name).group(1)), name) for name in sheet_names if SECTOR_SHEET_PATTERN.match(name)];
+    return [name for number, name in sorted(matches)];
+
+#Returns the number of a sector worksheet name ('Sector 3 Outline' gives 3).
+
+def sectorNumber(sheet_name):
+    return int(SECTOR_SHEET_PATTERN.match(sheet_name).group(1));
+
+#Reads the file list. The first column is the pathway to each dataset file, the second
+#column is a savename, and the third column is phenotype; the first row holds the headers.
+#Returns the three columns as lists.
+
+def readFileList(file_name = 'filelist.csv'):
+    directory = [];
+    save = [];
+    phenotype = [];
+    with open(file_name, newline = '') as f:
+        text = csv.reader(f);
+        next(text, None); #skip the headers
+        for row in text:
+            if not row:
+                continue;
+            directory.append(row[0]);
+            save.append(row[1]);
+            phenotype.append(row[2]);
+    return directory, save, phenotype;
+
+#Reads every column of the file list, including any extra metadata columns after the
+#first three. Returns a dictionary from each header to its column as a list.
+#fileListColumn returns the column of a header, ignoring case, or None if there is none.
+
+def readFileTable(file_name = 'filelist.csv'):
+    with open(file_name, newline = '') as f:
+        text = csv.reader(f);
+        headers = [header.strip() for header in next(text, [])];
+        rows = [row for row in text if row];
+    return dict((headers[k], [row[k] if k < len(row) else '' for row in rows]) for k in range(0, len(headers)));
+
+def fileListColumn(table, header):
+    for name in table:
+        if name.lower() == header.lower():
+            return table[name];
+    return None;
+
+#Turns a save name from the file list into a file name, for the outputs and figures
+#named after each dataset.
+
+def outputName(save_name):
+    return re.sub(r'[^\w.-]+', '_', save_name);
+
+#Loads one cotyledon dataset from an .xlsx file. Returns a dictionary with the stomatal
+#positions ('stomata'), the cotyledon outline ('outline'), the sector worksheet names
+#('sector_names'), the list of sector outlines ('sectors'), all as nx2 arrays, and
+#the array of sector areas ('sector_areas').
+
+def loadCotyledon(file_name):
+    crelox_wb = openpyxl.load_workbook(file_name, read_only = True, data_only = True);
+    try:
+        sector_names = sectorSheetNames(crelox_wb.sheetnames);
+        cotyledon = {
+            'stomata': recordSheetCoordinates(crelox_wb[STOMATA_SHEET]),
+            'outline': recordSheetCoordinates(crelox_wb[COTYLEDON_SHEET]),
+            'sector_names': sector_names,
+            'sectors': [recordSheetCoordinates(crelox_wb[name]) for name in sector_names],
+        };
+    finally:
+        crelox_wb.close();
+    cotyledon['sector_areas'] = np.asarray([shg.Polygon(points).area for points in cotyledon['sectors']], dtype = np.float64);
+    return cotyledon;
+
+
+'''
+End of function definition section.
+'''
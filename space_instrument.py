@@ -0,0 +1,177 @@
+#Run instrumentation for the SPACE pipeline scripts.
+#With a run report enabled, every stage of the analysis of a cotyledon (and of each of its
+#sectors) appends one JSON line to the report file with its wall time, CPU time, peak
+#traced memory and the point, vertex and trial counts it worked on. One cotyledon can also
+#be run under cProfile. With the report disabled (None) a stage costs one function call.
+#
+#    python space_instrument.py "run report.jsonl"            totals per stage of the last run
+#    python space_instrument.py "run report.jsonl" --by cotyledon
+
+import os;
+import sys;
+import json;
+import time;
+import uuid;
+import cProfile;
+import argparse;
+import contextlib;
+import tracemalloc;
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Fields a stage inherits from the stage it runs in, so sector lines name their cotyledon.
+
+INHERITED_FIELDS = ('script', 'index', 'cotyledon');
+
+#Returns the run report settings for a report file, or None when file_name is None
+#(instrumentation off). Put the result in the settings of the analysis functions as
+#'run_report'. profile names one cotyledon (its file name, with or without folder and
+#extension) to run under cProfile; its profile is written next to the report file.
+#memory = False skips tracemalloc, which slows down code that allocates many small objects.
+
+def runReport(file_name, script, profile = None, memory = True):
+    if file_name is None:
+        return None;
+    return {'file': file_name, 'run': '%s-%s' % (time.strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:6]),
+            'script': script, 'profile': profile, 'memory': memory, 'stack': []};
+
+#Returns True if file_name is the cotyledon named by profile.
+
+def profileMatch(profile, file_name):
+    if profile is None:
+        return False;
+    base = os.path.basename(str(file_name));
+    return str(profile) in (str(file_name), base, os.path.splitext(base)[0]);
+
+#Appends one record to the report file as a JSON line. Each line is written with a single
+#write in append mode, so worker processes can share the file.
+
+def writeRecord(report, record):
+    line = json.dumps(record, default = lambda value: value.item() if hasattr(value, 'item') else str(value)) + '\n';
+    with open(report['file'], 'a') as f:
+        f.write(line);
+
+#Context manager that records one stage: with stageRecord(report, 'ingest', points = n) as
+#record: ... Counts known only inside the stage can be added to record. Yields a plain
+#dictionary and records nothing when report is None. profile = True runs the stage under
+#cProfile if its cotyledon is the one named in the report.
+
+def stageRecord(report, stage, profile = False, **fields):
+    if report is None:
+        return contextlib.nullcontext(fields);
+    return _recordStage(report, stage, profile, fields);
+
+@contextlib.contextmanager
+def _recordStage(report, stage, profile, record):
+    stack = report['stack'];
+    parent = stack[-1] if stack else {'script': report['script']};
+    for key in INHERITED_FIELDS:
+        if key not in record and key in parent:
+            record[key] = parent[key];
+    record['stage'] = stage;
+    record['run'] = report['run'];
+    record['pid'] = os.getpid();
+    record['started'] = time.strftime('%Y-%m-%dT%H:%M:%S');
+    record['depth'] = len(stack);
+
+    #tracemalloc keeps one peak, so it is reset for every stage and the peak of a stage is
+    #handed up to the stage it runs in when it ends.
+
+    memory = report['memory'];
+    if memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start();
+        current, peak = tracemalloc.get_traced_memory();
+        if stack:
+            stack[-1]['_peak'] = max(stack[-1]['_peak'], peak);
+        tracemalloc.reset_peak();
+        record['_start'] = current;
+        record['_peak'] = current;
+
+    profiler = None;
+    if profile and profileMatch(report['profile'], record.get('cotyledon')):
+        profiler = cProfile.Profile();
+
+    stack.append(record);
+    wall = time.perf_counter();
+    cpu = time.process_time();
+    if profiler is not None:
+        profiler.enable();
+    try:
+        yield record;
+    except BaseException:
+        record['failed'] = True;
+        raise;
+    finally:
+        if profiler is not None:
+            profiler.disable();
+        record['wall_seconds'] = time.perf_counter() - wall;
+        record['cpu_seconds'] = time.process_time() - cpu;
+        stack.pop();
+        if memory:
+            peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1]);
+            record['peak_bytes'] = peak - record.pop('_start');
+            if stack:
+                stack[-1]['_peak'] = max(stack[-1]['_peak'], peak);
+        if profiler is not None:
+            base = os.path.splitext(os.path.basename(str(record['cotyledon'])))[0];
+            record['profile'] = os.path.join(os.path.dirname(os.path.abspath(report['file'])), '%s.%s.%s.prof' % (base, stage, report['run']));
+            profiler.dump_stats(record['profile']);
+        writeRecord(report, record);
+
+#Reads the records of a report file. Returns the records of run (a run id), or of the
+#last run in the file when run is None.
+
+def readReport(file_name, run = None):
+    records = [];
+    with open(file_name) as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line));
+    if run is None and records:
+        run = records[-1]['run'];
+    return [record for record in records if record['run'] == run];
+
+#Sums the records by a field (stage by default): count, total wall and CPU time, and the
+#largest peak memory. Returns a list of (key, count, wall, cpu, peak) by total wall time.
+#For any other field only the outermost records that have it are summed, so the time of a
+#cotyledon is not counted again through the stages inside it.
+
+def summarizeReport(records, by = 'stage'):
+    if by != 'stage':
+        records = [record for record in records if by in record];
+        depth = min([record['depth'] for record in records] + [0]);
+        records = [record for record in records if record['depth'] == depth];
+    totals = {};
+    for record in records:
+        key = str(record.get(by));
+        count, wall, cpu, peak = totals.get(key, (0, 0.0, 0.0, 0));
+        totals[key] = (count + 1, wall + record['wall_seconds'], cpu + record['cpu_seconds'], max(peak, record.get('peak_bytes', 0)));
+    return sorted([(key,) + totals[key] for key in totals], key = lambda row: -row[2]);
+
+
+'''
+End of function definition section.
+'''
+
+
+'''
+Begin of procedural section.
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Summarize a run report of the SPACE scripts.');
+    parser.add_argument('report', help = 'run report (.jsonl)');
+    parser.add_argument('--run', default = None, help = 'run id (default: the last run in the file)');
+    parser.add_argument('--by', default = 'stage', help = 'field to total by, e.g. stage, cotyledon or sector (default %(default)s)');
+    args = parser.parse_args();
+
+    records = readReport(args.report, args.run);
+    if not records:
+        sys.exit('No records in %s' % args.report);
+    print('Run %s (%s), %d records' % (records[0]['run'], records[0].get('script'), len(records)));
+    print('%-40s %7s %10s %10s %12s' % (args.by, 'count', 'wall (s)', 'cpu (s)', 'peak (MB)'));
+    for key, count, wall, cpu, peak in summarizeReport(records, args.by):
+        print('%-40s %7d %10.3f %10.3f %12.1f' % (key[-40:], count, wall, cpu, peak/2.0**20));
@@ -0,0 +1,200 @@
+#Stomata-stomata spatial statistics for the SPACE pipeline scripts.
+#Measures how the stomata of a cotyledon cluster or space out among themselves: the pair
+#correlation function g(r) and Ripley's K and L functions over the distance bins, with
+#edge correction for the cotyledon outline and an envelope from complete spatial randomness
+#(random stomata drawn with the same sampler as the random point distributions).
+
+#Pairs closer than exact_radius are counted exactly with a dual-tree count on a k-d tree
+#(scipy.spatial.cKDTree.count_neighbors). Counting every pair out to the largest bins that
+#way grows with the number of pairs per stoma, so the pairs of the larger bins are counted
+#from the autocorrelation of the stomata counts on a grid (one FFT), which costs the same
+#for any number of stomata. Grid positions move a distance by at most a pixel diagonal,
+#small next to the width of the larger bins. Set exact_radius = inf to count every bin exactly.
+
+#Edge correction: a pair at offset h is weighted by the area of the cotyledon that overlaps
+#itself shifted by h (the set covariance, from the autocorrelation of the rasterized
+#outline), so pairs that are likely to be cut off by the edge count for more.
+
+#Needs scipy (scipy.spatial) for the k-d tree.
+
+import numpy as np;
+import shapely.geometry as shg;
+from space_raster import rasterGrid, rasterizeOutline
+from space_sampling import generateRandomSets
+from space_histogram import binIndex
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Pixel size (microns) of the grid for the set covariance and the larger bins, the largest
+#grid side in pixels (the pixel grows for larger cotyledons), the distance (microns) up to
+#which pairs are counted exactly, and the number of random patterns of the envelope.
+
+PAIR_RESOLUTION = 8.0;
+PAIR_MAX_PIXELS = 1024;
+EXACT_RADIUS = 200.0;
+ENVELOPE_TRIALS = 99;
+ENVELOPE_CHUNK_POINTS = 2**22;
+
+#Radii sampled over each exactly counted bin to average the set covariance over its ring.
+
+RING_SAMPLES = 257;
+
+#Returns the autocorrelation of an image over all offsets, as an array of the given shape
+#(at least twice the image, so nothing wraps) indexed by offset modulo the shape.
+
+def _autocorrelation(image, shape):
+    spectrum = np.fft.rfft2(image, s = shape);
+    return np.fft.irfft2(spectrum*np.conj(spectrum), s = shape);
+
+#Prepares the edge correction of a cotyledon for the distance bins: the area, the pixel
+#grid, the mean set covariance of each exactly counted bin, for the other bins the bin and
+#inverse set covariance of every grid offset in them, and the area of offsets in each bin
+#that the cotyledon can span. Returns it as a dictionary.
+
+def pairWindow(cotyledon_points, distance_bins, exact_radius = EXACT_RADIUS, resolution = PAIR_RESOLUTION):
+    from scipy.fft import next_fast_len
+    cotyledon_points = np.asarray(cotyledon_points, dtype = np.float64)[:, :2];
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    extent = np.max(cotyledon_points.max(axis = 0) - cotyledon_points.min(axis = 0));
+    resolution = max(float(resolution), extent/(PAIR_MAX_PIXELS - 2));
+    grid = rasterGrid([cotyledon_points], resolution);
+    rows, columns = grid['shape'];
+    shape = (next_fast_len(2*rows, True), next_fast_len(2*columns, True));
+
+    #Set covariance of every offset, and the distance of every offset
+
+    covariance = _autocorrelation(rasterizeOutline(cotyledon_points, grid).astype(np.float64), shape)*resolution**2;
+    dy = np.fft.fftfreq(shape[0], 1.0/shape[0])[:, None]*resolution;
+    dx = np.fft.fftfreq(shape[1], 1.0/shape[1])[None, :]*resolution;
+    distance = np.sqrt(dy*dy + dx*dx);
+
+    #Bins counted exactly use the mean set covariance over their ring of offsets, from the
+    #profile of the set covariance averaged over rings one pixel wide. The profile is
+    #integrated over the ring (weighted by radius) rather than read at the middle of the bin,
+    #since a wide bin can reach past the size of the cotyledon, where it drops to 0.
+
+    exact_count = int(np.sum(distance_bins[1:] <= exact_radius));
+    ring = np.rint(distance/resolution).astype(np.intp).ravel();
+    profile = np.maximum(np.bincount(ring, covariance.ravel())/np.maximum(np.bincount(ring), 1), 0);
+    mean_covariance = np.zeros(len(distance_bins) - 1, dtype = np.float64);
+    for k in range(0, exact_count):
+        radii = np.linspace(distance_bins[k], min(distance_bins[k + 1], len(profile)*resolution), RING_SAMPLES);
+        values = np.interp(radii/resolution, np.arange(len(profile)), profile)*radii;
+        mean_covariance[k] = np.sum(0.5*(values[1:] + values[:-1])*np.diff(radii))/(0.5*(distance_bins[k + 1]**2 - distance_bins[k]**2));
+
+    #The other bins weigh each grid offset by its own set covariance; offsets the cotyledon
+    #cannot span (covariance below half a pixel) get no weight.
+
+    offset_bin = binIndex(distance.ravel(), distance_bins);
+    offset_index = np.flatnonzero((offset_bin >= exact_count) & (covariance.ravel() > 0.5*resolution**2));
+
+    #Near the size of the cotyledon only part of a ring of offsets fits inside it, so g is
+    #taken over the offsets that fit (all of the ring for the exactly counted bins).
+
+    #Exactly counted bins the cotyledon cannot span (mean set covariance below half a pixel)
+    #get no area either, so their g is undefined (NaN) and K stays flat over them.
+
+    ring_area = np.pi*(distance_bins[1:]**2 - distance_bins[:-1]**2);
+    ring_area[:exact_count][mean_covariance[:exact_count] <= 0.5*resolution**2] = 0;
+    ring_area[exact_count:] = np.bincount(offset_bin[offset_index], minlength = len(distance_bins) - 1)[exact_count:]*resolution**2;
+    return {'area': shg.Polygon(cotyledon_points).area, 'grid': grid, 'shape': shape, 'exact_count': exact_count,
+            'mean_covariance': mean_covariance, 'offset_index': offset_index, 'offset_bin': offset_bin[offset_index],
+            'offset_weight': 1.0/covariance.ravel()[offset_index], 'ring_area': ring_area, 'distance_bins': distance_bins};
+
+#Returns the ordered pair counts of points (each pair counted twice) in every distance bin,
+#and the same counts weighted by the inverse set covariance of the window, as two arrays.
+
+def pairCounts(points, window):
+    from scipy.spatial import cKDTree
+    points = np.asarray(points, dtype = np.float64)[:, :2];
+    distance_bins = window['distance_bins'];
+    bin_count = len(distance_bins) - 1;
+    exact_count = window['exact_count'];
+    counts = np.zeros(bin_count, dtype = np.float64);
+    weighted = np.zeros(bin_count, dtype = np.float64);
+
+    #Dual-tree count of the pairs within each bin edge, less each point paired with itself
+
+    if exact_count > 0 and len(points) > 1:
+        tree = cKDTree(points);
+        within = tree.count_neighbors(tree, distance_bins[1:exact_count + 1], cumulative = True) - len(points);
+        counts[:exact_count] = np.diff(np.concatenate([[0], within]));
+        spanned = window['ring_area'][:exact_count] > 0;
+        weighted[:exact_count][spanned] = counts[:exact_count][spanned]/window['mean_covariance'][:exact_count][spanned];
+
+    #Pairs of the larger bins from the autocorrelation of the stomata counts per pixel
+
+    if exact_count < bin_count and len(points) > 1:
+        grid = window['grid'];
+        rows, columns = grid['shape'];
+        j = np.clip(((points[:, 0] - grid['origin'][0])/grid['resolution']).astype(np.intp), 0, columns - 1);
+        i = np.clip(((points[:, 1] - grid['origin'][1])/grid['resolution']).astype(np.intp), 0, rows - 1);
+        image = np.bincount(i*columns + j, minlength = rows*columns).reshape(rows, columns).astype(np.float64);
+        pairs = np.rint(_autocorrelation(image, window['shape']).ravel()[window['offset_index']]);
+        counts += np.bincount(window['offset_bin'], pairs, minlength = bin_count);
+        weighted += np.bincount(window['offset_bin'], pairs*window['offset_weight'], minlength = bin_count);
+
+    return counts, weighted;
+
+#Returns the pair statistics of points in the window as a dictionary: the pair counts per
+#bin ('pairs'), Ripley's K and L at the upper edge of each bin, and the pair correlation
+#g over each bin (1 for complete spatial randomness, NaN in bins beyond the size of the
+#cotyledon, where no pair fits). K only counts offsets the cotyledon
+#can span, so it falls short of pi r^2 for r near the size of the cotyledon; g does not.
+
+def pairStatistics(points, window):
+    point_count = len(points);
+    counts, weighted = pairCounts(points, window);
+
+    #K estimate with the set covariance (translation) correction: the area squared over the
+    #ordered pairs of points, times the weighted pair count within r
+
+    scale = window['area']**2/max(1, point_count*(point_count - 1));
+    increments = scale*weighted;
+    K = np.cumsum(increments);
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        g = increments/window['ring_area'];
+    return {'pairs': counts, 'K': K, 'L': np.sqrt(K/np.pi), 'g': g};
+
+#Pair statistics of envelope_trials patterns of point_count uniformly random points in the
+#cotyledon, drawn with generateRandomSets from rng a chunk of patterns at a time. Returns a
+#dictionary with the low and high bounds of g, K and L over the patterns ('g_low', 'g_high',
+#...), the central level interval in each bin, and the mean of each ('g_mean', ...).
+
+def pairEnvelope(cotyledon_points, point_count, window, rng, envelope_trials = ENVELOPE_TRIALS, level = 0.95):
+    statistics = {'g': [], 'K': [], 'L': []};
+    trials_per_chunk = max(1, ENVELOPE_CHUNK_POINTS // max(1, point_count));
+    for k in range(0, envelope_trials, trials_per_chunk):
+        for random_set in generateRandomSets(cotyledon_points, point_count, min(trials_per_chunk, envelope_trials - k), rng):
+            result = pairStatistics(random_set, window);
+            for key in statistics:
+                statistics[key].append(result[key]);
+
+    envelope = {};
+    tail = 50*(1 - level);
+    for key in statistics:
+        values = np.asarray(statistics[key]).reshape(envelope_trials, -1);
+        envelope[key + '_low'] = np.percentile(values, tail, axis = 0);
+        envelope[key + '_high'] = np.percentile(values, 100 - tail, axis = 0);
+        envelope[key + '_mean'] = np.mean(values, axis = 0);
+    return envelope;
+
+#Saves the pair statistics of a run as one .npz file: for every statistic (g, K, L, pairs
+#and their envelope) a (cotyledons x bins) array, with the row of each cotyledon in the
+#file list ('cotyledon'), its number of stomata and area, and the distance bins.
+#results is a list of the dictionaries of stomataPairStatistics, in the order of rows.
+
+def savePairResults(file_name, rows, results, distance_bins):
+    arrays = {'cotyledon': np.asarray(rows, dtype = np.int64), 'distance_bins': np.asarray(distance_bins, dtype = np.float64)};
+    bin_count = len(distance_bins) - 1;
+    for key in (results[0].keys() if results else ['g', 'K', 'L', 'pairs', 'stomata', 'area']):
+        values = np.asarray([result[key] for result in results], dtype = np.float64);
+        arrays[key] = values if key in ('stomata', 'area') else values.reshape(len(results), bin_count);
+    np.savez(file_name, **arrays);
+
+
+'''
+End of function definition section.
+'''
@@ -0,0 +1,83 @@
+#Runs the per-cotyledon analysis of the SPACE pipeline scripts one cotyledon after another
+#or in a pool of worker processes. Results always come back in filelist order, so the
+#saved outputs of a parallel run are identical to those of a serial run.
+
+import os;
+import sys;
+import argparse;
+import traceback;
+import multiprocessing;
+from concurrent.futures import ProcessPoolExecutor
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Reads --workers N from the command line, for scripts that are also run from Spyder.
+#Returns default when the option is not given. 0 means one worker per CPU core.
+
+def workerCount(default = 1, argv = None):
+    parser = argparse.ArgumentParser(add_help = False);
+    parser.add_argument('--workers', type = int, default = default);
+    args, unknown = parser.parse_known_args(sys.argv[1:] if argv is None else argv);
+    if args.workers <= 0:
+        return os.cpu_count() or 1;
+    return args.workers;
+
+#Worker processes are forked, so they start from the state of the running script and do not
+#import the script again (the scripts have no __main__ guard). Where fork is not available
+#(Windows) runCotyledons falls back to a serial run.
+
+def _forkContext():
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork');
+    return None;
+
+#Calls function(*arguments) and returns (result, None), or (None, traceback text) if it
+#raised, so that one bad cotyledon does not abort the rest of the batch.
+
+def _runTask(function, arguments):
+    try:
+        return function(*arguments), None;
+    except Exception:
+        return None, traceback.format_exc();
+
+#Runs function(*arguments) for every entry of task_list, serially when workers is 1 and
+#in a pool of that many processes otherwise. function must be importable (defined in a
+#module, not in a script). Returns the list of results in task order, with None for the
+#tasks that failed, and a list of (task number, label, traceback text) for the failures.
+#Failures are printed as they are collected; labels name the tasks in those messages.
+
+def runCotyledons(function, task_list, workers = 1, labels = None):
+    if labels is None:
+        labels = [str(k) for k in range(0, len(task_list))];
+
+    context = _forkContext();
+    if workers > 1 and context is None:
+        print('Worker processes need the fork start method; running serially instead.');
+    if workers <= 1 or len(task_list) <= 1 or context is None:
+        outcomes = [_runTask(function, arguments) for arguments in task_list];
+    else:
+        outcomes = [];
+        with ProcessPoolExecutor(max_workers = min(workers, len(task_list)), mp_context = context) as pool:
+            futures = [pool.submit(_runTask, function, arguments) for arguments in task_list];
+            for future in futures:
+                try:
+                    outcomes.append(future.result());
+                except Exception:
+                    outcomes.append((None, traceback.format_exc())); #worker process died
+
+    results = [];
+    failures = [];
+    for k in range(0, len(outcomes)):
+        result, error = outcomes[k];
+        results.append(result);
+        if error is not None:
+            failures.append((k, labels[k], error));
+            print('Cotyledon %s failed and was skipped:\n%s' % (labels[k], error));
+    return results, failures;
+
+
+'''
+End of function definition section.
+'''
@@ -0,0 +1,507 @@
+#Staged pipeline runner for the SPACE analysis.
+#Runs the whole analysis of a file list as explicit stages:
+
+#ingest -> geometry -> distances -> histograms -> correlation
+#ingest -> density
+#ingest -> sweep
+#ingest -> pairs
+
+#Every stage output is saved in the output folder under a fingerprint of its inputs and
+#parameters, and a stage is only recomputed when its fingerprint has no saved output yet.
+#Changing the distance bins therefore reruns the histograms and the correlation function
+#only, changing the sector range reruns the density only, and editing one workbook reruns
+#that cotyledon only.
+
+#Run with python space_pipeline.py --filelist filelist.csv --out pipeline; see --help.
+
+import os;
+import re;
+import json;
+import time;
+import uuid;
+import hashlib;
+import argparse;
+import numpy as np;
+from space_ingest import readFileList, readFileTable, fileListColumn, loadCotyledon, sectorNumber, outputName, PARSER_VERSION
+from space_cache import workbookHash, saveCotyledon, readCotyledon
+from space_geometry import computeSectorDistance, expectedSectorHistogram, outlineEdges, signedSectorDistance
+from space_sampling import generateRandomSets, randomSetChunks, randomChunkTrials, cotyledonSeedSequence, SAMPLERS, COORDINATE_TYPES
+from space_histogram import accumulateCounts, histogramCounts, TRIAL_CHUNK_POINTS
+from space_analysis import insideStomata, keptSectors, ratioHistograms, densityRegions, rangeSweepRegions, stomataPairStatistics, RANGE_CONSTRUCTIONS
+from space_pairs import savePairResults, ENVELOPE_TRIALS, EXACT_RADIUS, PAIR_RESOLUTION
+from space_correlation import groupedCorrelation, bootstrapInterval
+from space_parallel import runCotyledons
+from space_results import sectorResults, saveResults
+from space_instrument import stageRecord, runReport
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Stages in the order they run, and the stages each one reads. Increase the version of a
+#stage whenever its computation changes, so outputs of the old code are not reused.
+
+STAGES = ['ingest', 'geometry', 'distances', 'histograms', 'density', 'sweep', 'pairs', 'correlation'];
+STAGE_INPUTS = {
+    'ingest': [],
+    'geometry': ['ingest'],
+    'distances': ['geometry'],
+    'histograms': ['distances'],
+    'density': ['ingest'],
+    'sweep': ['ingest'],
+    'pairs': ['ingest'],
+    'correlation': ['histograms'],
+};
+STAGE_VERSIONS = {
+    'ingest': PARSER_VERSION,
+    'geometry': 2,
+    'distances': 1,
+    'histograms': 3,
+    'density': 2,
+    'sweep': 1,
+    'pairs': 3,
+    'correlation': 3,
+};
+
+#Default parameters, the same as in the scripts.
+
+PARAMETERS = {
+    'min_area': 0,
+    'max_area': 10000000,
+    'null_model': 'random',
+    'random_seed': 0,
+    'Ntrials': 1000,
+    'null_sampler': 'uniform',
+    'memory_limit': None,
+    'random_dtype': 'float64',
+    'distance_bins': np.insert(np.logspace(np.log10(15), np.log10(2500), 15), 0, 0).tolist(),
+    'sector_range': 100,
+    'sweep_ranges': [25, 50, 100, 200, 400],
+    'range_construction': 'centroid',
+    'bootstrap_replicates': 10000,
+    'bootstrap_seed': 0,
+    'bootstrap_resample': 'sectors',
+    'group_by': 'Phenotype',
+    'envelope_trials': ENVELOPE_TRIALS,
+    'exact_radius': EXACT_RADIUS,
+    'pair_resolution': PAIR_RESOLUTION,
+};
+
+#Returns the fingerprint of a stage output: a hash of the stage name and version and of
+#everything the output depends on (parameters and the fingerprints of the stage inputs).
+
+def stageFingerprint(stage, *inputs):
+    text = json.dumps([stage, STAGE_VERSIONS[stage]] + list(inputs), sort_keys = True);
+    return hashlib.blake2b(text.encode('utf-8'), digest_size = 8).hexdigest();
+
+#Returns the path of a stage output, <out_dir>/<stage>/<name>.<fingerprint><suffix>.
+
+def stagePath(out_dir, stage, name, fingerprint, suffix = '.npz'):
+    return os.path.join(out_dir, stage, '%s.%s%s' % (name, fingerprint, suffix));
+
+#Writes arrays to an .npz stage output under a temporary name and renames it, so an
+#interrupted run never leaves an output that looks complete.
+
+def saveStage(path, **arrays):
+    temporary = '%s.%d.tmp' % (path, os.getpid());
+    with open(temporary, 'wb') as f:
+        np.savez(f, **arrays);
+    os.replace(temporary, path);
+
+#Removes the outputs of a stage for one name whose fingerprint is not current. Only files
+#named exactly <name>.<fingerprint>.* count, so the outputs of a save name that extends
+#this one after a dot ('leaf' and 'leaf.2') are left alone, and so are the temporary
+#files other processes are still writing.
+
+def removeStale(out_dir, stage, name, fingerprint):
+    folder = os.path.join(out_dir, stage);
+    pattern = re.compile(re.escape(name) + r'\.([0-9a-f]{16})\..*');
+    own_temporary = '.%d.tmp' % os.getpid();
+    for file_name in os.listdir(folder):
+        match = pattern.fullmatch(file_name);
+        if match is None or match.group(1) == fingerprint:
+            continue;
+        if file_name.endswith('.tmp') and not file_name.endswith(own_temporary):
+            continue;
+        os.remove(os.path.join(folder, file_name));
+
+#Stores concatenated arrays with their start offsets, and splits them back.
+
+def joinArrays(arrays, width = None):
+    if len(arrays) == 0:
+        arrays = [np.zeros((0,) if width is None else (0, width))];
+    return np.concatenate(arrays), np.cumsum([0] + [len(array) for array in arrays]);
+
+def splitArrays(joined, offsets):
+    return [joined[offsets[k]:offsets[k + 1]] for k in range(0, len(offsets) - 1)];
+
+#Stage functions. Each one computes a stage output for one cotyledon from the outputs of
+#its input stages and saves it to path.
+
+#ingest: the parsed workbook, in the cache layout of space_cache.py.
+
+def ingestStage(path, file_name):
+    saveCotyledon(path, loadCotyledon(file_name));
+
+#geometry: the stomata inside the cotyledon and the sectors that pass the area filter.
+
+def geometryStage(path, cotyledon, parameters):
+    kept = keptSectors(cotyledon, parameters['min_area'], parameters['max_area']);
+    saveStage(path,
+              stomata = insideStomata(cotyledon),
+              stomata_count = len(cotyledon['stomata']),
+              sectors = np.asarray(kept, dtype = np.int64),
+              areas = np.asarray([cotyledon['sector_areas'][k] for k in kept], dtype = np.float64));
+
+#distances: the stomata distances to each kept sector and, for the 'random' null model,
+#the signed distances of every random point to each kept sector. Random distances are
+#written straight to one float32 .npy file per sector, a chunk of distributions at a time,
+#so they can be rebinned later without drawing the random points again. With a
+#memory_limit the random distributions themselves are also drawn a chunk at a time.
+
+def distancesStage(path, index, cotyledon, geometry, parameters):
+    stomata_distances = [computeSectorDistance(geometry['stomata'], cotyledon['sectors'][k]) for k in geometry['sectors']];
+
+    if parameters['null_model'] == 'random':
+        rng = np.random.default_rng(cotyledonSeedSequence(parameters['random_seed'], index));
+        point_count = int(geometry['stomata_count']);
+        Ntrials = parameters['Ntrials'];
+        sampler = parameters.get('null_sampler', 'uniform');
+        dtype = COORDINATE_TYPES[parameters.get('random_dtype', 'float64')];
+        if parameters.get('memory_limit') is None:
+            random_chunks = [generateRandomSets(cotyledon['outline'], point_count, Ntrials, rng, sampler = sampler, dtype = dtype)];
+        else:
+            random_chunks = randomSetChunks(cotyledon['outline'], point_count, Ntrials, rng, randomChunkTrials(point_count, Ntrials, parameters['memory_limit'], dtype), sampler, dtype);
+
+        edges = [outlineEdges(cotyledon['sectors'][k]) for k in geometry['sectors']];
+        random_paths = [path[:-len('.npz')] + '.random%d.npy' % j for j in range(0, len(edges))];
+        temporaries = ['%s.%d.tmp' % (random_path, os.getpid()) for random_path in random_paths];
+        distances = [np.lib.format.open_memmap(temporary, mode = 'w+', dtype = np.float32, shape = (Ntrials*point_count,)) for temporary in temporaries];
+        trials_per_chunk = max(1, TRIAL_CHUNK_POINTS // max(1, point_count));
+        offset = 0;
+        for random_sets in random_chunks:
+            for j in range(0, len(edges)):
+                for k in range(0, len(random_sets), trials_per_chunk):
+                    chunk = signedSectorDistance(random_sets[k:k + trials_per_chunk], *edges[j]).ravel();
+                    distances[j][offset + k*point_count:offset + k*point_count + len(chunk)] = chunk;
+            offset += random_sets.shape[0]*point_count;
+        for j in range(0, len(edges)):
+            distances[j].flush();
+        del distances;
+        for j in range(0, len(edges)):
+            os.replace(temporaries[j], random_paths[j]);
+
+    joined, offsets = joinArrays(stomata_distances);
+    saveStage(path, stomata_distances = joined, stomata_offsets = offsets);
+
+#histograms: the stomata, random and ratio histograms of each kept sector, as in the
+#histogram script, with the number of random distributions of each (Ntrials). Random
+#distances are read back memory-mapped, a chunk at a time.
+
+def histogramsStage(path, distances_path, cotyledon, geometry, distances, parameters):
+    distance_bins = np.asarray(parameters['distance_bins'], dtype = np.float64);
+    stomata_histograms = [histogramCounts(sector_distances, distance_bins) for sector_distances in splitArrays(distances['stomata_distances'], distances['stomata_offsets'])];
+
+    random_histograms = [];
+    for j in range(0, len(geometry['sectors'])):
+        if parameters['null_model'] == 'analytic':
+            sector_points = cotyledon['sectors'][geometry['sectors'][j]];
+            random_histograms.append(parameters['Ntrials']*expectedSectorHistogram(cotyledon['outline'], sector_points, distance_bins, int(geometry['stomata_count'])));
+        else:
+            random_distances = np.load(distances_path[:-len('.npz')] + '.random%d.npy' % j, mmap_mode = 'r');
+            counts = np.zeros(len(distance_bins) - 1, dtype = np.float64);
+            for k in range(0, len(random_distances), TRIAL_CHUNK_POINTS):
+                chunk = np.asarray(random_distances[k:k + TRIAL_CHUNK_POINTS], dtype = np.float64);
+                accumulateCounts(counts, chunk[chunk > 0], distance_bins);
+            random_histograms.append(counts);
+
+    width = len(distance_bins) - 1;
+    saveStage(path,
+              sectors = np.asarray([sectorNumber(cotyledon['sector_names'][k]) for k in geometry['sectors']], dtype = np.int64),
+              areas = geometry['areas'],
+              trials = np.full(len(geometry['sectors']), parameters['Ntrials'], dtype = np.int64),
+              stomata = np.asarray(stomata_histograms, dtype = np.float64).reshape(-1, width),
+              random = np.asarray(random_histograms, dtype = np.float64).reshape(-1, width),
+              ratio = np.asarray(ratioHistograms(stomata_histograms, random_histograms), dtype = np.float64).reshape(-1, width));
+
+#density: the stomatal densities of densityRegions, with the virtual sector outlines.
+
+def densityStage(path, cotyledon, parameters):
+    result = densityRegions(cotyledon, parameters['sector_range']);
+    joined, offsets = joinArrays(result['range_outlines'], 2);
+    saveStage(path,
+              densities = np.asarray([result['sector_density'], result['in_range_density'], result['outside_range_density']], dtype = np.float64),
+              counts = np.asarray([result['stomata_inside_sectors'], result['in_range'], result['out_of_range'], result['outside_cotyledon']], dtype = np.int64),
+              areas = result['region_areas'],
+              sector_counts = result['sector_counts'],
+              range_points = joined, range_offsets = offsets);
+
+#sweep: the densities of rangeSweepRegions for every range in sweep_ranges. The in_range
+#area of every range is kept in area_path, which only depends on the workbook and the
+#range construction, so adding a range to the sweep only computes the area of the new one.
+
+def sweepStage(path, area_path, cotyledon, parameters):
+    area_cache = {};
+    if os.path.exists(area_path):
+        cached = readStage(area_path);
+        area_cache = dict(zip(cached['ranges'].tolist(), cached['areas'].tolist()));
+    result = rangeSweepRegions(cotyledon, parameters['sweep_ranges'], parameters['range_construction'], area_cache);
+    saveStage(area_path, ranges = np.asarray(list(area_cache.keys()), dtype = np.float64), areas = np.asarray(list(area_cache.values()), dtype = np.float64));
+    saveStage(path, ranges = result['radii'], counts = result['counts'], areas = result['areas'], densities = result['densities']);
+
+#pairs: the stomata-stomata pair correlation g, Ripley's K and L, the pair counts and the
+#envelope of complete spatial randomness (stomataPairStatistics) over the distance bins.
+
+def pairsStage(path, index, cotyledon, parameters):
+    result = stomataPairStatistics(cotyledon, index, parameters);
+    saveStage(path, **dict((key, np.asarray(value, dtype = np.float64)) for key, value in result.items()));
+
+#Reads an .npz stage output into a dictionary of arrays.
+
+def readStage(path):
+    with np.load(path, allow_pickle = False) as data:
+        return {key: data[key] for key in data.files};
+
+#Runs the per-cotyledon stages of one cotyledon, reusing every stage output whose
+#fingerprint is already saved. force is the set of stages to recompute regardless.
+#Stages that are computed are recorded in report (see space_instrument.py), if given.
+#Returns a dictionary with the fingerprint of each stage and the list of stages computed.
+
+def runCotyledonStages(index, file_name, name, parameters, out_dir, force = (), report = None):
+    with stageRecord(report, 'cotyledon', True, index = index, cotyledon = file_name) as record:
+        result = cotyledonStages(index, file_name, name, parameters, out_dir, force, report);
+        record['computed'] = result['computed'];
+    return result;
+
+#The stages of runCotyledonStages.
+
+def cotyledonStages(index, file_name, name, parameters, out_dir, force, report):
+    fingerprints = {};
+    computed = [];
+    loaded = {};
+
+    #Stage outputs are only read when a later stage has to be computed.
+
+    def load(stage):
+        if stage not in loaded:
+            path = stagePath(out_dir, stage, name, fingerprints[stage]);
+            loaded[stage] = readCotyledon(path) if stage == 'ingest' else readStage(path);
+        return loaded[stage];
+
+    def run(stage, compute, *inputs):
+        fingerprints[stage] = stageFingerprint(stage, *inputs);
+        path = stagePath(out_dir, stage, name, fingerprints[stage]);
+        if stage in force or not os.path.exists(path):
+            with stageRecord(report, stage):
+                compute(path);
+            computed.append(stage);
+            removeStale(out_dir, stage, name, fingerprints[stage]);
+        return path;
+
+    #A seed of None gives new random points on every run, so the distances never match.
+
+    seed = parameters['random_seed'];
+    if seed is None:
+        seed = uuid.uuid4().hex;
+    random_inputs = [parameters['Ntrials'], seed, index] if parameters['null_model'] == 'random' else [];
+
+    #The null sampler, memory limit and coordinate type only enter the fingerprint when they
+    #are not the defaults, so distances computed before these options are still reused.
+
+    if parameters['null_model'] == 'random' and parameters.get('null_sampler', 'uniform') != 'uniform':
+        random_inputs.append(parameters['null_sampler']);
+    if parameters['null_model'] == 'random' and (parameters.get('memory_limit') is not None or parameters.get('random_dtype', 'float64') != 'float64'):
+        random_inputs.append([parameters.get('memory_limit'), parameters.get('random_dtype', 'float64')]);
+
+    run('ingest', lambda path: ingestStage(path, file_name), workbookHash(file_name));
+    run('geometry', lambda path: geometryStage(path, load('ingest'), parameters),
+        fingerprints['ingest'], float(parameters['min_area']), float(parameters['max_area']));
+    distances_path = run('distances', lambda path: distancesStage(path, index, load('ingest'), load('geometry'), parameters),
+                         fingerprints['geometry'], parameters['null_model'], random_inputs);
+    run('histograms', lambda path: histogramsStage(path, distances_path, load('ingest'), load('geometry'), load('distances'), parameters),
+        fingerprints['distances'], parameters['distance_bins'], parameters['null_model'], parameters['Ntrials']);
+    run('density', lambda path: densityStage(path, load('ingest'), parameters),
+        fingerprints['ingest'], float(parameters['sector_range']));
+    area_path = stagePath(out_dir, 'range_areas', name, stageFingerprint('sweep', fingerprints['ingest'], parameters['range_construction']));
+    run('sweep', lambda path: sweepStage(path, area_path, load('ingest'), parameters),
+        fingerprints['ingest'], [float(radius) for radius in parameters['sweep_ranges']], parameters['range_construction']);
+    run('pairs', lambda path: pairsStage(path, index, load('ingest'), parameters),
+        fingerprints['ingest'], parameters['distance_bins'], parameters['envelope_trials'], seed, index,
+        float(parameters['exact_radius']), float(parameters['pair_resolution']));
+
+    return {'fingerprints': fingerprints, 'computed': computed};
+
+#correlation: the correlation function of each group of cotyledons (phenotype, or the
+#group_by column of the file list) from the histograms of all its sectors, with the
+#propagated 95% confidence interval ('err') and, unless bootstrap_replicates is 0, the
+#bootstrap 95% interval ('low', 'high') from resampling sectors or whole cotyledons
+#(bootstrap_resample). keys holds the group of each cotyledon.
+
+def correlationStage(path, histograms, keys, parameters, workers = 1):
+    width = len(parameters['distance_bins']) - 1;
+    stomata = np.concatenate([histogram['stomata'] for histogram in histograms]).reshape(-1, width);
+    random = np.concatenate([histogram['random'] for histogram in histograms]).reshape(-1, width);
+    cotyledons = np.concatenate([np.full(len(histograms[k]['stomata']), k) for k in range(0, len(histograms))] + [np.zeros(0, dtype = int)]);
+    sector_keys = np.asarray(keys)[cotyledons] if len(cotyledons) else np.zeros(0, dtype = np.str_);
+    result = groupedCorrelation(stomata, random, sector_keys);
+
+    low = np.full((len(result['groups']), width), np.nan);
+    high = np.full((len(result['groups']), width), np.nan);
+    if parameters['bootstrap_replicates'] > 0:
+        for k in range(0, len(result['groups'])):
+            rows = np.flatnonzero(sector_keys == result['groups'][k]);
+            low[k], high[k] = bootstrapInterval(stomata[rows], random[rows], parameters['bootstrap_replicates'], parameters['bootstrap_seed'],
+                                                cotyledons[rows] if parameters['bootstrap_resample'] == 'cotyledons' else None, workers = workers);
+    saveStage(path,
+              groups = np.asarray(result['groups'], dtype = np.str_),
+              sectors = result['sectors'],
+              distance_bins = np.asarray(parameters['distance_bins'], dtype = np.float64),
+              num = result['num'], den = result['den'], y = result['y'], err = result['err'], low = low, high = high);
+
+#Writes the cohort results: sector_results.npy, the results store of space_results.py with
+#one row per sector (see Stomata and Random Point Histograms.py), and the three density
+#arrays of Stomatal Density Calculations.py, with the (cotyledons x ranges x 3) range
+#sweep densities in range sweep density.npy, and the stomata pair statistics of every
+#cotyledon in pair correlation.npz (see space_pairs.savePairResults). cotyledon_results
+#is a list of (row of the file list, save name, phenotype, histograms stage output) tuples,
+#and pairs the pairs stage outputs in the same order.
+
+def exportResults(out_dir, cotyledon_results, densities, sweeps, pairs, distance_bins):
+    saveResults(os.path.join(out_dir, 'sector_results.npy'), sectorResults(cotyledon_results, distance_bins));
+
+    densities = np.asarray(densities).reshape(-1, 3);
+    np.save(os.path.join(out_dir, 'real sector density.npy'), densities[:, 0]);
+    np.save(os.path.join(out_dir, 'virtual sector density.npy'), densities[:, 1]);
+    np.save(os.path.join(out_dir, 'rest of cotyledon density.npy'), densities[:, 2]);
+    np.save(os.path.join(out_dir, 'range sweep density.npy'), np.asarray(sweeps).reshape(len(densities), -1, 3));
+    savePairResults(os.path.join(out_dir, 'pair correlation.npz'), [row[0] for row in cotyledon_results], pairs, distance_bins);
+
+#Returns the stages to recompute for the stages named in force: those and every stage
+#that reads them, directly or through other stages.
+
+def forcedStages(force):
+    forced = set(force);
+    for stage in STAGES:
+        if any(source in forced for source in STAGE_INPUTS[stage]):
+            forced.add(stage);
+    return forced;
+
+#Runs the pipeline over a file list and writes every stage output and the cohort arrays
+#to out_dir. Returns a dictionary with the number of cotyledons for which each stage was
+#computed and the list of failures from runCotyledons.
+
+def runPipeline(filelist, out_dir, parameters = PARAMETERS, workers = 1, force = (), report = None):
+    directory, save, phenotype = readFileList(filelist);
+    table = readFileTable(filelist);
+    group = fileListColumn(table, parameters['group_by']);
+    if group is None:
+        raise KeyError('No column %r in %s (columns: %s)' % (parameters['group_by'], filelist, ', '.join(table.keys())));
+    names = [outputName(name) for name in save];
+    if len(set(names)) != len(names):
+        raise ValueError('Save names in %s must be unique, they name the stage outputs' % filelist);
+    for stage in STAGES + ['range_areas']:
+        os.makedirs(os.path.join(out_dir, stage), exist_ok = True);
+
+    force = forcedStages(force);
+    task_list = [(i, directory[i], names[i], parameters, out_dir, force, report) for i in range(0, len(directory))];
+    results, failures = runCotyledons(runCotyledonStages, task_list, workers, labels = save);
+
+    computed = dict((stage, 0) for stage in STAGES);
+    histograms = [];
+    cotyledon_results = [];
+    densities = [];
+    sweeps = [];
+    pairs = [];
+    keys = [];
+    fingerprints = [];
+    for k in range(0, len(results)):
+        if results[k] is None:
+            continue;
+        for stage in results[k]['computed']:
+            computed[stage] += 1;
+        histograms.append(readStage(stagePath(out_dir, 'histograms', names[k], results[k]['fingerprints']['histograms'])));
+        densities.append(readStage(stagePath(out_dir, 'density', names[k], results[k]['fingerprints']['density']))['densities']);
+        sweeps.append(readStage(stagePath(out_dir, 'sweep', names[k], results[k]['fingerprints']['sweep']))['densities']);
+        pairs.append(readStage(stagePath(out_dir, 'pairs', names[k], results[k]['fingerprints']['pairs'])));
+        keys.append(group[k]);
+        cotyledon_results.append((k, save[k], phenotype[k], histograms[-1]));
+        fingerprints.append([names[k], group[k], results[k]['fingerprints']['histograms']]);
+
+    #The correlation function depends on every histogram of the file list and its group.
+
+    correlation_fingerprint = stageFingerprint('correlation', fingerprints, parameters['bootstrap_replicates'],
+                                               parameters['bootstrap_seed'], parameters['bootstrap_resample']);
+    correlation_path = stagePath(out_dir, 'correlation', 'correlation', correlation_fingerprint);
+    if 'correlation' in force or not os.path.exists(correlation_path):
+        with stageRecord(report, 'correlation', sectors = sum([len(histogram['stomata']) for histogram in histograms]),
+                         replicates = parameters['bootstrap_replicates']):
+            correlationStage(correlation_path, histograms, keys, parameters, workers);
+        removeStale(out_dir, 'correlation', 'correlation', correlation_fingerprint);
+        computed['correlation'] = 1;
+
+    exportResults(out_dir, cotyledon_results, densities, sweeps, pairs, parameters['distance_bins']);
+    return {'computed': computed, 'failures': failures, 'cotyledons': len(directory)};
+
+
+'''
+End of function definition section.
+'''
+
+
+'''
+Begin of procedural section.
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Run the SPACE analysis as stages, recomputing only the stages whose inputs changed.');
+    parser.add_argument('--filelist', default = 'filelist.csv', help = 'file list of datasets (default %(default)s)');
+    parser.add_argument('--out', default = 'pipeline', help = 'folder for the stage outputs and results (default %(default)s)');
+    parser.add_argument('--workers', type = int, default = 1, help = 'worker processes, 0 for one per core (default %(default)s)');
+    parser.add_argument('--min-area', type = float, default = PARAMETERS['min_area']);
+    parser.add_argument('--max-area', type = float, default = PARAMETERS['max_area']);
+    parser.add_argument('--null-model', choices = ['random', 'analytic'], default = PARAMETERS['null_model']);
+    parser.add_argument('--seed', type = int, default = PARAMETERS['random_seed'], help = 'random seed, -1 for a new seed every run');
+    parser.add_argument('--ntrials', type = int, default = PARAMETERS['Ntrials']);
+    parser.add_argument('--memory-limit', type = float, default = None, metavar = 'MB', help = 'draw and measure the random distributions in chunks to stay within this many megabytes');
+    parser.add_argument('--float32', action = 'store_true', help = 'keep the random point coordinates as float32');
+    parser.add_argument('--sampler', choices = SAMPLERS, default = PARAMETERS['null_sampler'], help = 'how the random point distributions are drawn (default %(default)s)');
+    parser.add_argument('--bins', type = float, nargs = 3, metavar = ('FIRST', 'LAST', 'COUNT'),
+                        help = 'logarithmic distance bins from FIRST to LAST microns with COUNT edges, plus a bin from 0 (default 15 2500 15)');
+    parser.add_argument('--sector-range', type = float, default = PARAMETERS['sector_range']);
+    parser.add_argument('--sweep', type = float, nargs = '+', default = PARAMETERS['sweep_ranges'], help = 'sector ranges of the range sweep (default %(default)s)');
+    parser.add_argument('--construction', choices = RANGE_CONSTRUCTIONS, default = PARAMETERS['range_construction'], help = 'range construction of the sweep (default %(default)s)');
+    parser.add_argument('--group-by', default = PARAMETERS['group_by'], help = 'file list column to group the correlation function by (default %(default)s)');
+    parser.add_argument('--bootstrap', type = int, default = PARAMETERS['bootstrap_replicates'], help = 'bootstrap replicates per group, 0 to skip (default %(default)s)');
+    parser.add_argument('--resample', choices = ['sectors', 'cotyledons'], default = PARAMETERS['bootstrap_resample'], help = 'what the bootstrap resamples (default %(default)s)');
+    parser.add_argument('--envelope', type = int, default = PARAMETERS['envelope_trials'], help = 'random patterns of the pair correlation envelope, 0 to skip (default %(default)s)');
+    parser.add_argument('--exact-radius', type = float, default = PARAMETERS['exact_radius'], help = 'distance up to which stomata pairs are counted exactly, in microns (default %(default)s)');
+    parser.add_argument('--force', nargs = '+', choices = STAGES, default = [], help = 'recompute these stages and the stages after them');
+    parser.add_argument('--report', default = None, help = 'append the time and memory of every computed stage to this JSON-lines run report');
+    parser.add_argument('--profile', default = None, metavar = 'DATASET', help = 'run the stages of this dataset under cProfile (needs --report)');
+    args = parser.parse_args();
+
+    parameters = dict(PARAMETERS);
+    parameters.update({'min_area': args.min_area, 'max_area': args.max_area, 'null_model': args.null_model,
+                       'random_seed': None if args.seed < 0 else args.seed, 'Ntrials': args.ntrials, 'null_sampler': args.sampler,
+                       'memory_limit': None if args.memory_limit is None else int(args.memory_limit*2**20), 'random_dtype': 'float32' if args.float32 else 'float64',
+                       'sector_range': args.sector_range, 'sweep_ranges': args.sweep,
+                       'range_construction': args.construction, 'bootstrap_replicates': args.bootstrap,
+                       'bootstrap_resample': args.resample, 'group_by': args.group_by,
+                       'envelope_trials': args.envelope, 'exact_radius': args.exact_radius});
+    if args.bins is not None:
+        parameters['distance_bins'] = np.insert(np.logspace(np.log10(args.bins[0]), np.log10(args.bins[1]), int(args.bins[2])), 0, 0).tolist();
+
+    start_time = time.time();
+    workers = (os.cpu_count() or 1) if args.workers <= 0 else args.workers;
+    summary = runPipeline(args.filelist, args.out, parameters, workers, args.force, runReport(args.report, 'pipeline', args.profile));
+
+    for stage in STAGES:
+        total = 1 if stage == 'correlation' else summary['cotyledons'] - len(summary['failures']);
+        print('%-11s computed %d, reused %d' % (stage, summary['computed'][stage], total - summary['computed'][stage]));
+    if summary['failures']:
+        print('%d of %d cotyledons failed: %s' % (len(summary['failures']), summary['cotyledons'], ', '.join(label for k, label, error in summary['failures'])));
+    print('--- %s seconds ---' % (time.time() - start_time));
+
+'''
+End of procedural section.
+'''
@@ -0,0 +1,269 @@
+#Raster backend for the SPACE pipeline scripts.
+#Rasterizes the cotyledon and sector outlines on a grid of a chosen resolution (microns
+#per pixel) and computes a Euclidean distance transform to each sector once, after which
+#the distance of any point to a sector is an interpolated array lookup. Also computes a
+#smoothed stomatal density field over the cotyledon. The products are written as .npy
+#files that can be memory-mapped.
+
+#Needs scipy (scipy.ndimage) for the distance transform and the smoothing.
+
+#Run python space_raster.py --resolution 1 2 5 to see the distance error of each resolution
+#for the cotyledons of filelist.csv, and add --out to write the products; see --help.
+
+import os;
+import json;
+import argparse;
+import numpy as np;
+from space_geometry import pointsInPolygon, outlineEdges, signedSectorDistance
+from space_ingest import readFileList, outputName
+from space_cache import cachedCotyledon, CACHE_DIR
+from space_histogram import accumulateCounts, accumulateBase, TRIAL_CHUNK_POINTS
+from space_parallel import runCotyledons
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Default resolution (microns per pixel) and smoothing length (microns, the standard
+#deviation of the Gaussian kernel) of the stomatal density field.
+
+RASTER_RESOLUTION = 2.0;
+DENSITY_SIGMA = 50.0;
+
+#Returns the grid covering all the outlines, with one pixel to spare on every side, as a
+#dictionary with the lower left corner ('origin'), 'resolution' and 'shape' (rows, columns).
+#Pixel (i, j) is centered on origin + ((j + 0.5), (i + 0.5))*resolution.
+
+def rasterGrid(outline_list, resolution = RASTER_RESOLUTION):
+    points = np.concatenate([np.asarray(outline, dtype = np.float64)[:, :2] for outline in outline_list]);
+    origin = points.min(axis = 0) - resolution;
+    columns, rows = np.ceil((points.max(axis = 0) + resolution - origin)/resolution).astype(int);
+    return {'origin': origin, 'resolution': float(resolution), 'shape': (int(rows), int(columns))};
+
+#Returns the (rows, columns) boolean mask of the pixels whose centers are inside the outline.
+#Only the pixels within the bounding box of the outline are tested, a band of rows at a time.
+
+def rasterizeOutline(outline, grid, band_pixels = 2**20):
+    outline = np.asarray(outline, dtype = np.float64)[:, :2];
+    rows, columns = grid['shape'];
+    mask = np.zeros(grid['shape'], dtype = bool);
+    if len(outline) == 0:
+        return mask;
+    j0, i0 = np.clip(np.floor((outline.min(axis = 0) - grid['origin'])/grid['resolution']).astype(int), 0, None);
+    j1, i1 = np.ceil((outline.max(axis = 0) - grid['origin'])/grid['resolution']).astype(int) + 1;
+    j1 = min(j1, columns);
+    i1 = min(i1, rows);
+    x = grid['origin'][0] + (np.arange(j0, j1) + 0.5)*grid['resolution'];
+    band = max(1, band_pixels // max(1, len(x)));
+    for i in range(i0, i1, band):
+        y = grid['origin'][1] + (np.arange(i, min(i + band, i1)) + 0.5)*grid['resolution'];
+        centers = np.stack(np.broadcast_arrays(x[None, :], y[:, None]), axis = -1);
+        mask[i:i + len(y), j0:j1] = pointsInPolygon(outline, centers);
+    return mask;
+
+#Returns the float32 signed distance map of a sector on the grid, in microns: positive
+#outside the sector, negative inside, like signedSectorDistance. The outline is sampled
+#every quarter pixel and each sample is stored in the pixel it falls in; the distance
+#transform finds the nearest sampled pixel of every pixel, and the distance is then taken
+#to the exact position of that sample, not to the pixel center, so the error stays well
+#below a pixel.
+
+def signedDistanceMap(sector_points, grid):
+    from scipy import ndimage
+    resolution = grid['resolution'];
+    rows, columns = grid['shape'];
+    starts, ends = outlineEdges(sector_points);
+    if len(starts) < 3:
+        return np.full(grid['shape'], np.inf, dtype = np.float32);
+
+    steps = np.maximum(1, np.ceil(4*np.hypot(*(ends - starts).T)/resolution).astype(np.int64));
+    edge = np.repeat(np.arange(len(starts)), steps);
+    t = (np.arange(len(edge)) - np.repeat(np.cumsum(steps) - steps, steps))/np.repeat(steps, steps);
+    samples = starts[edge] + t[:, None]*(ends[edge] - starts[edge]);
+
+    j = np.clip(np.floor((samples[:, 0] - grid['origin'][0])/resolution).astype(np.int64), 0, columns - 1);
+    i = np.clip(np.floor((samples[:, 1] - grid['origin'][1])/resolution).astype(np.int64), 0, rows - 1);
+    sample_x = np.zeros(grid['shape'], dtype = np.float32);
+    sample_y = np.zeros(grid['shape'], dtype = np.float32);
+    sampled = np.ones(grid['shape'], dtype = bool);
+    sample_x[i, j] = samples[:, 0];
+    sample_y[i, j] = samples[:, 1];
+    sampled[i, j] = False;
+
+    nearest_i, nearest_j = ndimage.distance_transform_edt(sampled, return_distances = False, return_indices = True);
+    x = (grid['origin'][0] + (np.arange(columns) + 0.5)*resolution).astype(np.float32);
+    y = (grid['origin'][1] + (np.arange(rows) + 0.5)*resolution).astype(np.float32);
+    distance = np.hypot(x[None, :] - sample_x[nearest_i, nearest_j], y[:, None] - sample_y[nearest_i, nearest_j]);
+    inside = rasterizeOutline(sector_points, grid);
+    distance[inside] *= -1;
+    return distance;
+
+#Looks up the distance of points (an array of any shape with x, y in the last axis) in a
+#distance map, interpolating bilinearly between the four nearest pixel centers.
+#Returns float64 distances in the shape of the points without the last axis.
+
+def sampleDistanceMap(distance_map, grid, points):
+    points = np.asarray(points, dtype = np.float64);
+    flat = points.reshape(-1, 2);
+    rows, columns = distance_map.shape;
+    fx = (flat[:, 0] - grid['origin'][0])/grid['resolution'] - 0.5;
+    fy = (flat[:, 1] - grid['origin'][1])/grid['resolution'] - 0.5;
+    j = np.clip(np.floor(fx).astype(np.int64), 0, columns - 2);
+    i = np.clip(np.floor(fy).astype(np.int64), 0, rows - 2);
+    tx = np.clip(fx - j, 0, 1);
+    ty = np.clip(fy - i, 0, 1);
+    distance = ((1 - ty)*((1 - tx)*distance_map[i, j] + tx*distance_map[i, j + 1]) +
+                ty*((1 - tx)*distance_map[i + 1, j] + tx*distance_map[i + 1, j + 1]));
+    return distance.reshape(points.shape[:-1]);
+
+#Returns the smoothed stomatal density field (stomata per square micron) on the grid:
+#the stomata counts per pixel smoothed with a Gaussian of standard deviation sigma microns,
+#divided by the smoothed cotyledon mask so the density is not biased low near the edge.
+#Pixels outside the cotyledon are NaN.
+
+def densityField(stomata_points, cotyledon_mask, grid, sigma = DENSITY_SIGMA):
+    from scipy import ndimage
+    rows, columns = grid['shape'];
+    j = np.floor((stomata_points[:, 0] - grid['origin'][0])/grid['resolution']).astype(np.int64);
+    i = np.floor((stomata_points[:, 1] - grid['origin'][1])/grid['resolution']).astype(np.int64);
+    keep = (i >= 0) & (i < rows) & (j >= 0) & (j < columns);
+    counts = np.bincount(i[keep]*columns + j[keep], minlength = rows*columns).reshape(rows, columns).astype(np.float64);
+    smoothed = ndimage.gaussian_filter(counts, sigma/grid['resolution'], mode = 'constant');
+    coverage = ndimage.gaussian_filter(cotyledon_mask.astype(np.float64), sigma/grid['resolution'], mode = 'constant');
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        density = smoothed/coverage/grid['resolution']**2;
+    density[~cotyledon_mask] = np.nan;
+    return density.astype(np.float32);
+
+#Raster distances of points to a sector, keeping only those outside the sector, the raster
+#counterpart of computeSectorDistance.
+
+def rasterSectorDistance(points_list, distance_map, grid):
+    distance_list = sampleDistanceMap(distance_map, grid, points_list);
+    return distance_list[distance_list > 0];
+
+#Raster counterpart of randomSectorHistogram: histograms the distances of a stacked
+#(Ntrials, N, 2) array of random point distributions to a sector from its distance map.
+#With base_width also returns the base histogram of the distances.
+
+def rasterSectorHistogram(random_sets, distance_map, grid, distance_bins, chunk_points = TRIAL_CHUNK_POINTS, base_width = None):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    counts = np.zeros(len(distance_bins) - 1, dtype = np.float64);
+    base = np.zeros(0, dtype = np.float64);
+    trials_per_chunk = max(1, chunk_points // max(1, random_sets.shape[1]));
+    for k in range(0, len(random_sets), trials_per_chunk):
+        distances = rasterSectorDistance(random_sets[k:k + trials_per_chunk], distance_map, grid).ravel();
+        accumulateCounts(counts, distances, distance_bins);
+        if base_width is not None:
+            base = accumulateBase(base, distances, base_width);
+    return counts if base_width is None else (counts, base);
+
+#Compares the raster distances of points to each sector with the exact distances of
+#signedSectorDistance. Points are usually the stomata, or uniform points in the cotyledon.
+#Returns a dictionary with the resolution and the mean, 95th percentile and maximum of the
+#absolute error in microns, over points outside the sectors.
+
+def quantizationError(points, sector_list, distance_maps, grid):
+    errors = [];
+    for k in range(0, len(sector_list)):
+        starts, ends = outlineEdges(sector_list[k]);
+        exact = signedSectorDistance(points, starts, ends);
+        outside = exact > 0;
+        errors.append(np.abs(sampleDistanceMap(distance_maps[k], grid, points[outside]) - exact[outside]));
+    errors = np.concatenate(errors) if errors else np.zeros(0);
+    if len(errors) == 0:
+        return {'resolution': grid['resolution'], 'mean': 0.0, 'p95': 0.0, 'max': 0.0};
+    return {'resolution': grid['resolution'], 'mean': float(np.mean(errors)),
+            'p95': float(np.percentile(errors, 95)), 'max': float(np.max(errors))};
+
+#Builds the raster products of one cotyledon: the grid, the cotyledon mask, the
+#(sectors, rows, columns) signed distance maps and the stomatal density field.
+#When out_dir is given they are written there as <name>.grid.json, <name>.distance.npy and
+#<name>.density.npy, and the arrays returned are memory-mapped from those files. name is
+#the save name of the cotyledon, made safe for a file name with outputName.
+
+def rasterCotyledon(cotyledon, resolution = RASTER_RESOLUTION, sigma = DENSITY_SIGMA, out_dir = None, name = None):
+    name = None if name is None else outputName(name);
+    grid = rasterGrid([cotyledon['outline']] + list(cotyledon['sectors']), resolution);
+    cotyledon_mask = rasterizeOutline(cotyledon['outline'], grid);
+    shape = (len(cotyledon['sectors']),) + grid['shape'];
+
+    if out_dir is None:
+        distance_maps = np.empty(shape, dtype = np.float32);
+    else:
+        os.makedirs(out_dir, exist_ok = True);
+        distance_path = os.path.join(out_dir, '%s.distance.npy' % name);
+        distance_maps = np.lib.format.open_memmap(distance_path, mode = 'w+', dtype = np.float32, shape = shape);
+    for k in range(0, len(cotyledon['sectors'])):
+        distance_maps[k] = signedDistanceMap(cotyledon['sectors'][k], grid);
+
+    density = densityField(cotyledon['stomata'], cotyledon_mask, grid, sigma);
+
+    if out_dir is not None:
+        distance_maps.flush();
+        del distance_maps;
+        np.save(os.path.join(out_dir, '%s.density.npy' % name), density);
+        with open(os.path.join(out_dir, '%s.grid.json' % name), 'w') as f:
+            json.dump({'origin': grid['origin'].tolist(), 'resolution': grid['resolution'], 'shape': list(grid['shape']), 'sigma': sigma}, f);
+        distance_maps = np.load(distance_path, mmap_mode = 'r');
+        density = np.load(os.path.join(out_dir, '%s.density.npy' % name), mmap_mode = 'r');
+
+    return {'grid': grid, 'mask': cotyledon_mask, 'distance': distance_maps, 'density': density};
+
+#Distance error of every resolution for one dataset file, as a list of quantizationError
+#dictionaries. The products of the first resolution are written to out_dir when it is
+#given. Runs in runCotyledons, so a cotyledon that fails is reported and skipped.
+
+def rasterErrors(file_name, name, resolutions, sigma, out_dir, cache_dir):
+    cotyledon = cachedCotyledon(file_name, cache_dir);
+    errors = [];
+    for k in range(0, len(resolutions)):
+        raster = rasterCotyledon(cotyledon, resolutions[k], sigma, out_dir if k == 0 else None, name);
+        errors.append(quantizationError(cotyledon['stomata'], cotyledon['sectors'], raster['distance'], raster['grid']));
+    return errors;
+
+#Reads the products written by rasterCotyledon for the save name name, memory-mapped.
+
+def readRaster(out_dir, name):
+    name = outputName(name);
+    with open(os.path.join(out_dir, '%s.grid.json' % name)) as f:
+        grid = json.load(f);
+    grid = {'origin': np.asarray(grid['origin']), 'resolution': grid['resolution'], 'shape': tuple(grid['shape'])};
+    return {'grid': grid,
+            'distance': np.load(os.path.join(out_dir, '%s.distance.npy' % name), mmap_mode = 'r'),
+            'density': np.load(os.path.join(out_dir, '%s.density.npy' % name), mmap_mode = 'r')};
+
+
+'''
+End of function definition section.
+'''
+
+
+'''
+Begin of procedural section.
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Raster distance maps and density fields, with their distance error against the exact distances.');
+    parser.add_argument('--filelist', default = 'filelist.csv', help = 'file list of datasets (default %(default)s)');
+    parser.add_argument('--resolution', type = float, nargs = '+', default = [RASTER_RESOLUTION], help = 'microns per pixel; give several to compare them (default %(default)s)');
+    parser.add_argument('--sigma', type = float, default = DENSITY_SIGMA, help = 'smoothing of the density field in microns (default %(default)s)');
+    parser.add_argument('--out', help = 'write the products of the first resolution to this folder');
+    parser.add_argument('--cache-dir', default = CACHE_DIR, help = 'cache of parsed workbooks (default %(default)s)');
+    args = parser.parse_args();
+
+    directory, save, phenotype = readFileList(args.filelist);
+    task_list = [(directory[i], save[i], args.resolution, args.sigma, args.out, args.cache_dir) for i in range(0, len(directory))];
+    results, failures = runCotyledons(rasterErrors, task_list, labels = save);
+    print('%-20s %10s %10s %10s %10s' % ('cotyledon', 'um/pixel', 'mean err', 'p95 err', 'max err'));
+    for i in range(0, len(directory)):
+        if results[i] is None:
+            continue;
+        for error in results[i]:
+            print('%-20s %10g %10.3f %10.3f %10.3f' % (save[i], error['resolution'], error['mean'], error['p95'], error['max']));
+    if failures:
+        print('%d of %d cotyledons failed: %s' % (len(failures), len(directory), ', '.join(label for k, label, error in failures)));
+
+'''
+End of procedural section.
+'''
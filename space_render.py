@@ -0,0 +1,324 @@
+#Headless figure rendering for the SPACE pipeline scripts.
+#Draws a quality control overlay of every cotyledon (outline, sectors, virtual sectors and
+#the stomata colored by region) and the correlation plots of a saved results file. Every
+#figure is its own matplotlib Figure on the Agg canvas, without pyplot, so figures render
+#without a display and in worker processes in parallel.
+#Each figure records a fingerprint of everything it shows in the manifest of its output
+#folder, and a rerun only redraws the figures whose fingerprint changed or whose file is
+#missing: an edited workbook redraws the overlay of that cotyledon only.
+#
+#    python space_render.py overlays --filelist filelist.csv --out figures --workers 4
+#    python space_render.py correlation "sector results filename.npy" --out figures
+
+import os;
+import json;
+import time;
+import hashlib;
+import traceback;
+import argparse;
+import numpy as np;
+from space_ingest import readFileList, outputName
+from space_cache import cachedCotyledon, workbookHash, CACHE_DIR
+from space_geometry import classifyPoints, SectorRange, REGION_NAMES
+from space_correlation import groupedCorrelation, bootstrapInterval
+from space_results import loadResults, groupKeys
+from space_parallel import runCotyledons
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Version of the drawing code, part of every fingerprint, so a change in how figures are
+#drawn redraws them all.
+
+RENDER_VERSION = 1;
+
+#File (in the output folder) holding the fingerprint of every figure drawn there.
+
+MANIFEST_NAME = 'render manifest.json';
+
+#Point layers with more points than this are rasterized with rasterize = None, so a vector
+#figure of a cotyledon with 10^5 stomata stays small and saves quickly. Rasterized layers
+#are drawn at the dpi of the figure; lines and text stay vector graphics.
+
+RASTERIZE_POINTS = 10000;
+FIGURE_DPI = 200;
+
+#Colors of the sectors (as in the density script), of the stomata of each region in the
+#order of REGION_NAMES, and of the correlation plots (as in the correlation script).
+
+SECTOR_COLORS = ['g', 'c', 'k', 'r', 'y', 'm'];
+REGION_COLORS = ['forestgreen', 'darkorange', 'royalblue', 'silver'];
+FILL_COLORS = ['turquoise', 'crimson', 'darkslategrey', 'orange', 'mediumpurple', 'yellowgreen', 'hotpink', 'tan', 'lightskyblue', 'silver'];
+LINE_COLORS = ['darkblue', 'crimson', 'k', 'darkorange', 'indigo', 'darkgreen', 'deeppink', 'saddlebrown', 'steelblue', 'dimgray'];
+
+#Returns a new Figure drawn on the Agg canvas. Figures made this way are not registered with
+#pyplot, so nothing is shared between figures and nothing needs closing.
+
+def newFigure(size = (6.4, 4.8)):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize = size);
+    FigureCanvasAgg(figure);
+    return figure;
+
+#Returns the fingerprint of a figure: a hash of its kind, RENDER_VERSION and everything it
+#depends on.
+
+def renderFingerprint(kind, *inputs):
+    text = json.dumps([kind, RENDER_VERSION] + list(inputs), sort_keys = True);
+    return hashlib.blake2b(text.encode('utf-8'), digest_size = 8).hexdigest();
+
+#Reads the manifest of an output folder, a dictionary from figure file name to fingerprint.
+#Writes it back under a temporary name and renames it, like the pipeline stage outputs.
+
+def readManifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME);
+    if not os.path.exists(path):
+        return {};
+    with open(path) as f:
+        return json.load(f);
+
+def writeManifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME);
+    temporary = '%s.%d.tmp' % (path, os.getpid());
+    with open(temporary, 'w') as f:
+        json.dump(manifest, f, indent = 1, sort_keys = True);
+    os.replace(temporary, path);
+
+#Returns True if the figure file exists and was drawn from the inputs of fingerprint.
+
+def figureCurrent(out_dir, manifest, file_name, fingerprint):
+    return manifest.get(file_name) == fingerprint and os.path.exists(os.path.join(out_dir, file_name));
+
+#Saves a figure to path under a temporary name and renames it, so an interrupted run never
+#leaves a partial figure behind.
+
+def saveFigure(figure, path, dpi = FIGURE_DPI):
+    root, extension = os.path.splitext(path);
+    temporary = '%s.%d.tmp%s' % (root, os.getpid(), extension);
+    figure.savefig(temporary, dpi = dpi);
+    os.replace(temporary, path);
+
+#Returns whether a layer of point_count points is rasterized: rasterize itself when it is
+#True or False, and more than RASTERIZE_POINTS points when it is None.
+
+def rasterizeLayer(rasterize, point_count):
+    return point_count > RASTERIZE_POINTS if rasterize is None else bool(rasterize);
+
+#Draws the quality control overlay of a loaded cotyledon on ax: the cotyledon outline, every
+#sector and its virtual sector sector_range beyond it (dashed), and the stomata colored by
+#the region classifyPoints puts them in, with the count of each region in the legend.
+
+def drawOverlay(ax, cotyledon, sector_range, rasterize = None, title = None):
+    outline = np.asarray(cotyledon['outline'], dtype = np.float64);
+    stomata_points = np.asarray(cotyledon['stomata'], dtype = np.float64);
+    range_outlines = [SectorRange(sector_points, sector_range) for sector_points in cotyledon['sectors']];
+    labels, in_sector = classifyPoints(stomata_points, outline, cotyledon['sectors'], range_outlines);
+
+    closed = np.vstack([outline[:, :2], outline[:1, :2]]);
+    ax.plot(closed[:, 0], closed[:, 1], 'k-', linewidth = 1);
+    for i in range(0, len(cotyledon['sectors'])):
+        color = SECTOR_COLORS[i % len(SECTOR_COLORS)];
+        sector_points = np.asarray(cotyledon['sectors'][i], dtype = np.float64);
+        ax.plot(sector_points[:, 0], sector_points[:, 1], color = color, linewidth = 1.5, label = cotyledon['sector_names'][i].replace(' Outline', ''));
+        ax.plot(range_outlines[i][:, 0], range_outlines[i][:, 1], color = color, linewidth = 1, linestyle = '--');
+
+    #Line2D markers draw much faster than scatter for many points of one color
+
+    for k in range(0, len(REGION_NAMES)):
+        points = stomata_points[labels == k];
+        ax.plot(points[:, 0], points[:, 1], linestyle = 'none', marker = '.', markersize = 2, color = REGION_COLORS[k],
+                rasterized = rasterizeLayer(rasterize, len(points)), label = '%s (%d)' % (REGION_NAMES[k].replace('_', ' '), len(points)));
+
+    ax.set_aspect('equal');
+    ax.set_xlabel('x (microns)');
+    ax.set_ylabel('y (microns)');
+    ax.legend(loc = 'upper right', fontsize = 'small', markerscale = 4);
+    if title is not None:
+        ax.set_title(title);
+
+#Draws the overlay of one dataset file to path. settings holds sector_range, cache_dir and
+#rasterize. Runs in the worker processes of renderOverlays; returns path.
+
+def renderOverlay(file_name, title, path, settings):
+    cotyledon = cachedCotyledon(file_name, settings['cache_dir']);
+    figure = newFigure((8, 8));
+    drawOverlay(figure.add_subplot(), cotyledon, settings['sector_range'], settings['rasterize'], title);
+    saveFigure(figure, path, settings.get('dpi', FIGURE_DPI));
+    return path;
+
+#Draws the overlay of every dataset in directory (named by save) to out_dir, in a pool of
+#workers, skipping the figures whose workbook and settings did not change since they were
+#drawn. settings holds sector_range, cache_dir, rasterize, dpi and format (a file
+#extension such as 'pdf' or 'png'). Returns the number of figures drawn, the number
+#skipped, and the failures as (row of directory, save name, traceback text), both for
+#workbooks that cannot be read and for figures that failed in runCotyledons.
+
+def renderOverlays(directory, save, out_dir, settings, workers = 1):
+    os.makedirs(out_dir, exist_ok = True);
+    manifest = readManifest(out_dir);
+    task_list = [];
+    rows = [];
+    labels = [];
+    fingerprints = {};
+    failures = [];
+    for i in range(0, len(directory)):
+        figure_name = '%s overlay.%s' % (outputName(save[i]), settings['format']);
+        try:
+            workbook_hash = workbookHash(directory[i]);
+        except OSError:
+            failures.append((i, save[i], traceback.format_exc()));
+            print('Cotyledon %s failed and was skipped:\n%s' % (save[i], failures[-1][2]));
+            continue;
+        fingerprint = renderFingerprint('overlay', workbook_hash, float(settings['sector_range']),
+                                        settings['rasterize'], settings.get('dpi', FIGURE_DPI));
+        if figureCurrent(out_dir, manifest, figure_name, fingerprint):
+            continue;
+        task_list.append((directory[i], save[i], os.path.join(out_dir, figure_name), settings));
+        rows.append(i);
+        labels.append(save[i]);
+        fingerprints[figure_name] = fingerprint;
+
+    results, task_failures = runCotyledons(renderOverlay, task_list, workers, labels = labels);
+    for result in results:
+        if result is not None:
+            manifest[os.path.basename(result)] = fingerprints[os.path.basename(result)];
+    writeManifest(out_dir, manifest);
+    failures = sorted(failures + [(rows[k], label, error) for k, label, error in task_failures]);
+    return len(task_list) - len(task_failures), len(directory) - len(task_list) - len(failures) + len(task_failures), failures;
+
+#Calculates the correlation function of every group of a results file with its confidence
+#band, as in the correlation script: a bootstrap of replicates resamples (of whole
+#cotyledons if bootstrap_cotyledons), or the propagated error when replicates is 0.
+#Returns the distance bins and a list of (group, y, low, high).
+
+def correlationCurves(results, keys, replicates = 10000, seed = 0, bootstrap_cotyledons = False, workers = 1):
+    group_data = groupedCorrelation(results['stomata'], results['random'], keys);
+    curves = [];
+    for k in range(0, len(group_data['groups'])):
+        group = group_data['groups'][k];
+        y = group_data['y'][k];
+        if replicates > 0:
+            rows = np.flatnonzero(keys == group);
+            cotyledons = np.asarray(results['cotyledon'][rows]) if bootstrap_cotyledons else None;
+            low, high = bootstrapInterval(results['stomata'][rows], results['random'][rows], replicates, seed, cotyledons, workers = workers);
+        else:
+            low, high = y - group_data['err'][k], y + group_data['err'][k];
+        curves.append((str(group), y, low, high));
+    return np.asarray(results['bins'][0]), curves;
+
+#Draws correlation curves (group, y, low, high) on ax over the upper bin edges, with the
+#colors and limits of the correlation script. labels maps groups to legend labels.
+
+def drawCorrelation(ax, distance_bins, curves, labels = None, xlim = (0, 300)):
+    distance_fun = distance_bins[1:];
+    labels = {} if labels is None else labels;
+    for i in range(0, len(curves)):
+        group, y, low, high = curves[i];
+        ax.fill_between(distance_fun, high, low, color = FILL_COLORS[i % len(FILL_COLORS)], alpha = 0.75 if i == 0 else 0.5);
+        ax.plot(distance_fun, y, color = LINE_COLORS[i % len(LINE_COLORS)], linestyle = '--', marker = '.', label = labels.get(group, group));
+    ax.axhline(0, color = 'k', alpha = 0.75);
+    ax.legend(loc = 'lower right');
+    ax.set_title('Stomata-Sector Correlation with 95% Confidence Interval');
+    ax.set_xlabel('Distance (microns)');
+    ax.set_ylabel('Correlation');
+    ax.set_xlim(*xlim);
+    ax.set_ylim(-1.05, 1);
+
+#Draws one correlation plot to path. Runs in the worker processes of renderCorrelations.
+
+def renderCorrelationPlot(path, distance_bins, curves, labels, settings):
+    figure = newFigure();
+    drawCorrelation(figure.add_subplot(), distance_bins, curves, labels, tuple(settings['xlim']));
+    saveFigure(figure, path, settings.get('dpi', FIGURE_DPI));
+    return path;
+
+#Draws the correlation plots of a results file to out_dir: one of every group together
+#and one per group. Figures are redrawn only when the results file, the file list (for
+#group_by columns that are not in the results) or the settings changed, and the
+#correlation function and its bootstrap are only calculated when a figure is redrawn.
+#settings holds group_by, filelist, bootstrap_replicates, bootstrap_seed,
+#bootstrap_cotyledons, xlim, dpi and format. Returns drawn, skipped and failures as
+#renderOverlays does.
+
+def renderCorrelations(results_file, out_dir, settings, labels = None, workers = 1):
+    os.makedirs(out_dir, exist_ok = True);
+    manifest = readManifest(out_dir);
+    results = loadResults(results_file);
+    filelist_hash = workbookHash(settings['filelist']) if settings['group_by'] not in results.dtype.names else None;
+    fingerprint = renderFingerprint('correlation', workbookHash(results_file), filelist_hash, settings['group_by'],
+                                    settings['bootstrap_replicates'], settings['bootstrap_seed'], settings['bootstrap_cotyledons'],
+                                    list(settings['xlim']), labels, settings.get('dpi', FIGURE_DPI));
+    keys = groupKeys(results, settings['group_by'], settings['filelist']);
+    groups = sorted(set(str(key) for key in keys));
+    figure_names = ['Sector Correlation Plot.%s' % settings['format']] + ['Sector Correlation %s.%s' % (outputName(group), settings['format']) for group in groups];
+    if all([figureCurrent(out_dir, manifest, figure_name, fingerprint) for figure_name in figure_names]):
+        return 0, len(figure_names), [];
+
+    distance_bins, curves = correlationCurves(results, keys, settings['bootstrap_replicates'], settings['bootstrap_seed'],
+                                              settings['bootstrap_cotyledons'], workers);
+    curves = sorted(curves, key = lambda curve: curve[0]);
+    task_list = [(os.path.join(out_dir, figure_names[0]), distance_bins, curves, labels, settings)];
+    task_list += [(os.path.join(out_dir, figure_names[k + 1]), distance_bins, [curves[k]], labels, settings) for k in range(0, len(curves))];
+    results, failures = runCotyledons(renderCorrelationPlot, task_list, workers, labels = figure_names);
+    for result in results:
+        if result is not None:
+            manifest[os.path.basename(result)] = fingerprint;
+    writeManifest(out_dir, manifest);
+    return len(task_list) - len(failures), 0, failures;
+
+
+'''
+End of function definition section.
+'''
+
+
+'''
+Begin of procedural section.
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Draw the quality control overlays and correlation plots of the SPACE scripts without a display.');
+    subparsers = parser.add_subparsers(dest = 'command', required = True);
+    overlays = subparsers.add_parser('overlays', help = 'draw the overlay of every cotyledon of a file list');
+    overlays.add_argument('--filelist', default = 'filelist.csv', help = 'file list of datasets (default %(default)s)');
+    overlays.add_argument('--sector-range', type = float, default = 100.0, help = 'range of the virtual sectors in microns (default %(default)s)');
+    overlays.add_argument('--cache-dir', default = CACHE_DIR, help = 'parsed workbook cache (default %(default)s)');
+    overlays.add_argument('--rasterize', choices = ['auto', 'always', 'never'], default = 'auto',
+                          help = 'rasterize the stomata layers: auto above %d points (default %%(default)s)' % RASTERIZE_POINTS);
+    correlation = subparsers.add_parser('correlation', help = 'draw the correlation plots of a results file');
+    correlation.add_argument('results', help = 'sector results file of the histogram script or the pipeline (.npy)');
+    correlation.add_argument('--filelist', default = 'filelist.csv', help = 'file list, for group_by columns that are not in the results (default %(default)s)');
+    correlation.add_argument('--group-by', default = 'phenotype', help = 'column to group the sectors by (default %(default)s)');
+    correlation.add_argument('--bootstrap', type = int, default = 10000, help = 'bootstrap replicates per group, 0 for propagated error bands (default %(default)s)');
+    correlation.add_argument('--seed', type = int, default = 0, help = 'bootstrap seed (default %(default)s)');
+    correlation.add_argument('--cotyledons', action = 'store_true', help = 'resample whole cotyledons instead of sectors');
+    correlation.add_argument('--xlim', type = float, nargs = 2, default = [0, 300], help = 'distance axis limits in microns (default %(default)s)');
+    for subparser in (overlays, correlation):
+        subparser.add_argument('--out', default = 'figures', help = 'folder for the figures (default %(default)s)');
+        subparser.add_argument('--format', default = 'pdf', help = 'figure file format, for example pdf, png or svg (default %(default)s)');
+        subparser.add_argument('--dpi', type = int, default = FIGURE_DPI, help = 'resolution of rasterized layers (default %(default)s)');
+        subparser.add_argument('--workers', type = int, default = 1, help = 'worker processes, 0 for one per core (default %(default)s)');
+    args = parser.parse_args();
+
+    start_time = time.time();
+    workers = (os.cpu_count() or 1) if args.workers <= 0 else args.workers;
+    if args.command == 'overlays':
+        directory, save, phenotype = readFileList(args.filelist);
+        rasterize = {'auto': None, 'always': True, 'never': False}[args.rasterize];
+        settings = {'sector_range': args.sector_range, 'cache_dir': args.cache_dir, 'rasterize': rasterize, 'dpi': args.dpi, 'format': args.format};
+        drawn, skipped, failures = renderOverlays(directory, save, args.out, settings, workers);
+    else:
+        settings = {'group_by': args.group_by, 'filelist': args.filelist, 'bootstrap_replicates': args.bootstrap, 'bootstrap_seed': args.seed,
+                    'bootstrap_cotyledons': args.cotyledons, 'xlim': args.xlim, 'dpi': args.dpi, 'format': args.format};
+        drawn, skipped, failures = renderCorrelations(args.results, args.out, settings, workers = workers);
+
+    print('Drew %d figures, %d unchanged, in %s' % (drawn, skipped, args.out));
+    if failures:
+        print('%d figures failed: %s' % (len(failures), ', '.join(label for k, label, error in failures)));
+    print('--- %s seconds ---' % (time.time() - start_time));
+
+'''
+End of procedural section.
+'''
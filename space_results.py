@@ -0,0 +1,216 @@
+#Sector results store for the SPACE pipeline scripts.
+#The histograms of a run are saved as one NumPy structured array with one row per sector:
+#the cotyledon (row of the file list), its save name and phenotype, the sector number,
+#the sector area, the number of random distributions behind its random histogram, the
+#distance bin edges, and the stomata, random and ratio histograms.
+#The .npy file can be memory-mapped, so a script can select sectors by phenotype or area
+#and only read the rows it uses.
+#A run can also keep its raw distances in a distance store: the exact stomata distances of
+#every sector and a fine base histogram of its random distances. The rebin command turns a
+#store into a results file for any other distance bins without measuring distances again:
+#
+#    python space_results.py "sector distances filename.npz" --bins 15 2500 15 --out "sector results rebinned.npy"
+
+import os;
+import sys;
+import argparse;
+import numpy as np;
+from space_ingest import readFileTable, fileListColumn
+from space_histogram import binIndex, rebinBase
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Returns the structured dtype of a results row for histograms of bin_count bins, with
+#room for save names and phenotypes of the given lengths.
+
+def resultsDtype(bin_count, name_length = 1, phenotype_length = 1):
+    return np.dtype([
+        ('cotyledon', np.int32),
+        ('save', np.str_, max(1, name_length)),
+        ('phenotype', np.str_, max(1, phenotype_length)),
+        ('sector', np.int32),
+        ('area', np.float64),
+        ('trials', np.int32),
+        ('bins', np.float64, (bin_count + 1,)),
+        ('stomata', np.float64, (bin_count,)),
+        ('random', np.float64, (bin_count,)),
+        ('ratio', np.float64, (bin_count,)),
+    ]);
+
+#Builds the results array of a run. cotyledon_results is a list of (cotyledon number,
+#save name, phenotype, histogram result) tuples, where a histogram result is the dictionary
+#of histogramCotyledon (with 'sectors', 'areas', 'stomata', 'random' and 'ratio' lists, and
+#optionally 'trials'; without it the trials are stored as 0).
+
+def sectorResults(cotyledon_results, distance_bins):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    rows = [];
+    for cotyledon, save, phenotype, result in cotyledon_results:
+        for k in range(0, len(result['areas'])):
+            trials = result['trials'][k] if 'trials' in result else 0;
+            rows.append((cotyledon, save, phenotype, result['sectors'][k], result['areas'][k], trials,
+                         result['stomata'][k], result['random'][k], result['ratio'][k]));
+
+    name_length = max([len(row[1]) for row in rows] + [1]);
+    phenotype_length = max([len(row[2]) for row in rows] + [1]);
+    results = np.zeros(len(rows), dtype = resultsDtype(len(distance_bins) - 1, name_length, phenotype_length));
+    for k in range(0, len(rows)):
+        cotyledon, save, phenotype, sector, area, trials, stomata, random, ratio = rows[k];
+        results[k] = (cotyledon, save, phenotype, sector, area, trials, distance_bins, stomata, random, ratio);
+    return results;
+
+#Saves a results array under a temporary name and renames it, so a reader never memory-maps
+#a half-written file.
+
+def saveResults(file_name, results):
+    temporary = '%s.%d.tmp' % (file_name, os.getpid());
+    with open(temporary, 'wb') as f:
+        np.save(f, results);
+    os.replace(temporary, file_name);
+
+#Opens a results file memory-mapped (read-only). Nothing is read until rows are used.
+
+def loadResults(file_name):
+    return np.load(file_name, mmap_mode = 'r');
+
+#Returns the rows of results that match: phenotype (one name or a list of names),
+#min_area <= area <= max_area, and cotyledon (one number or a list). Only the columns
+#tested and the selected rows are read from a memory-mapped file.
+
+def selectSectors(results, phenotype = None, min_area = None, max_area = None, cotyledon = None):
+    keep = np.ones(len(results), dtype = bool);
+    if phenotype is not None:
+        keep &= np.isin(results['phenotype'], np.atleast_1d(phenotype));
+    if min_area is not None:
+        keep &= results['area'] >= min_area;
+    if max_area is not None:
+        keep &= results['area'] <= max_area;
+    if cotyledon is not None:
+        keep &= np.isin(results['cotyledon'], np.atleast_1d(cotyledon));
+    return results[np.flatnonzero(keep)];
+
+#Returns the group key of every row of results for the column group_by: a column of the
+#results ('phenotype', 'save', 'cotyledon' or 'sector'), or else a column of the file list
+#by its header, looked up through the cotyledon (row of the file list) of each sector.
+
+def groupKeys(results, group_by = 'phenotype', filelist = 'filelist.csv'):
+    if group_by in results.dtype.names:
+        return np.asarray(results[group_by]);
+    table = readFileTable(filelist);
+    column = fileListColumn(table, group_by);
+    if column is None:
+        raise KeyError('No column %r in the results or in %s (columns: %s)' % (group_by, filelist, ', '.join(list(results.dtype.names[:4]) + list(table.keys()))));
+    return np.asarray(column)[np.asarray(results['cotyledon'])];
+
+#Saves the raw distances of a run as a compressed .npz distance store, with the sectors in
+#the same order as sectorResults. cotyledon_results is as for sectorResults, with histogram
+#results computed with base_bin_width set ('stomata_distances', 'random_base' and
+#'base_width'). The store holds the cotyledon, save name, phenotype, sector, area and trials
+#of every sector, its stomata distances (joined, with offsets), its random base histogram
+#(rows zero padded to the longest), the base bin width and the bins of the run.
+
+def saveDistanceStore(file_name, cotyledon_results, distance_bins):
+    columns = dict([(key, []) for key in ('cotyledon', 'save', 'phenotype', 'sector', 'area', 'trials', 'stomata', 'base')]);
+    base_width = None;
+    for cotyledon, save, phenotype, result in cotyledon_results:
+        if 'random_base' not in result:
+            raise ValueError('No raw distances for %s; set base_bin_width to keep them' % save);
+        base_width = result['base_width'];
+        for k in range(0, len(result['areas'])):
+            for key, value in (('cotyledon', cotyledon), ('save', save), ('phenotype', phenotype), ('sector', result['sectors'][k]),
+                               ('area', result['areas'][k]), ('trials', result['trials'][k]), ('stomata', result['stomata_distances'][k]),
+                               ('base', result['random_base'][k])):
+                columns[key].append(value);
+
+    base = np.zeros((len(columns['base']), max([len(row) for row in columns['base']] + [0])), dtype = np.float64);
+    for k in range(0, len(base)):
+        base[k, :len(columns['base'][k])] = columns['base'][k];
+    temporary = '%s.%d.tmp.npz' % (file_name, os.getpid());
+    np.savez_compressed(temporary,
+                        cotyledon = np.asarray(columns['cotyledon'], dtype = np.int32),
+                        save = np.asarray(columns['save'], dtype = np.str_),
+                        phenotype = np.asarray(columns['phenotype'], dtype = np.str_),
+                        sector = np.asarray(columns['sector'], dtype = np.int32),
+                        area = np.asarray(columns['area'], dtype = np.float64),
+                        trials = np.asarray(columns['trials'], dtype = np.int32),
+                        stomata_distances = np.concatenate([np.asarray(row, dtype = np.float64) for row in columns['stomata']] + [np.zeros(0)]),
+                        stomata_offsets = np.cumsum([0] + [len(row) for row in columns['stomata']]),
+                        random_base = base,
+                        base_width = np.float64(base_width if base_width is not None else 0),
+                        bins = np.asarray(distance_bins, dtype = np.float64));
+    os.replace(temporary, file_name);
+
+#Opens a distance store and returns it as a dictionary of arrays.
+
+def loadDistanceStore(file_name):
+    with np.load(file_name) as store:
+        return dict([(key, store[key]) for key in store.files]);
+
+#Builds the results array of sectorResults for new distance bins from a distance store.
+#The stomata histograms are exact; the random histograms are rebinned from the base
+#histograms (exact for edges on multiples of the base bin width, see rebinBase). All
+#sectors of the cohort are binned together, in a few array operations.
+
+def rebinResults(store, distance_bins):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    bin_count = len(distance_bins) - 1;
+    rows = len(store['sector']);
+
+    lengths = np.diff(store['stomata_offsets']);
+    index = binIndex(store['stomata_distances'], distance_bins);
+    owner = np.repeat(np.arange(rows), lengths);
+    stomata = np.bincount(owner[index >= 0]*bin_count + index[index >= 0], minlength = rows*bin_count).reshape(rows, bin_count).astype(np.float64);
+    random = rebinBase(store['random_base'], float(store['base_width']), distance_bins).reshape(rows, bin_count);
+
+    #ratioHistograms divides the stomata and random histograms of a cotyledon by its number
+    #of sectors alike, so the ratio of a sector only depends on its own histograms.
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        ratio = stomata/random - 1;
+
+    results = np.zeros(rows, dtype = resultsDtype(bin_count, store['save'].dtype.itemsize//4, store['phenotype'].dtype.itemsize//4));
+    for key in ('cotyledon', 'save', 'phenotype', 'sector', 'area', 'trials'):
+        results[key] = store[key];
+    results['bins'] = distance_bins;
+    results['stomata'] = stomata;
+    results['random'] = random;
+    results['ratio'] = ratio;
+    return results;
+
+#Returns the 3xNxn Sector_Data array of the histogram script (stomata, random and ratio
+#histograms of N sectors) for a set of results rows.
+
+def sectorData(results):
+    return np.stack([results['stomata'], results['random'], results['ratio']]);
+
+
+'''
+End of function definition section.
+'''
+
+
+'''
+Begin of procedural section.
+'''
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Rebin the histograms of a distance store into a results file.');
+    parser.add_argument('store', help = 'distance store (.npz) saved by the histogram script');
+    parser.add_argument('--bins', type = float, nargs = 3, metavar = ('FIRST', 'LAST', 'COUNT'),
+                        help = 'logarithmic distance bins from FIRST to LAST microns with COUNT edges, plus a bin from 0');
+    parser.add_argument('--edges', type = float, nargs = '+', help = 'distance bin edges in microns, in increasing order');
+    parser.add_argument('--out', default = 'sector results rebinned.npy', help = 'results file to write (default %(default)s)');
+    args = parser.parse_args();
+
+    if (args.bins is None) == (args.edges is None):
+        sys.exit('Give the new bins with either --bins or --edges');
+    if args.bins is not None:
+        distance_bins = np.insert(np.logspace(np.log10(args.bins[0]), np.log10(args.bins[1]), int(args.bins[2])), 0, 0);
+    else:
+        distance_bins = np.asarray(args.edges, dtype = np.float64);
+
+    store = loadDistanceStore(args.store);
+    saveResults(args.out, rebinResults(store, distance_bins));
+    print('Rebinned %d sectors into %d bins: %s' % (len(store['sector']), len(distance_bins) - 1, args.out));
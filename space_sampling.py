@@ -0,0 +1,180 @@
+#Random point sampling for the null model of the SPACE pipeline scripts.
+#All random point distributions of a cotyledon are drawn at once as one stacked
+#(Ntrials, N, 2) array from a seeded numpy.random.Generator.
+#Besides plain uniform sampling, distributions can be drawn from scrambled Sobol or Halton
+#sequences (scipy.stats.qmc, needs scipy) or from a jittered grid. These spread the points of
+#each distribution more evenly than independent draws, so the random histograms vary less
+#from one distribution to the next and fewer distributions reach the same precision.
+
+import math;
+import warnings;
+import numpy as np;
+import shapely.geometry as shg;
+from space_geometry import pointsInPolygon
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#Largest number of candidate points drawn and tested in one round of sampling.
+
+SAMPLE_CHUNK = 2**20;
+
+#Null samplers of generateRandomSets: independent uniform points, scrambled Sobol or Halton
+#sequences, or one uniformly jittered point in every cell of a grid ('stratified').
+
+SAMPLERS = ('uniform', 'sobol', 'halton', 'stratified');
+
+#Coordinate types of the random points. float32 halves their memory; a coordinate x is then
+#stored to within |x|*2^-24 (under 0.001 microns for coordinates below 10^4 microns), and
+#distances are still computed in float64.
+
+COORDINATE_TYPES = {'float64': np.float64, 'float32': np.float32};
+
+#Memory (bytes) set aside under a memory limit for measuring and binning a chunk of random
+#points, which works on a bounded number of points at a time (see space_histogram.py).
+
+MEASURE_MEMORY = 2**28;
+
+#Returns the SeedSequence of the cotyledon in row index of the file list. Streams are
+#derived from the run seed and the row index alone, so a cotyledon gets the same random
+#points whether it is processed alone, in order, or in a separate worker process.
+#A seed of None draws fresh entropy from the operating system.
+
+def cotyledonSeedSequence(seed, index):
+    if seed is None:
+        return np.random.SeedSequence().spawn(1)[0];
+    return np.random.SeedSequence(seed, spawn_key = (index,));
+
+#Generates Ntrials random point distributions of number_of_points points each, uniformly
+#distributed inside the cotyledon outline, and returns them as an (Ntrials, N, 2) array.
+#Candidates are drawn from the bounding box of the outline and the rejected ones are
+#topped up in further rounds, sized from the acceptance rate seen so far, until every
+#distribution has exactly number_of_points points. rng is a numpy.random.Generator.
+#sampler is one of SAMPLERS; the others are drawn by stratifiedRandomSets. dtype is the
+#type of the returned coordinates (float64, or float32 to halve the memory).
+
+def generateRandomSets(cotyledon_points, number_of_points, Ntrials, rng, chunk_size = SAMPLE_CHUNK, sampler = 'uniform', dtype = np.float64):
+    if sampler not in SAMPLERS:
+        raise ValueError('Unknown null sampler %r, use one of %s' % (sampler, ', '.join(SAMPLERS)));
+    if sampler != 'uniform':
+        return stratifiedRandomSets(cotyledon_points, number_of_points, Ntrials, rng, sampler, chunk_size, dtype);
+    cotyledon_points = np.asarray(cotyledon_points, dtype = np.float64)[:, :2];
+    lower = cotyledon_points.min(axis = 0);
+    upper = cotyledon_points.max(axis = 0);
+
+    needed = number_of_points*Ntrials;
+    random_points = np.empty((needed, 2), dtype = dtype);
+    filled = 0;
+    drawn = 0;
+    accepted = 0;
+    while filled < needed:
+
+        #Expected acceptance is the area ratio; start from 1/2 until rounds have been seen
+
+        acceptance = accepted/float(drawn) if accepted > 0 else 0.5;
+        batch = int(min(chunk_size, max(64, 1.1*(needed - filled)/acceptance)));
+        candidates = rng.uniform(lower, upper, size = (batch, 2));
+        inside = candidates[pointsInPolygon(cotyledon_points, candidates)];
+
+        take = min(len(inside), needed - filled);
+        random_points[filled:filled + take] = inside[:take];
+        filled += take;
+        drawn += batch;
+        accepted += len(inside);
+
+        if drawn >= 1000*chunk_size and accepted == 0:
+            raise ValueError('No random points fall inside the cotyledon outline');
+
+    return random_points.reshape(Ntrials, number_of_points, 2);
+
+#Returns how many random distributions of point_count points to draw and measure at once to
+#stay within memory_limit bytes: the coordinates of the chunk (of the given dtype) get what
+#is left after MEASURE_MEMORY. At least one distribution, and at most Ntrials.
+
+def randomChunkTrials(point_count, Ntrials, memory_limit, dtype = np.float64):
+    budget = max(0, int(memory_limit) - MEASURE_MEMORY);
+    return int(max(1, min(Ntrials, budget // max(1, 2*np.dtype(dtype).itemsize*point_count))));
+
+#Draws Ntrials random distributions like generateRandomSets, but trials_per_chunk at a
+#time, yielding each (trials, N, 2) chunk in turn, so only one chunk is held in memory.
+#The chunks come from the same rng one after another, so a run is reproducible for a given
+#chunk size (though not the same points as drawing all trials at once).
+
+def randomSetChunks(cotyledon_points, number_of_points, Ntrials, rng, trials_per_chunk, sampler = 'uniform', dtype = np.float64):
+    for k in range(0, Ntrials, trials_per_chunk):
+        yield generateRandomSets(cotyledon_points, number_of_points, min(trials_per_chunk, Ntrials - k), rng, sampler = sampler, dtype = dtype);
+
+#Returns the points of trials evenly spread point sets of (about) count points each in the
+#unit square as a (trials, n, 2) array: each set is its own scrambled Sobol or Halton
+#sequence, or a grid of columns x rows cells with one uniform point in each cell.
+
+def _unitSets(sampler, trials, count, rng, columns = 1, rows = 1):
+    if sampler == 'stratified':
+        cells = np.stack(np.meshgrid(np.arange(columns), np.arange(rows)), axis = -1).reshape(-1, 2);
+        return (cells + rng.random((trials, len(cells), 2)))/np.asarray([columns, rows], dtype = np.float64);
+
+    from scipy.stats import qmc
+    engine = qmc.Sobol if sampler == 'sobol' else qmc.Halton;
+    sets = np.empty((trials, count, 2), dtype = np.float64);
+
+    #Sobol sets are balanced at powers of 2, but the first count points of a scrambled
+    #sequence are still far more even than independent draws, so the warning is silenced.
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning);
+        for k in range(0, trials):
+            try:
+                sets[k] = engine(2, scramble = True, rng = rng).random(count);
+            except TypeError: #scipy before 1.15 names the generator seed
+                sets[k] = engine(2, scramble = True, seed = rng).random(count);
+    return sets;
+
+#Draws Ntrials distributions of number_of_points points inside the cotyledon outline like
+#generateRandomSets, but each distribution comes from an evenly spread point set over the
+#bounding box of the outline (sampler 'sobol', 'halton' or 'stratified'). The set is sized
+#so that slightly more than number_of_points of its points fall inside the outline, and
+#number_of_points of those are kept at random. A set that falls short is drawn again,
+#larger. Every point is still uniformly distributed in the cotyledon; only the points of a
+#distribution are no longer independent of each other.
+
+def stratifiedRandomSets(cotyledon_points, number_of_points, Ntrials, rng, sampler, chunk_size = SAMPLE_CHUNK, dtype = np.float64):
+    cotyledon_points = np.asarray(cotyledon_points, dtype = np.float64)[:, :2];
+    lower = cotyledon_points.min(axis = 0);
+    upper = cotyledon_points.max(axis = 0);
+    width, height = np.maximum(upper - lower, 1e-12);
+    acceptance = shg.Polygon(cotyledon_points).area/(width*height);
+    if acceptance <= 0:
+        raise ValueError('No random points fall inside the cotyledon outline');
+
+    random_points = np.empty((Ntrials, number_of_points, 2), dtype = dtype);
+    pending = np.arange(Ntrials);
+    margin = 2*math.sqrt(number_of_points) + 8;
+    while len(pending) > 0:
+        count = int(math.ceil((number_of_points + margin)/acceptance));
+        columns = max(1, int(round(math.sqrt(count*width/height))));
+        rows = int(math.ceil(count/float(columns)));
+        set_size = columns*rows if sampler == 'stratified' else count;
+        trials_per_chunk = max(1, chunk_size // set_size);
+        short = [];
+        for k in range(0, len(pending), trials_per_chunk):
+            trials = pending[k:k + trials_per_chunk];
+            candidates = lower + _unitSets(sampler, len(trials), count, rng, columns, rows)*(upper - lower);
+            inside = pointsInPolygon(cotyledon_points, candidates.reshape(-1, 2)).reshape(len(trials), set_size);
+
+            #Keep number_of_points of the points inside, at random: the smallest random keys
+            #among them (points outside get keys above every point inside)
+
+            keys = rng.random(inside.shape) + 2*(~inside);
+            keep = np.argpartition(keys, number_of_points - 1, axis = 1)[:, :number_of_points] if number_of_points > 0 else np.zeros((len(trials), 0), dtype = np.intp);
+            complete = inside.sum(axis = 1) >= number_of_points;
+            random_points[trials[complete]] = np.take_along_axis(candidates, keep[:, :, None], axis = 1)[complete];
+            short.append(trials[~complete]);
+        pending = np.concatenate(short);
+        margin = 2*margin + 0.25*number_of_points;
+    return random_points;
+
+
+'''
+End of function definition section.
+'''
@@ -0,0 +1,203 @@
+#Synthetic point distributions and cotyledons for the SPACE pipeline scripts.
+#The sample distributions of Sample Distribution Generator.py, and synthetic cotyledons
+#built from them that can be written as workbooks in the dataset format, for benchmarks
+#and tests of the analysis scripts.
+#Also draws stomata patterns of known intensity around any sector shapes (clustered,
+#inhibitory, complete spatial randomness, or a gradient over the cotyledon) from a raster
+#of the intensity, millions of points per second, with the exact correlation function they
+#should give, for calibrating the correlation estimator (see space_calibration.py).
+
+import math;
+import numpy as np;
+import openpyxl;
+from space_ingest import STOMATA_SHEET, COTYLEDON_SHEET
+from space_geometry import pointsInPolygon
+from space_raster import rasterGrid, rasterizeOutline, signedDistanceMap
+
+'''
+Begin section for defining necessary functions.
+'''
+
+#All probability distributions and sector boundaries are radial distributions, but
+#it is necessary to export them in x-y coordinates.
+
+#Creates a Point Distrubtion along the circumference of a circle
+#to serve as a Sector, where r is the radius and n is the number of points to create.
+#Returns the radial coordinates in x-y form in a nx2 array.
+
+def PointsInCircum(r,n):
+    return np.asarray([(math.cos(2*math.pi/n*x)*r,math.sin(2*math.pi/n*x)*r) for x in range(0,n)])
+
+#Creates a radial point distrubtion that is positively correlated at closer ranges,
+#and linearly decreases in a triangular probability distribution.
+#Points are randomly generated from this probability distribution, rather than uniformly along the range.
+#R1 is the radius at which the probability distribution begins, R2 is the length of the distribution,
+#and n is the number of points to generate from this probability distribution.
+#The probability distribution is radial, but x and y coordinates are returned.
+#All n points are drawn at once from rng (a numpy.random.Generator, or the numpy.random
+#module by default, so np.random.seed still seeds them).
+#Returns the radial coordinates in x-y form in a nx2 array.
+
+def PositivePoints(radius1,radius2,n,rng = np.random):
+    theta = rng.uniform(0,2*math.pi,n);
+    radius = radius1 + rng.triangular(0,0,radius2,n) if radius2 > 0 else np.full(n, float(radius1));
+    return np.stack([np.cos(theta)*radius,np.sin(theta)*radius], axis = 1).reshape(-1, 2);
+
+#Create a uniform random distribution that should have zero correlation.
+#R1 is the lower endpoint and R2 is the length of the distribution.
+#N is the number of random points to generate based off this probability distribution.
+#All n points are drawn at once from rng, as in PositivePoints.
+#Returns the radial coordinates in x-y form in a nx2 array.
+
+def ZeroCorrPoints(radius1,radius2,n,rng = np.random):
+    theta = rng.uniform(0,2*math.pi,n);
+    radius = radius1 + rng.uniform(0,radius2,n);
+    return np.stack([np.cos(theta)*radius,np.sin(theta)*radius], axis = 1).reshape(-1, 2);
+
+#Builds a synthetic cotyledon in the layout of loadCotyledon: a circular cotyledon outline
+#of the given radius, sector_count circular sectors spread over it, and stomata_count
+#stomata, half of them clustered around the sectors (PositivePoints) and half spread over
+#the cotyledon (ZeroCorrPoints). Outlines have vertex_count points each.
+#seed seeds numpy.random, so the same arguments give the same cotyledon.
+
+def syntheticCotyledon(stomata_count, sector_count, vertex_count, radius = 2000.0, seed = 0):
+    np.random.seed(seed);
+    center = np.asarray([radius, radius]);
+    outline = PointsInCircum(radius, vertex_count) + center;
+
+    #Sectors sit on a ring of rings inside the cotyledon, far enough apart not to overlap
+
+    sector_radius = min(150.0, 0.8*radius/(2*math.sqrt(sector_count) + 1));
+    sectors = [];
+    sector_centers = [];
+    ring = 0;
+    while len(sectors) < sector_count:
+        ring_radius = ring*2.5*sector_radius;
+        places = 1 if ring == 0 else int(2*math.pi*ring_radius/(2.5*sector_radius));
+        for k in range(0, min(places, sector_count - len(sectors))):
+            angle = 2*math.pi*k/places;
+            sector_centers.append(center + ring_radius*np.asarray([math.cos(angle), math.sin(angle)]));
+            sectors.append(PointsInCircum(sector_radius, vertex_count) + sector_centers[-1]);
+        ring += 1;
+
+    clustered = stomata_count // 2;
+    stomata = [ZeroCorrPoints(0, 0.95*radius, stomata_count - clustered) + center];
+    for k in range(0, sector_count):
+        count = clustered // sector_count + (1 if k < clustered % sector_count else 0);
+        stomata.append(PositivePoints(sector_radius, 0.3*radius, count) + sector_centers[k]);
+    stomata = np.concatenate(stomata);
+
+    names = ['Sector %d Outline' % (k + 1) for k in range(0, sector_count)];
+    return {
+        'stomata': stomata,
+        'outline': outline,
+        'sector_names': names,
+        'sectors': sectors,
+        'sector_areas': np.asarray([0.5*vertex_count*sector_radius**2*math.sin(2*math.pi/vertex_count)]*sector_count),
+    };
+
+#Patterns of patternSampler. The intensity (stomata per area, relative to the cotyledon
+#as a whole) at distance d from the nearest sector is 1 + strength*exp(-d/scale) for
+#'clustered' and 1 - strength*exp(-d/scale) for 'inhibitory' (strength at most 1), with d = 0
+#inside a sector. 'csr' is uniform, and 'gradient' is an inhomogeneous pattern that ignores
+#the sectors: 1 + strength*x across the width of the cotyledon (x from 0 to 1).
+
+PATTERNS = ('csr', 'clustered', 'inhibitory', 'gradient');
+
+#Pixel size (microns) of the intensity raster of patternSampler.
+
+PATTERN_RESOLUTION = 4.0;
+
+#Prepares the drawing of a pattern inside a cotyledon outline around the sectors in
+#sector_list: rasterizes the outline, computes the intensity of every pixel inside it, and
+#returns a dictionary with the grid, the inside pixels and their cumulative intensity, the
+#intensity image and the signed distance map of every sector (needs scipy).
+
+def patternSampler(cotyledon_points, sector_list, pattern = 'csr', strength = 1.0, scale = 100.0, resolution = PATTERN_RESOLUTION):
+    if pattern not in PATTERNS:
+        raise ValueError('Unknown pattern %r, use one of %s' % (pattern, ', '.join(PATTERNS)));
+    if pattern == 'inhibitory' and not 0 <= strength <= 1:
+        raise ValueError('An inhibitory pattern needs 0 <= strength <= 1');
+    cotyledon_points = np.asarray(cotyledon_points, dtype = np.float64)[:, :2];
+    grid = rasterGrid([cotyledon_points] + list(sector_list), resolution);
+    mask = rasterizeOutline(cotyledon_points, grid);
+    distance_maps = [signedDistanceMap(sector_points, grid) for sector_points in sector_list];
+
+    if pattern == 'gradient':
+        columns = grid['shape'][1];
+        x = np.broadcast_to(np.arange(columns)[None, :]/float(max(1, columns - 1)), grid['shape']);
+        intensity = 1 + strength*x;
+    elif pattern == 'csr' or not distance_maps:
+        intensity = np.ones(grid['shape']);
+    else:
+        nearest = np.maximum(np.min(distance_maps, axis = 0), 0);
+        sign = 1 if pattern == 'clustered' else -1;
+        intensity = 1 + sign*strength*np.exp(-nearest/scale);
+    intensity = np.where(mask, intensity, 0.0);
+
+    pixels = np.flatnonzero(intensity);
+    cumulative = np.cumsum(intensity.ravel()[pixels]);
+    return {'outline': cotyledon_points, 'grid': grid, 'pixels': pixels, 'cumulative': cumulative/cumulative[-1],
+            'intensity': intensity, 'distance_maps': distance_maps, 'pattern': pattern};
+
+#Draws trials patterns of point_count points from a patternSampler as a (trials, N, 2)
+#array: a pixel is picked for every point in proportion to its intensity, and the point is
+#placed uniformly inside the pixel. Points of edge pixels that land outside the outline are
+#drawn again, so every point is inside the cotyledon. rng is a numpy.random.Generator.
+
+def drawPattern(sampler, point_count, trials, rng):
+    grid = sampler['grid'];
+    columns = grid['shape'][1];
+    needed = point_count*trials;
+    points = np.empty((needed, 2), dtype = np.float64);
+    filled = 0;
+    while filled < needed:
+        count = needed - filled;
+        pixel = sampler['pixels'][np.minimum(np.searchsorted(sampler['cumulative'], rng.random(count), side = 'right'), len(sampler['pixels']) - 1)];
+        candidates = grid['origin'] + (np.stack([pixel % columns, pixel // columns], axis = 1) + rng.random((count, 2)))*grid['resolution'];
+        inside = candidates[pointsInPolygon(sampler['outline'], candidates)];
+        points[filled:filled + len(inside)] = inside;
+        filled += len(inside);
+    return points.reshape(trials, point_count, 2);
+
+#Returns the correlation function that a pattern gives in expectation for the distance bins,
+#pooled over the sectors as the correlation script pools the sectors of a group: the share
+#of the intensity at each distance from a sector over the share of the area, minus one.
+#Distances are taken from the distance maps, so bin edges are resolved to about a pixel.
+
+def expectedCorrelation(sampler, distance_bins):
+    distance_bins = np.asarray(distance_bins, dtype = np.float64);
+    bin_count = len(distance_bins) - 1;
+    weight = np.zeros(bin_count);
+    area = np.zeros(bin_count);
+    inside = sampler['intensity'] > 0;
+    for distance_map in sampler['distance_maps']:
+        distance = distance_map[inside];
+        counted = distance > 0;
+        index = np.searchsorted(distance_bins, distance[counted], side = 'right') - 1;
+        index[distance[counted] == distance_bins[-1]] = bin_count - 1;
+        valid = (index >= 0) & (index < bin_count);
+        weight += np.bincount(index[valid], sampler['intensity'][inside][counted][valid], minlength = bin_count);
+        area += np.bincount(index[valid], minlength = bin_count);
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        return (weight/np.sum(weight))/(area/np.sum(area)) - 1;
+
+#Writes a cotyledon to an .xlsx workbook in the dataset format (see Cotyledon Dataset
+#Format.xlsx): a blank row and a header row, then the X and Y coordinates from the third row.
+
+def writeCotyledonWorkbook(file_name, cotyledon):
+    workbook = openpyxl.Workbook(write_only = True);
+    sheets = [(STOMATA_SHEET, cotyledon['stomata']), (COTYLEDON_SHEET, cotyledon['outline'])];
+    sheets += list(zip(cotyledon['sector_names'], cotyledon['sectors']));
+    for name, points in sheets:
+        sheet = workbook.create_sheet(name);
+        sheet.append([]);
+        sheet.append(['X', 'Y']);
+        for x, y in np.asarray(points, dtype = np.float64).tolist():
+            sheet.append([x, y]);
+    workbook.save(file_name);
+
+
+'''
+End of function definition section.
+'''
@@ -0,0 +1,76 @@
+#Behavior checks of space_geometry.py against shapely.
+#Run with python -m pytest test_space_geometry.py.
+
+import numpy as np;
+import shapely.geometry as shg;
+from space_geometry import outlineEdges, signedSectorDistance, expectedSectorHistogram, pointsInPolygon
+from space_sampling import generateRandomSets
+from space_histogram import randomSectorHistogram
+
+#A concave star of 2*tips vertices around center, so the outline has pockets that the
+#grid candidates of signedSectorDistance must get right.
+
+def starOutline(tips = 30, center = (500.0, 400.0), radii = (80.0, 200.0)):
+    angles = np.linspace(0, 2*np.pi, 2*tips, endpoint = False);
+    radius = np.where(np.arange(2*tips) % 2 == 0, radii[1], radii[0]);
+    return np.stack([center[0] + radius*np.cos(angles), center[1] + radius*np.sin(angles)], axis = 1);
+
+#Signed distance of every point from shapely, one call per point: negative inside.
+
+def shapelySignedDistance(outline, points):
+    polygon = shg.Polygon(outline);
+    distances = np.array([polygon.exterior.distance(shg.Point(point)) for point in points]);
+    inside = np.array([polygon.contains(shg.Point(point)) for point in points]);
+    return np.where(inside, -distances, distances);
+
+#Both the direct path (few pairs) and the grid path (forced with a small chunk_pairs)
+#must match shapely on points inside, around and far from the outline, for the star and
+#for a round sector of 80 vertices, where far cells keep a single candidate segment.
+
+def test_signedSectorDistance_matches_shapely():
+    points = np.random.default_rng(0).uniform(-500, 1500, (20000, 2));
+    for outline in (starOutline(), starOutline(40, radii = (150.0, 150.0))):
+        expected = shapelySignedDistance(outline, points);
+        for chunk_pairs in (2**20, 2**10):
+            distances = signedSectorDistance(points, *outlineEdges(outline), chunk_pairs = chunk_pairs);
+            assert distances.shape == (20000,);
+            assert np.allclose(distances, expected, rtol = 0, atol = 1e-9);
+
+#A stacked (Ntrials, n, 2) array gives the same distances as each trial on its own, with
+#the trial axis kept. The stack is large enough for a fine grid, while each trial alone
+#is measured against every segment; a clockwise outline gives the same result.
+
+def test_signedSectorDistance_stacked():
+    outline = starOutline(40, radii = (150.0, 150.0));
+    points = np.random.default_rng(1).uniform(-1500, 2500, (40, 5000, 2));
+    edges = outlineEdges(outline);
+    distances = signedSectorDistance(points, *edges);
+    assert distances.shape == (40, 5000);
+    for trial in range(0, len(points)):
+        assert np.allclose(distances[trial], signedSectorDistance(points[trial], *edges), rtol = 0, atol = 1e-9);
+    assert np.allclose(distances[0], shapelySignedDistance(outline, points[0]), rtol = 0, atol = 1e-9);
+    assert np.allclose(signedSectorDistance(points, *outlineEdges(outline[::-1])), distances, rtol = 0, atol = 1e-9);
+
+#pointsInPolygon agrees with shapely on single and stacked point arrays, for the concave
+#star and its clockwise copy.
+
+def test_pointsInPolygon_matches_shapely():
+    outline = starOutline();
+    polygon = shg.Polygon(outline);
+    points = np.random.default_rng(2).uniform(200, 800, (4, 1500, 2));
+    expected = np.array([[polygon.contains(shg.Point(point)) for point in trial] for trial in points]);
+    assert np.array_equal(pointsInPolygon(outline, points[0]), expected[0]);
+    assert np.array_equal(pointsInPolygon(outline, points).reshape(4, 1500), expected);
+    assert np.array_equal(pointsInPolygon(outline[::-1], points).reshape(4, 1500), expected);
+
+#The exact CSR histogram agrees with the pooled histogram of seeded uniform random
+#distributions within the Monte Carlo noise of each bin (Poisson, 4 standard deviations).
+
+def test_expectedSectorHistogram_matches_monte_carlo():
+    cotyledon = starOutline(100, radii = (1000.0, 1000.0));
+    sector = starOutline(8, center = (800.0, 400.0), radii = (60.0, 120.0));
+    distance_bins = np.array([0, 25, 50, 100, 200, 400, 800, 1600], dtype = np.float64);
+    random_sets = generateRandomSets(cotyledon, 500, 400, np.random.default_rng(0));
+    counts = randomSectorHistogram(random_sets, sector, distance_bins);
+    expected = 400*expectedSectorHistogram(cotyledon, sector, distance_bins, 500);
+    assert np.all(np.abs(counts - expected) < 4*np.sqrt(expected));
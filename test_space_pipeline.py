@@ -0,0 +1,24 @@
+#Regression checks for the stage output bookkeeping of space_pipeline.py.
+#Run with python -m pytest test_space_pipeline.py.
+
+import os;
+from space_pipeline import removeStale, stageFingerprint, stagePath
+
+#Cleaning the stale outputs of one save name must not touch the outputs (or the temporary
+#files) of a save name that extends it after a dot.
+
+def test_removeStale_prefix_names(tmp_path):
+    os.makedirs(tmp_path/'distances');
+    current = stageFingerprint('distances', 'current');
+    stale = stageFingerprint('distances', 'stale');
+    other = stageFingerprint('distances', 'other');
+    kept = [stagePath(str(tmp_path), 'distances', 'leaf', current), stagePath(str(tmp_path), 'distances', 'leaf.2', other),
+            stagePath(str(tmp_path), 'distances', 'leaf.2', other, '.random0.npy') + '.%d.tmp' % (os.getpid() + 1),
+            stagePath(str(tmp_path), 'distances', 'leaf', stale, '.random0.npy') + '.%d.tmp' % (os.getpid() + 1)];
+    removed = [stagePath(str(tmp_path), 'distances', 'leaf', stale), stagePath(str(tmp_path), 'distances', 'leaf', stale, '.random0.npy')];
+    for path in kept + removed:
+        open(path, 'w').close();
+
+    removeStale(str(tmp_path), 'distances', 'leaf', current);
+    assert all([os.path.exists(path) for path in kept]);
+    assert not any([os.path.exists(path) for path in removed]);
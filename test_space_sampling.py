@@ -0,0 +1,36 @@
+#Behavior checks of the random point sampler of space_sampling.py.
+#Run with python -m pytest test_space_sampling.py.
+
+import numpy as np;
+import pytest;
+import shapely.geometry as shg;
+from space_sampling import generateRandomSets, cotyledonSeedSequence, SAMPLERS
+
+#A concave outline (a star of 12 tips) that fills well under half of its bounding box,
+#so many candidates are rejected and the sampler has to top up.
+
+ANGLES = np.linspace(0, 2*np.pi, 24, endpoint = False);
+RADII = np.where(np.arange(24) % 2 == 0, 300.0, 90.0);
+OUTLINE = np.stack([RADII*np.cos(ANGLES), RADII*np.sin(ANGLES)], axis = 1);
+
+#Every distribution has exactly N points, all of them inside the outline, also when the
+#candidates come in small chunks.
+
+@pytest.mark.parametrize('sampler', SAMPLERS)
+def test_generateRandomSets_exact_and_inside(sampler):
+    polygon = shg.Polygon(OUTLINE);
+    for chunk_size in (2**20, 256):
+        random_sets = generateRandomSets(OUTLINE, 700, 6, np.random.default_rng(0), chunk_size = chunk_size, sampler = sampler);
+        assert random_sets.shape == (6, 700, 2);
+        assert np.all(np.isfinite(random_sets));
+        assert all([polygon.contains(shg.Point(point)) for point in random_sets.reshape(-1, 2)]);
+
+#The same run seed and file list row give the same points, and another row other points.
+
+@pytest.mark.parametrize('sampler', SAMPLERS)
+def test_generateRandomSets_reproducible(sampler):
+    first = generateRandomSets(OUTLINE, 400, 3, np.random.default_rng(cotyledonSeedSequence(11, 2)), sampler = sampler);
+    again = generateRandomSets(OUTLINE, 400, 3, np.random.default_rng(cotyledonSeedSequence(11, 2)), sampler = sampler);
+    other = generateRandomSets(OUTLINE, 400, 3, np.random.default_rng(cotyledonSeedSequence(11, 3)), sampler = sampler);
+    assert np.array_equal(first, again);
+    assert not np.array_equal(first, other);